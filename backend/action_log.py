@@ -0,0 +1,221 @@
+"""Журнал принятых игровых действий со снимками для восстановления комнат
+
+Каждое принятое действие дописывается строкой JSONL в файл комнаты
+`{ACTION_LOG_DIR}/{room_code}.log`. Запись на диск и fsync выполняются
+пачками раз в ACTION_LOG_FSYNC_MS миллисекунд в отдельном потоке.
+Когда накопилось ACTION_LOG_SNAPSHOT_EVERY действий, сохраняется снимок
+комнаты `{room_code}.snap.json`, после чего журнал обрезается, поэтому при
+восстановлении проигрывается только хвост после последнего снимка.
+Действие журналируется посреди обработчика, до остальных его изменений,
+поэтому снимок снимается не в append, а на границе команды актора
+(snapshot_due проверяется после каждой команды): иначе в снимок попало бы
+наполовину примененное действие, а при восстановлении оно было бы пропущено.
+
+Броски кубиков боя записываются в журнал, так что повторное проигрывание
+действий детерминировано.
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from models import GameRoom
+
+LOG_SUFFIX = ".log"
+SNAPSHOT_SUFFIX = ".snap.json"
+
+
+class ActionLog:
+    """Журнал действий; базовая реализация ничего не записывает"""
+
+    # Во время восстановления обработчики не должны повторно журналировать действия
+    replaying = False
+
+    def append(self, room: GameRoom, entry: dict):
+        """Добавляет принятое действие в журнал комнаты"""
+
+    def snapshot(self, room: GameRoom):
+        """Сохраняет снимок комнаты и начинает журнал заново"""
+
+    def snapshot_due(self, room_code: str) -> bool:
+        """Пора ли снять снимок комнаты (проверяется между командами)"""
+        return False
+
+    def discard(self, room_code: str):
+        """Удаляет журнал и снимок комнаты, которая больше не нужна"""
+
+    async def recover(self) -> List[Tuple[GameRoom, List[dict]]]:
+        """Возвращает снимки комнат и хвосты действий после них"""
+        return []
+
+    async def start(self):
+        """Вызывается при старте приложения"""
+
+    async def stop(self):
+        """Вызывается при остановке приложения"""
+
+
+class FileActionLog(ActionLog):
+    """Журнал действий в файлах JSONL с пакетным fsync"""
+
+    def __init__(self, directory: str, fsync_interval_ms: int = 50, snapshot_every: int = 200):
+        self.directory = directory
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.snapshot_every = snapshot_every
+        self.replaying = False
+        # Номер последнего действия и число действий после снимка по комнатам
+        self._seq: Dict[str, int] = {}
+        self._since_snapshot: Dict[str, int] = {}
+        # Буферы еще не записанных строк и снимков, ожидающих записи
+        self._pending: Dict[str, List[Tuple[int, str]]] = {}
+        self._pending_snapshots: Dict[str, Tuple[int, str]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="action-log")
+
+    def _path(self, room_code: str, suffix: str) -> str:
+        return os.path.join(self.directory, room_code + suffix)
+
+    def append(self, room: GameRoom, entry: dict):
+        if self.replaying:
+            return
+        seq = self._seq.get(room.code, 0) + 1
+        self._seq[room.code] = seq
+        record = {"seq": seq, "ts": time.time()}
+        record.update(entry)
+        self._pending.setdefault(room.code, []).append(
+            (seq, json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        )
+        self._since_snapshot[room.code] = self._since_snapshot.get(room.code, 0) + 1
+
+    def snapshot_due(self, room_code: str) -> bool:
+        return not self.replaying and self._since_snapshot.get(room_code, 0) >= self.snapshot_every
+
+    def snapshot(self, room: GameRoom):
+        if self.replaying:
+            return
+        # Сериализуем сразу, чтобы снимок соответствовал текущему seq
+        seq = self._seq.get(room.code, 0)
+        self._pending_snapshots[room.code] = (seq, json.dumps({
+            "seq": seq,
+            "room": room.to_dict(),
+        }, ensure_ascii=False))
+        self._since_snapshot[room.code] = 0
+
+    def discard(self, room_code: str):
+        self._seq.pop(room_code, None)
+        self._since_snapshot.pop(room_code, None)
+        self._pending.pop(room_code, None)
+        self._pending_snapshots.pop(room_code, None)
+        self._executor.submit(self._remove_files, room_code)
+
+    def _remove_files(self, room_code: str):
+        for suffix in (LOG_SUFFIX, SNAPSHOT_SUFFIX):
+            try:
+                os.remove(self._path(room_code, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _write(self, pending: Dict[str, List[Tuple[int, str]]], snapshots: Dict[str, Tuple[int, str]]):
+        """Сохраняет снимки, дописывает строки и делает fsync (в потоке журнала)"""
+        for room_code in set(pending) | set(snapshots):
+            lines = pending.get(room_code, [])
+            mode = "a"
+            if room_code in snapshots:
+                snapshot_seq, data = snapshots[room_code]
+                path = self._path(room_code, SNAPSHOT_SUFFIX)
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+                # Действия до снимка уже вошли в него — журнал начинается заново
+                lines = [(seq, line) for seq, line in lines if seq > snapshot_seq]
+                mode = "w"
+            with open(self._path(room_code, LOG_SUFFIX), mode, encoding="utf-8") as f:
+                f.writelines(line + "\n" for _, line in lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+    async def flush(self):
+        if not self._pending and not self._pending_snapshots:
+            return
+        pending, self._pending = self._pending, {}
+        snapshots, self._pending_snapshots = self._pending_snapshots, {}
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._write, pending, snapshots)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.fsync_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Action log flush error: {e}")
+
+    def _read_all(self) -> List[Tuple[dict, List[dict]]]:
+        """Читает снимки и хвосты журналов всех комнат (в потоке журнала)"""
+        result = []
+        names = os.listdir(self.directory)
+        for name in names:
+            if name.endswith(LOG_SUFFIX) and name[:-len(LOG_SUFFIX)] + SNAPSHOT_SUFFIX not in names:
+                # Без снимка хвост не к чему применить
+                print(f"Action log {name} has no snapshot, skipped")
+            if not name.endswith(SNAPSHOT_SUFFIX):
+                continue
+            room_code = name[:-len(SNAPSHOT_SUFFIX)]
+            with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                snapshot = json.load(f)
+            tail = []
+            log_path = self._path(room_code, LOG_SUFFIX)
+            if os.path.exists(log_path):
+                with open(log_path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # Недописанная строка после сбоя
+                            break
+                        if record["seq"] > snapshot["seq"]:
+                            tail.append(record)
+            result.append((snapshot, tail))
+        return result
+
+    async def recover(self) -> List[Tuple[GameRoom, List[dict]]]:
+        loop = asyncio.get_running_loop()
+        recovered = []
+        for snapshot, tail in await loop.run_in_executor(self._executor, self._read_all):
+            room = GameRoom.from_dict(snapshot["room"])
+            last_seq = tail[-1]["seq"] if tail else snapshot["seq"]
+            self._seq[room.code] = last_seq
+            self._since_snapshot[room.code] = len(tail)
+            recovered.append((room, tail))
+        return recovered
+
+    async def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        self._executor.shutdown(wait=True)
+
+
+def create_action_log() -> ActionLog:
+    """Создает журнал действий, если задана переменная окружения ACTION_LOG_DIR"""
+    directory = os.getenv("ACTION_LOG_DIR")
+    if not directory:
+        return ActionLog()
+    return FileActionLog(
+        directory,
+        fsync_interval_ms=int(os.getenv("ACTION_LOG_FSYNC_MS", "50")),
+        snapshot_every=int(os.getenv("ACTION_LOG_SNAPSHOT_EVERY", "200")),
+    )
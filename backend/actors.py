@@ -0,0 +1,165 @@
+"""Акторы комнат: все изменения одной комнаты выполняются последовательно
+
+У каждой комнаты своя очередь команд и своя задача, которая выполняет их
+по одной в порядке поступления. Обработчики могут свободно ждать (await)
+внутри команды: другие команды той же комнаты не начнутся, пока текущая
+не закончится, поэтому блокировки не нужны. Разные комнаты обрабатываются
+конкурентно.
+
+Задача актора создается при первой команде и завершается, когда очередь
+опустела, так что тысячи простаивающих комнат не держат задач.
+Очередь ограничена: при переполнении команда клиента отклоняется
+RoomBusyError, а не копится без предела.
+
+Выселение комнаты (discard) отбрасывает еще не начатые команды; их ask
+получают RoomClosedError. Если после этого в комнату придет новая команда,
+новый актор сначала дождется, пока старая задача доиграет текущую команду.
+
+Команда не должна вызывать ask для своей же комнаты — это взаимная блокировка.
+После каждой команды вызывается after_command(room_code): между командами
+комната находится в согласованном состоянии (например, для снимков журнала).
+"""
+import asyncio
+import inspect
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from metrics import room_command_wait_seconds, room_queue_depth, room_queue_rejections
+
+# Предел очереди команд комнаты
+ROOM_QUEUE_MAX = int(os.getenv("ROOM_QUEUE_MAX", "64"))
+
+Command = Tuple[Callable, tuple, Optional[asyncio.Future], float]
+
+
+class RoomBusyError(Exception):
+    """Очередь команд комнаты переполнена"""
+
+
+class RoomClosedError(Exception):
+    """Комнату выселили, пока команда ждала в очереди"""
+
+
+class RoomActor:
+    """Очередь команд одной комнаты и задача, которая ее разбирает"""
+
+    __slots__ = ("room_code", "commands", "task")
+
+    def __init__(self, room_code: str):
+        self.room_code = room_code
+        self.commands: Deque[Command] = deque()
+        self.task: Optional[asyncio.Task] = None
+
+
+class RoomActors:
+    """Акторы всех комнат процесса"""
+
+    def __init__(self, max_queue: int = ROOM_QUEUE_MAX, after_command: Optional[Callable[[str], None]] = None):
+        self.max_queue = max_queue
+        self.after_command = after_command
+        self._actors: Dict[str, RoomActor] = {}
+        # Задачи отброшенных акторов, которые еще доигрывают текущую команду
+        self._retiring: Dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._actors)
+
+    def queue_depth(self, room_code: str) -> int:
+        actor = self._actors.get(room_code)
+        return len(actor.commands) if actor is not None else 0
+
+    def tell(self, room_code: str, func: Callable, *args, bounded: bool = True):
+        """Ставит команду в очередь комнаты, не дожидаясь выполнения
+
+        Ошибки команды печатаются и не останавливают актора.
+        bounded=False — служебная команда (например, отключение игрока),
+        которая ставится даже в переполненную очередь.
+        """
+        self._submit(room_code, func, args, None, bounded)
+
+    async def ask(self, room_code: str, func: Callable, *args) -> Any:
+        """Выполняет команду в очереди комнаты и возвращает ее результат"""
+        future = asyncio.get_running_loop().create_future()
+        self._submit(room_code, func, args, future, False)
+        return await future
+
+    def _submit(self, room_code: str, func: Callable, args: tuple, future: Optional[asyncio.Future], bounded: bool):
+        actor = self._actors.get(room_code)
+        if actor is None:
+            actor = self._actors[room_code] = RoomActor(room_code)
+        if bounded and len(actor.commands) >= self.max_queue:
+            room_queue_rejections.inc()
+            raise RoomBusyError(room_code)
+        actor.commands.append((func, args, future, time.perf_counter()))
+        room_queue_depth.observe(len(actor.commands))
+        if actor.task is None:
+            actor.task = asyncio.create_task(self._run(actor))
+
+    async def _run(self, actor: RoomActor):
+        try:
+            previous = self._retiring.get(actor.room_code)
+            if previous is not None:
+                # Две команды одной комнаты не должны выполняться одновременно
+                await asyncio.wait((previous,))
+            while actor.commands:
+                func, args, future, enqueued = actor.commands.popleft()
+                room_command_wait_seconds.observe(time.perf_counter() - enqueued)
+                try:
+                    result = func(*args)
+                    if inspect.isawaitable(result):
+                        result = await result
+                except Exception as e:
+                    if future is None:
+                        print(f"Room {actor.room_code} command error: {e!r}")
+                    elif not future.done():
+                        future.set_exception(e)
+                else:
+                    if future is not None and not future.done():
+                        future.set_result(result)
+                if self.after_command is not None:
+                    try:
+                        self.after_command(actor.room_code)
+                    except Exception as e:
+                        print(f"Room {actor.room_code} after-command error: {e!r}")
+        finally:
+            # Очередь пуста (или задачу отменили) — актор больше не нужен
+            actor.task = None
+            if self._actors.get(actor.room_code) is actor and not actor.commands:
+                del self._actors[actor.room_code]
+
+    def discard(self, room_code: str):
+        """Отбрасывает еще не начатые команды выселяемой комнаты
+
+        Выполняемая сейчас команда доигрывается до конца.
+        """
+        actor = self._actors.pop(room_code, None)
+        if actor is None:
+            return
+        while actor.commands:
+            _, _, future, _ = actor.commands.popleft()
+            if future is not None and not future.done():
+                future.set_exception(RoomClosedError(room_code))
+        task = actor.task
+        if task is not None:
+            self._retiring[room_code] = task
+            task.add_done_callback(lambda done: self._retired(room_code, done))
+
+    def _retired(self, room_code: str, task: asyncio.Task):
+        if self._retiring.get(room_code) is task:
+            del self._retiring[room_code]
+
+    async def stop(self):
+        """Отменяет задачи всех акторов при остановке приложения"""
+        tasks = [actor.task for actor in self._actors.values() if actor.task is not None]
+        tasks.extend(self._retiring.values())
+        for room_code in list(self._actors):
+            self.discard(room_code)
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
@@ -0,0 +1,21 @@
+"""Доступ к служебным эндпоинтам /api/admin/*
+
+Эндпоинты выключены, пока не задана переменная окружения ADMIN_TOKEN;
+запрос должен передать тот же токен в заголовке X-Admin-Token.
+"""
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Зависимость FastAPI: пропускает только запросы с верным токеном"""
+    if not ADMIN_TOKEN:
+        # Без токена служебные эндпоинты как будто не существуют
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
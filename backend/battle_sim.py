@@ -0,0 +1,204 @@
+"""Пакетный симулятор боев и прогноз исхода атаки
+
+Повторяет правила combat.resolve_battle над массивами NumPy: составы армий
+фиксированы, а броски — векторы, поэтому миллионы боев считаются за секунды.
+
+    python battle_sim.py --attacker 10,5,3 --defender 10,5,3 --defender 20,0,0 \\
+        --walls 0,1,2 --battles 1000000 --seed 1
+
+predicted_odds — точный прогноз для сервера: перебор всех 100 × 100 пар
+бросков, кэшированный по квантованным составам армий.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from combat import allocate_attrition, army_power, defense_power, resolve_battle
+from models import UNITS
+from rules import RULES_PATH, Rules, current_rules, load_rules, rules_for_version
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy необязателен
+    np = None
+
+ODDS_CACHE_SIZE = int(os.getenv("BATTLE_ODDS_CACHE_SIZE", "65536"))
+# Сколько боев симулируется за один проход (ограничивает память)
+CHUNK = 1 << 20
+
+
+def _attrition_vector(army: Sequence[int], attacker_wins: bool, rules: Rules) -> List[int]:
+    """Потери победителя не зависят от бросков — считаем их один раз"""
+    share, divisor = rules.attrition[attacker_wins]
+    remaining = list(army)
+    allocate_attrition(remaining, max(1, int(sum(army) * share)), divisor)
+    return [before - after for before, after in zip(army, remaining)]
+
+def _allocate_damage(army: Sequence[int], damage):
+    losses = np.empty((len(damage), len(army)), dtype=np.int64)
+    for index, count in enumerate(army):
+        unit_damage = np.minimum(damage, count)
+        losses[:, index] = unit_damage
+        damage = damage - unit_damage
+    return losses
+
+def resolve_batch(attacker_army: Sequence[int], defender_army: Sequence[int], walls: int,
+                  attacker_rolls, defender_rolls, rules: Rules):
+    """Векторная версия resolve_battle: (победы атакующего, потери атакующего, потери защитника)"""
+    attacker_total = army_power(attacker_army, rules) + attacker_rolls
+    defender_total = defense_power(defender_army, walls, rules) + defender_rolls
+    wins = attacker_total > defender_total
+
+    winner_total = np.where(wins, attacker_total, defender_total)
+    loser_total = np.where(wins, defender_total, attacker_total)
+    damage_ratio = (winner_total - loser_total) / winner_total
+    loser_units = np.where(wins, sum(defender_army), sum(attacker_army))
+    factor = np.where(wins, rules.damage_factor[True], rules.damage_factor[False])
+    damage = np.maximum(1, (loser_units * damage_ratio * factor).astype(np.int64))
+
+    column = wins[:, None]
+    attacker_losses = np.where(
+        column, _attrition_vector(attacker_army, True, rules), _allocate_damage(attacker_army, damage)
+    )
+    defender_losses = np.where(
+        column, _allocate_damage(defender_army, damage), _attrition_vector(defender_army, False, rules)
+    )
+    return wins, attacker_losses, defender_losses
+
+def _summary(battles: int, wins: int, attacker_losses, defender_losses) -> dict:
+    return {
+        "battles": battles,
+        "attacker_win_probability": wins / battles,
+        "expected_attacker_losses": {unit: float(v) / battles for unit, v in zip(UNITS, attacker_losses)},
+        "expected_defender_losses": {unit: float(v) / battles for unit, v in zip(UNITS, defender_losses)},
+    }
+
+def simulate_battles(attacker_army: Sequence[int], defender_army: Sequence[int], walls: int = 0,
+                     battles: int = 1_000_000, seed: Optional[int] = None,
+                     rules: Optional[Rules] = None) -> dict:
+    """Монте-Карло: вероятность победы атакующего и ожидаемые потери сторон"""
+    if np is None:
+        raise RuntimeError("battle simulation requires numpy")
+    rules = rules or current_rules()
+    rng = np.random.default_rng(seed)
+    wins = 0
+    attacker_losses = np.zeros(len(UNITS), dtype=np.int64)
+    defender_losses = np.zeros(len(UNITS), dtype=np.int64)
+    remaining = battles
+    while remaining > 0:
+        size = min(remaining, CHUNK)
+        rolls = rng.integers(rules.roll_min, rules.roll_max + 1, size=(2, size))
+        chunk_wins, chunk_attacker, chunk_defender = resolve_batch(
+            attacker_army, defender_army, walls, rolls[0], rolls[1], rules
+        )
+        wins += int(chunk_wins.sum())
+        attacker_losses += chunk_attacker.sum(axis=0)
+        defender_losses += chunk_defender.sum(axis=0)
+        remaining -= size
+    return _summary(battles, wins, attacker_losses.tolist(), defender_losses.tolist())
+
+def exact_odds(attacker_army: Sequence[int], defender_army: Sequence[int], walls: int = 0,
+               rules: Optional[Rules] = None) -> dict:
+    """Точные вероятность победы и ожидаемые потери перебором всех пар бросков"""
+    rules = rules or current_rules()
+    rolls = range(rules.roll_min, rules.roll_max + 1)
+    battles = len(rolls) ** 2
+    if np is None:
+        wins = 0
+        attacker_losses = [0] * len(UNITS)
+        defender_losses = [0] * len(UNITS)
+        for attacker_roll in rolls:
+            for defender_roll in rolls:
+                outcome = resolve_battle(attacker_army, defender_army, walls, attacker_roll, defender_roll, rules)
+                wins += outcome["attacker_wins"]
+                for index, unit in enumerate(UNITS):
+                    attacker_losses[index] += outcome["attacker_losses"].get(unit, 0)
+                    defender_losses[index] += outcome["defender_losses"].get(unit, 0)
+        return _summary(battles, wins, attacker_losses, defender_losses)
+
+    attacker_rolls, defender_rolls = np.meshgrid(np.array(rolls), np.array(rolls))
+    wins, attacker_losses, defender_losses = resolve_batch(
+        attacker_army, defender_army, walls, attacker_rolls.ravel(), defender_rolls.ravel(), rules
+    )
+    return _summary(battles, int(wins.sum()), attacker_losses.sum(axis=0).tolist(), defender_losses.sum(axis=0).tolist())
+
+def quantize(count: int) -> int:
+    """Округляет численность: до 16 — точно, дальше — до 4 значащих двоичных разрядов"""
+    if count < 16:
+        return count
+    step = 1 << (count.bit_length() - 4)
+    return (count + step // 2) // step * step
+
+@lru_cache(maxsize=ODDS_CACHE_SIZE)
+def _cached_odds(attacker_army: Tuple[int, ...], defender_army: Tuple[int, ...], walls: int,
+                 rules_version: int) -> dict:
+    return exact_odds(attacker_army, defender_army, walls, rules_for_version(rules_version))
+
+def predicted_odds(attacker_army: Sequence[int], defender_army: Sequence[int], walls: int,
+                   rules: Rules) -> dict:
+    """Прогноз исхода атаки из кэша по квантованным составам армий и версии правил"""
+    return _cached_odds(
+        tuple(quantize(count) for count in attacker_army),
+        tuple(quantize(count) for count in defender_army),
+        quantize(walls),
+        rules.version,
+    )
+
+
+def parse_army(value: str) -> Tuple[int, ...]:
+    counts = tuple(int(part) for part in value.split(","))
+    if len(counts) != len(UNITS):
+        raise argparse.ArgumentTypeError(f"army must list {len(UNITS)} counts: {','.join(UNITS)}")
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Монте-Карло симулятор боев")
+    parser.add_argument("--attacker", type=parse_army, action="append", required=True,
+                        help="состав атакующего: soldiers,archers,cavalry (можно несколько)")
+    parser.add_argument("--defender", type=parse_army, action="append", required=True,
+                        help="состав защитника: soldiers,archers,cavalry (можно несколько)")
+    parser.add_argument("--walls", default="0", help="число стен защитника через запятую")
+    parser.add_argument("--battles", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--exact", action="store_true", help="точный перебор бросков вместо симуляции")
+    parser.add_argument("--rules", default=RULES_PATH, help="файл правил (например, проверяемый баланс)")
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    if np is None and not args.exact:
+        sys.exit("battle simulation requires numpy (or use --exact)")
+
+    rules = load_rules(args.rules)
+    rows = []
+    start = time.perf_counter()
+    for walls in (int(part) for part in args.walls.split(",")):
+        for attacker in args.attacker:
+            for defender in args.defender:
+                if args.exact:
+                    stats = exact_odds(attacker, defender, walls, rules)
+                else:
+                    stats = simulate_battles(attacker, defender, walls, args.battles, args.seed, rules)
+                rows.append({"attacker": list(attacker), "defender": list(defender), "walls": walls, **stats})
+    elapsed = time.perf_counter() - start
+
+    if args.json:
+        print(json.dumps({"elapsed_sec": round(elapsed, 3), "rules_version": rules.version, "results": rows}, indent=2))
+        return
+    print(f"{'attacker':>12} {'defender':>12} {'walls':>5} {'P(win)':>7}   expected losses attacker / defender")
+    for row in rows:
+        attacker_losses = "/".join(f"{v:.2f}" for v in row["expected_attacker_losses"].values())
+        defender_losses = "/".join(f"{v:.2f}" for v in row["expected_defender_losses"].values())
+        print(
+            f"{','.join(map(str, row['attacker'])):>12} {','.join(map(str, row['defender'])):>12} "
+            f"{row['walls']:>5} {row['attacker_win_probability']:7.3f}   {attacker_losses} / {defender_losses}"
+        )
+    battles = sum(row["battles"] for row in rows)
+    print(f"{battles} battles in {elapsed:.2f}s ({battles / elapsed:,.0f}/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Байты на проводе и CPU на ход: пакеты сообщений и сжатие по порогу
+
+Прогоняет одинаковую (фиксированный seed) партию комнаты из 4 игроков через
+обработчики main.py и настоящие Connection. Каждое соединение пропускает свои
+кадры через permessage-deflate так же, как сервер: с отдельным контекстом
+сжатия на соединение. Режимы:
+
+    before     — каждое сообщение отдельным кадром, сжатие всех сообщений (uvicorn по умолчанию)
+    batch      — пакеты сообщений, сжатие всех сообщений
+    after      — пакеты и сжатие по порогу (compression.py)
+    no_deflate — пакеты без сжатия (клиент не согласовал permessage-deflate)
+
+Запуск из каталога backend:
+
+    python benchmarks/bench_batching.py --turns 200 --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from websockets import frames
+
+import main
+from compression import (
+    ThresholdPerMessageDeflate, WS_DEFLATE_LEVEL, WS_DEFLATE_MEM_LEVEL, WS_DEFLATE_MIN_SIZE, WS_DEFLATE_WINDOW_BITS,
+)
+from connection import Connection
+from models import GameRoom, create_player
+
+PLAYERS = 4
+
+
+def frame_header_size(length: int) -> int:
+    """Заголовок кадра сервера (без маски)"""
+    if length < 126:
+        return 2
+    if length < 65536:
+        return 4
+    return 10
+
+
+class WireWebSocket:
+    """Имитация сокета: считает кадры и байты после permessage-deflate"""
+
+    def __init__(self, deflate):
+        self.deflate = deflate
+        self.frames = 0
+        self.wire_bytes = 0
+
+    async def _send(self, opcode, data: bytes):
+        frame = frames.Frame(opcode, data)
+        if self.deflate is not None:
+            frame = self.deflate.encode(frame)
+        self.frames += 1
+        self.wire_bytes += frame_header_size(len(frame.data)) + len(frame.data)
+
+    async def send_text(self, data: str):
+        await self._send(frames.OP_TEXT, data.encode("utf-8"))
+
+    async def send_bytes(self, data: bytes):
+        await self._send(frames.OP_BINARY, data)
+
+
+def make_deflate(mode: str):
+    if mode == "no_deflate":
+        return None
+    if mode == "after":
+        return ThresholdPerMessageDeflate(
+            False, False, WS_DEFLATE_WINDOW_BITS, WS_DEFLATE_WINDOW_BITS,
+            {"level": WS_DEFLATE_LEVEL, "memLevel": WS_DEFLATE_MEM_LEVEL}, min_size=WS_DEFLATE_MIN_SIZE,
+        )
+    # Настройки ServerPerMessageDeflateFactory() в uvicorn: окно 15, параметры zlib по умолчанию
+    return ThresholdPerMessageDeflate(False, False, 15, 15, {}, min_size=0)
+
+
+async def drain(connections):
+    while any(connection.queue_depth for connection in connections):
+        await asyncio.sleep(0)
+
+
+async def play(mode: str, turns: int, seed: int) -> dict:
+    random.seed(seed)
+    main.batcher.enabled = mode != "before"
+    code = f"B{mode[:7].upper():<7}"
+    ids = [f"{index:08d}-6b1f-4c1e-9a3e-1c2d3e4f5a6b" for index in range(PLAYERS)]
+    main.game_rooms[code] = GameRoom(
+        code=code, players={pid: create_player(pid, f"Player {i}") for i, pid in enumerate(ids)},
+        game_state="waiting", created_at=datetime.now(),
+    )
+    sockets = [WireWebSocket(make_deflate(mode)) for _ in ids]
+    connections = [Connection(socket, code, pid, max_queue=10 ** 6) for socket, pid in zip(sockets, ids)]
+    for connection in connections:
+        connection.start()
+    main.active_connections[code] = list(connections)
+
+    async def event(handler, *args):
+        # Как цикл websocket_endpoint: одно входящее сообщение — один пакет
+        with main.batched(code):
+            await handler(*args)
+
+    for pid, connection in zip(ids, connections):
+        await event(main.handle_player_ready, code, pid, True, connection)
+    await drain(connections)
+    for socket in sockets:
+        socket.frames = socket.wire_bytes = 0
+
+    cpu_started = time.process_time()
+    for turn in range(turns):
+        index = turn % PLAYERS
+        pid, connection = ids[index], connections[index]
+        actions = [
+            {"type": "build", "building_type": random.choice(("farm", "mine", "barracks", "wall"))},
+            {"type": "train_army", "unit_type": random.choice(("soldiers", "archers", "cavalry")), "quantity": 2},
+            {"type": "attack", "target_player_id": ids[(index + 1) % PLAYERS]},
+        ]
+        for action in actions:
+            await event(main.handle_game_action, code, pid, action, connection)
+        await event(main.handle_end_turn, code, pid, connection)
+        await drain(connections)
+    cpu = time.process_time() - cpu_started
+
+    for connection in connections:
+        await connection.close()
+    del main.active_connections[code]
+    del main.game_rooms[code]
+    return {
+        "frames_per_turn": round(sum(socket.frames for socket in sockets) / turns, 2),
+        "wire_bytes_per_turn": round(sum(socket.wire_bytes for socket in sockets) / turns),
+        "cpu_us_per_turn": round(cpu / turns * 1e6),
+    }
+
+
+async def run(args) -> dict:
+    results = {}
+    for mode in ("before", "batch", "after", "no_deflate"):
+        # Лучшее из нескольких повторов: CPU шумит, байты детерминированы
+        runs = [await play(mode, args.turns, args.seed) for _ in range(args.repeat)]
+        best = min(runs, key=lambda row: row["cpu_us_per_turn"])
+        results[mode] = best
+    return results
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200, help="ходов (end_turn) в партии")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps({
+            "players": PLAYERS, "turns": args.turns, "deflate_min_size": WS_DEFLATE_MIN_SIZE, "results": results,
+        }, indent=2))
+        return
+    print(f"{PLAYERS} игрока, {args.turns} ходов, порог сжатия {WS_DEFLATE_MIN_SIZE} байт")
+    print(f"{'mode':>11} {'frames/turn':>12} {'bytes/turn':>11} {'cpu us/turn':>12}")
+    for mode, row in results.items():
+        print(f"{mode:>11} {row['frames_per_turn']:>12} {row['wire_bytes_per_turn']:>11} {row['cpu_us_per_turn']:>12}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,114 @@
+"""Бенчмарк ботов: решения и розыгрыши в секунду на ядро, задержка цикла событий
+
+Поиск bots.choose_action запускается на позициях середины партии
+(4 игрока) двумя способами: прямо в цикле событий ("inline") и в пуле
+процессов ("pool", как BotManager). Пока идут вычисления, отдельная задача
+просыпается каждые 10 мс и измеряет задержку цикла — то, что почувствовали
+бы другие комнаты. Запуск из каталога backend:
+
+    python benchmarks/bench_bots.py --decisions 40 --think-ms 100 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bots import choose_action, portable_rules
+from models import BUILDINGS, INITIAL_ARMY, INITIAL_RESOURCES
+from rules import current_rules
+
+RULES = portable_rules(current_rules())
+
+
+def make_state(seed: int) -> tuple:
+    """Позиция середины партии: случайные ресурсы, армии, здания и технологии"""
+    rng = random.Random(seed)
+    techs = list(RULES.tech_costs)
+    players = tuple(
+        (
+            f"player-{i}",
+            tuple(amount + rng.randint(-300, 600) for amount in INITIAL_RESOURCES),
+            tuple(count + rng.randint(0, 10) for count in INITIAL_ARMY),
+            tuple(rng.randint(0, 2) for _ in BUILDINGS),
+            tuple(rng.sample(techs, rng.randint(0, 2))),
+            rng.randint(0, 6),
+        )
+        for i in range(4)
+    )
+    return players, seed % 4
+
+
+async def watch_lag(lags: list, stop: asyncio.Event, interval: float = 0.01):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - expected)
+
+
+async def run(mode: str, decisions: int, think: float, workers: int) -> dict:
+    lags = []
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_lag(lags, stop))
+    await asyncio.sleep(0.05)
+    states = [make_state(seed) for seed in range(decisions)]
+    started = time.perf_counter()
+    if mode == "inline":
+        results = []
+        for state in states:
+            results.append(choose_action(state, RULES, think))
+            await asyncio.sleep(0)
+    else:
+        executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        # Прогрев: запуск процессов пула не входит в измерение
+        await asyncio.gather(*(asyncio.wrap_future(executor.submit(time.sleep, 0.1)) for _ in range(workers)))
+        started = time.perf_counter()
+        results = await asyncio.gather(*(
+            asyncio.wrap_future(executor.submit(choose_action, state, RULES, think)) for state in states
+        ))
+        executor.shutdown()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await watcher
+    cores = 1 if mode == "inline" else min(workers, os.cpu_count() or 1)
+    rollouts = sum(count for _, count in results)
+    return {
+        "decisions_per_s": round(decisions / elapsed, 1),
+        "decisions_per_s_per_core": round(decisions / elapsed / cores, 1),
+        "rollouts_per_s_per_core": round(rollouts / elapsed / cores),
+        "loop_lag_max_ms": round(max(lags) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--decisions", type=int, default=40)
+    parser.add_argument("--think-ms", type=float, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    results = {
+        mode: asyncio.run(run(mode, args.decisions, args.think_ms / 1000, args.workers))
+        for mode in ("inline", "pool")
+    }
+    if args.json:
+        print(json.dumps({"decisions": args.decisions, "think_ms": args.think_ms, "workers": args.workers,
+                          "cpu_count": os.cpu_count(), "results": results}, indent=2))
+        return
+    print(f"{args.decisions} decisions, {args.think_ms} ms budget, {args.workers} workers, {os.cpu_count()} CPUs")
+    print(f"{'mode':>7} {'dec/s':>7} {'dec/s/core':>11} {'rollouts/s/core':>16} {'max lag ms':>11}")
+    for mode, r in results.items():
+        print(f"{mode:>7} {r['decisions_per_s']:7.1f} {r['decisions_per_s_per_core']:11.1f} "
+              f"{r['rollouts_per_s_per_core']:16d} {r['loop_lag_max_ms']:11.1f}")
+
+
+if __name__ == "__main__":
+    main()
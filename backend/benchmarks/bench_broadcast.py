@@ -0,0 +1,96 @@
+"""Микробенчмарк рассылки: старый последовательный цикл send_json против
+сериализации один раз и очередей соединений (connection.Connection)
+
+Запуск из каталога backend:
+
+    python benchmarks/bench_broadcast.py --latency 0.001
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from broadcast import encode_message
+from connection import Connection
+from models import GameRoom, create_player
+
+from datetime import datetime
+
+
+class FakeWebSocket:
+    """Имитация WebSocket: сериализация как в Starlette и задержка сети"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.sent_bytes = 0
+
+    async def send_text(self, data: str):
+        self.sent_bytes += len(data.encode("utf-8"))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        else:
+            await asyncio.sleep(0)
+
+    async def send_json(self, data: dict):
+        # Так же, как starlette.websockets.WebSocket.send_json
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+
+def make_message() -> dict:
+    players = {f"player-{i}": create_player(f"player-{i}", f"Игрок {i}") for i in range(4)}
+    room = GameRoom(code="BENCH001", players=players, game_state="playing", created_at=datetime.now())
+    return {"type": "room_state", "room": room.to_dict()}
+
+
+async def old_broadcast(connections, message):
+    for connection in connections:
+        try:
+            await connection.send_json(message)
+        except Exception:
+            pass
+
+
+async def new_broadcast(connections, message):
+    # Игровая логика только ставит сообщение в очереди, время включает их разбор писателями
+    payload = encode_message(message)
+    for connection in connections:
+        connection.send(payload)
+    while any(connection.queue_depth for connection in connections):
+        await asyncio.sleep(0)
+
+
+async def measure(func, connections, message, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await func(connections, message)
+    return (time.perf_counter() - start) / rounds
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка отправки одному клиенту, сек")
+    parser.add_argument("--sizes", default="2,4,50")
+    args = parser.parse_args()
+
+    message = make_message()
+    print(f"message size: {len(encode_message(message))} bytes, latency: {args.latency}s")
+    print(f"{'connections':>12} {'old, ms':>10} {'new, ms':>10} {'speedup':>8}")
+    for size in (int(x) for x in args.sizes.split(",")):
+        sockets = [FakeWebSocket(args.latency) for _ in range(size)]
+        old = await measure(old_broadcast, sockets, message, args.rounds)
+        connections = [Connection(ws, "BENCH001", f"player-{i}") for i, ws in enumerate(sockets)]
+        for connection in connections:
+            connection.start()
+        new = await measure(new_broadcast, connections, message, args.rounds)
+        for connection in connections:
+            await connection.close()
+        print(f"{size:>12} {old * 1000:>10.3f} {new * 1000:>10.3f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
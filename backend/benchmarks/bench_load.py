@@ -0,0 +1,400 @@
+"""Нагрузочный тест игрового протокола: комнаты, WebSocket-игроки и сценарий действий
+
+Поднимает сервер (отдельным процессом uvicorn или внутри этого процесса),
+создает комнаты через /api/create-room и /api/join-room, подключает игроков
+к /ws/{room_code}/{player_id}, отмечает готовность и гоняет смесь действий
+(build, train_army, attack, research, trade, end_turn). Задержка действия —
+время от отправки до получения рассылки о нем самим отправителем.
+
+    python benchmarks/bench_load.py --rooms 1000 --players 2 --duration 30 --json
+
+Результат (--json) — один JSON-объект: задержки p50/p99, сообщений в секунду,
+CPU и RSS сервера; его удобно сохранять по коммитам (--output).
+
+Сервер ограничивает частоту сообщений (inbound.py); отказы сверх бюджета
+считаются отдельно (rate_limited_by_type) и не входят в задержки. --rate-limits
+передается серверу как WS_RATE_LIMITS, "off" снимает ограничения.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import List, Optional
+
+import httpx
+import websockets
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+
+# Веса действий в сценарии
+ACTION_MIX = {
+    "build": 25,
+    "train_army": 25,
+    "attack": 15,
+    "research": 10,
+    "trade": 10,
+    "end_turn": 15,
+}
+BUILDINGS = ("barracks", "farm", "mine", "wall")
+UNITS = ("soldiers", "archers", "cavalry")
+TECHS = ("military_tactics", "advanced_construction", "trade_routes", "fortification")
+RESOURCES = ("gold", "wood", "stone", "food")
+# Ошибка action_result сверх бюджета (inbound.RATE_LIMIT_ERROR)
+RATE_LIMIT_ERROR = "Rate limit exceeded"
+# Типы сообщений, которые шлет тест; для --rate-limits off
+LIMITED_KINDS = (*ACTION_MIX, "player_ready", "other")
+
+
+def process_usage(pid: int):
+    """(CPU-секунды, RSS в байтах) процесса по /proc"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    ticks = os.sysconf("SC_CLK_TCK")
+    cpu = (int(fields[11]) + int(fields[12])) / ticks
+    rss = 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss = int(line.split()[1]) * 1024
+    return cpu, rss
+
+
+def percentile(values: List[float], share: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.received = 0
+        self.received_bytes = 0
+        self.sent = Counter()
+        self.failed = Counter()
+        self.rate_limited = Counter()
+        self.errors = Counter()
+
+
+class SimulatedPlayer:
+    """Игрок: одно действие в полете, задержка до рассылки о нем"""
+
+    def __init__(self, ws_url: str, player_id: str, stats: Stats, is_host: bool):
+        self.ws_url = ws_url
+        self.player_id = player_id
+        self.stats = stats
+        self.is_host = is_host
+        self.opponents: List[str] = []
+        self.ws = None
+        self._waiting: Optional[asyncio.Future] = None
+        self._waiting_for: Optional[str] = None
+        self._events = {"room_state": asyncio.Event(), "game_start": asyncio.Event()}
+        self._reader: Optional[asyncio.Task] = None
+
+    async def connect(self):
+        self.ws = await websockets.connect(self.ws_url, max_size=None)
+        self._reader = asyncio.create_task(self._read_loop())
+        await self._events["room_state"].wait()
+
+    async def _read_loop(self):
+        try:
+            async for data in self.ws:
+                self.stats.received += 1
+                self.stats.received_bytes += len(data)
+                message = json.loads(data)
+                # Сообщения одного события сервера приходят пакетом (broadcast.MessageBatcher)
+                for item in message["messages"] if message.get("type") == "batch" else (message,):
+                    self._on_message(item)
+        except websockets.ConnectionClosed as e:
+            self.stats.errors[f"closed_{e.code}"] += 1
+        if self._waiting is not None and not self._waiting.done():
+            self._waiting.set_result(None)
+
+    def _on_message(self, message: dict):
+        kind = message.get("type")
+        if kind in self._events:
+            self._events[kind].set()
+        if self._waiting is None or self._waiting.done():
+            return
+        if self._matches(kind, message):
+            self._waiting.set_result(message)
+
+    def _matches(self, kind: str, message: dict) -> bool:
+        expected = self._waiting_for
+        if kind == "action_result":
+            if "player_id" not in message:
+                # Ошибки (в том числе сверх бюджета) приходят только отправителю и без
+                # player_id; в полете одно действие, так что это ответ на него
+                return True
+            return message["player_id"] == self.player_id and expected in (
+                "build", "train_army", "research", "trade", "attack")
+        if kind == "battle_result":
+            return expected == "attack" and message.get("attacker_id") == self.player_id
+        if kind == "trade_completed":
+            return expected == "trade" and message.get("player_id") == self.player_id
+        if kind == "turn_ended":
+            # Ход завершает только хозяин комнаты, первая рассылка содержит turn_number
+            return expected == "end_turn" and "turn_number" in message
+        return False
+
+    async def send(self, message: dict):
+        await self.ws.send(json.dumps(message))
+
+    async def ready(self):
+        await self.send({"type": "player_ready", "ready": True})
+
+    def _next_action(self) -> dict:
+        kinds = [k for k in ACTION_MIX if k != "end_turn" or self.is_host]
+        kind = random.choices(kinds, weights=[ACTION_MIX[k] for k in kinds])[0]
+        if kind == "build":
+            return {"type": "build", "building_type": random.choice(BUILDINGS)}
+        if kind == "train_army":
+            return {"type": "train_army", "unit_type": random.choice(UNITS), "quantity": random.randint(1, 5)}
+        if kind == "attack":
+            return {"type": "attack", "target_player_id": random.choice(self.opponents)}
+        if kind == "research":
+            return {"type": "research", "tech_type": random.choice(TECHS)}
+        if kind == "trade":
+            return {
+                "type": "trade",
+                "target_player_id": random.choice(self.opponents),
+                "trade_offer": {random.choice(RESOURCES): random.randint(1, 20)},
+                "trade_request": {random.choice(RESOURCES): random.randint(1, 20)},
+            }
+        return {"type": "end_turn"}
+
+    async def act(self, timeout: float):
+        action = self._next_action()
+        kind = action["type"]
+        message = {"type": "end_turn"} if kind == "end_turn" else {"type": "game_action", "action": action}
+        self._waiting = asyncio.get_running_loop().create_future()
+        self._waiting_for = kind
+        started = time.perf_counter()
+        await self.send(message)
+        try:
+            reply = await asyncio.wait_for(self._waiting, timeout)
+        except asyncio.TimeoutError:
+            self.stats.errors["timeout"] += 1
+            return
+        finally:
+            self._waiting = None
+        if reply is None:
+            # Соединение закрыто, причина уже в errors
+            return
+        if reply.get("error") == RATE_LIMIT_ERROR:
+            self.stats.rate_limited[kind] += 1
+            return
+        self.stats.sent[kind] += 1
+        self.stats.latencies.append((time.perf_counter() - started) * 1000)
+        if not reply.get("success", True):
+            self.stats.failed[kind] += 1
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self._reader is not None:
+            await self._reader
+
+
+async def setup_room(client: httpx.AsyncClient, base_url: str, ws_base: str, players: int,
+                     stats: Stats) -> List[SimulatedPlayer]:
+    response = await client.post(f"{base_url}/api/create-room", params={"player_name": "host"})
+    data = response.json()
+    room_code = data["room_code"]
+    player_ids = [data["player_id"]]
+    for index in range(1, players):
+        response = await client.post(
+            f"{base_url}/api/join-room", params={"room_code": room_code, "player_name": f"bot{index}"}
+        )
+        player_ids.append(response.json()["player_id"])
+
+    room = [
+        SimulatedPlayer(f"{ws_base}/ws/{room_code}/{pid}", pid, stats, is_host=index == 0)
+        for index, pid in enumerate(player_ids)
+    ]
+    for player in room:
+        player.opponents = [pid for pid in player_ids if pid != player.player_id]
+        await player.connect()
+    for player in room:
+        await player.ready()
+    await asyncio.gather(*(player._events["game_start"].wait() for player in room))
+    return room
+
+
+async def drive(player: SimulatedPlayer, deadline: float, think: float, timeout: float):
+    while time.perf_counter() < deadline:
+        await player.act(timeout)
+        if think:
+            await asyncio.sleep(random.uniform(0, 2 * think))
+
+
+async def run_load(base_url: str, rooms: int, players: int, duration: float, think: float,
+                   setup_concurrency: int, timeout: float, usage) -> dict:
+    ws_base = "ws" + base_url[len("http"):]
+    stats = Stats()
+    all_rooms: List[List[SimulatedPlayer]] = []
+    semaphore = asyncio.Semaphore(setup_concurrency)
+
+    async def create(client):
+        async with semaphore:
+            all_rooms.append(await setup_room(client, base_url, ws_base, players, stats))
+
+    setup_started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=60, follow_redirects=True) as client:
+        await asyncio.gather(*(create(client) for _ in range(rooms)))
+    setup_sec = time.perf_counter() - setup_started
+
+    received_before = stats.received
+    cpu_before, _ = usage()
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        drive(player, deadline, think, timeout) for room in all_rooms for player in room
+    ))
+    elapsed = time.perf_counter() - started
+    cpu_after, rss = usage()
+
+    await asyncio.gather(*(player.close() for room in all_rooms for player in room))
+
+    latencies = stats.latencies
+    return {
+        "rooms": rooms,
+        "players_per_room": players,
+        "connections": rooms * players,
+        "setup_sec": round(setup_sec, 2),
+        "duration_sec": round(elapsed, 2),
+        "actions": sum(stats.sent.values()),
+        "actions_by_type": dict(stats.sent),
+        "rejected_by_type": dict(stats.failed),
+        "rate_limited_by_type": dict(stats.rate_limited),
+        "errors": dict(stats.errors),
+        "actions_per_sec": round(sum(stats.sent.values()) / elapsed, 1),
+        "messages_received_per_sec": round((stats.received - received_before) / elapsed, 1),
+        "received_mb": round(stats.received_bytes / 1e6, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.5), 3) if latencies else None,
+            "p99": round(percentile(latencies, 0.99), 3) if latencies else None,
+            "max": round(max(latencies), 3) if latencies else None,
+        },
+        "server_cpu_sec": round(cpu_after - cpu_before, 2),
+        "server_cpu_percent": round((cpu_after - cpu_before) / elapsed * 100, 1),
+        "server_rss_mb": round(rss / 1e6, 1),
+    }
+
+
+def wait_ready(base_url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            httpx.get(f"{base_url}/api/health", timeout=1)
+            return
+        except httpx.HTTPError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+async def run_in_process(args) -> dict:
+    import uvicorn
+    from compression import CompressedWebSocketProtocol
+    from main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning",
+                                           ws=CompressedWebSocketProtocol))
+    serve = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    try:
+        # Клиенты работают в том же процессе, поэтому CPU и RSS включают их
+        return await run_load(
+            f"http://127.0.0.1:{args.port}", args.rooms, args.players, args.duration, args.think_ms / 1000,
+            args.setup_concurrency, args.timeout, lambda: process_usage(os.getpid()),
+        )
+    finally:
+        server.should_exit = True
+        await serve
+
+
+def run_subprocess(args) -> dict:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(args.port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_ready(base_url)
+        return asyncio.run(run_load(
+            base_url, args.rooms, args.players, args.duration, args.think_ms / 1000,
+            args.setup_concurrency, args.timeout, lambda: process_usage(process.pid),
+        ))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("uvicorn", "inprocess"), default="uvicorn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rooms", type=int, default=200)
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=15.0, help="секунды под нагрузкой")
+    parser.add_argument("--think-ms", type=float, default=50.0, help="средняя пауза между действиями игрока")
+    parser.add_argument("--setup-concurrency", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=10.0, help="ожидание рассылки о действии")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--rate-limits", help='WS_RATE_LIMITS сервера ("build=5:10,..."); off — без ограничений')
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    parser.add_argument("--output", help="дописать результат JSON-строкой в файл")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    if args.rate_limits:
+        # До импорта main (inprocess) и запуска uvicorn: окружение наследует процесс сервера
+        os.environ["WS_RATE_LIMITS"] = (
+            ",".join(f"{kind}=1e9:1e9" for kind in LIMITED_KINDS) if args.rate_limits == "off"
+            else args.rate_limits
+        )
+    if args.mode == "inprocess":
+        result = asyncio.run(run_in_process(args))
+    else:
+        result = run_subprocess(args)
+    result = {"revision": git_revision(), "mode": args.mode, "think_ms": args.think_ms, **result}
+
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(result) + "\n")
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    latency = result["latency_ms"]
+    print(f"{result['connections']} connections in {result['rooms']} rooms, {result['duration_sec']}s")
+    print(f"actions: {result['actions']} ({result['actions_per_sec']}/s), "
+          f"messages received: {result['messages_received_per_sec']}/s")
+    print(f"latency ms: p50 {latency['p50']}  p99 {latency['p99']}  max {latency['max']}")
+    print(f"server: cpu {result['server_cpu_percent']}%  rss {result['server_rss_mb']} MB")
+    if result["rate_limited_by_type"]:
+        print(f"rate limited: {result['rate_limited_by_type']}")
+    if result["errors"]:
+        print(f"errors: {result['errors']}")
+
+
+if __name__ == "__main__":
+    main()
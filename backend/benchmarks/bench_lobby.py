@@ -0,0 +1,108 @@
+"""Бенчмарк лобби: просмотр всех комнат на запрос против индексов LobbyIndex
+
+В памяти --rooms комнат, из них часть ожидает игроков. Вариант "scan"
+на каждый запрос обходит все комнаты, фильтрует, сортирует и сериализует
+первую страницу. Вариант "index" отдает страницу из LobbyIndex: "cached" —
+индекс не менялся с прошлого запроса, "rebuilt" — перед каждым запросом
+в одну из комнат вошел игрок. Отдельно измеряется цена lobby.update для
+неизменившейся комнаты — она платится при каждом commit_room. Запуск из
+каталога backend:
+
+    python benchmarks/bench_lobby.py --rooms 10000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from lobby import LOBBY_PAGE_SIZE, LobbyIndex, entry_for
+from models import MAX_PLAYERS, GameRoom, create_player
+
+
+def make_rooms(count: int, waiting_share: float, seed: int = 1):
+    rng = random.Random(seed)
+    started = datetime(2026, 1, 1)
+    rooms = {}
+    for i in range(count):
+        players = {f"p{i}-{j}": create_player(f"p{i}-{j}", f"Игрок {j}") for j in range(rng.randint(1, MAX_PLAYERS))}
+        state = "waiting" if rng.random() < waiting_share else rng.choice(("playing", "finished"))
+        code = f"{i:08X}"
+        rooms[code] = GameRoom(code=code, players=players, game_state=state,
+                               created_at=started + timedelta(seconds=i))
+    return rooms
+
+
+def scan_page(rooms, limit: int) -> bytes:
+    """Как сделал бы обработчик без индексов: обход, фильтр, сортировка, сериализация"""
+    entries = [entry_for(room) for room in rooms.values() if room.game_state == "waiting"]
+    entries = [entry for entry in entries if entry.free_seats >= 1]
+    entries.sort(key=lambda entry: (entry.created, entry.code))
+    return json.dumps({
+        "rooms": [entry.to_dict() for entry in entries[:limit]],
+        "total": len(entries),
+    }, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def per_call(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=10000)
+    parser.add_argument("--waiting", type=float, default=0.3, help="доля ожидающих комнат")
+    parser.add_argument("--limit", type=int, default=LOBBY_PAGE_SIZE)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    rooms = make_rooms(args.rooms, args.waiting)
+    lobby = LobbyIndex()
+    started = time.perf_counter()
+    for room in rooms.values():
+        lobby.update(room)
+    build = time.perf_counter() - started
+
+    waiting = [room for room in rooms.values() if room.game_state == "waiting"]
+    rng = random.Random(2)
+
+    def rebuilt():
+        # Вход и выход игрока: запись комнаты меняется, версия индекса растет
+        room = rng.choice(waiting)
+        player = create_player("bench", "Гость")
+        room.players["bench"] = player
+        lobby.update(room)
+        lobby.page("waiting", 1, limit=args.limit)
+        del room.players["bench"]
+        lobby.update(room)
+
+    results = {
+        "scan_ms": per_call(lambda: scan_page(rooms, args.limit), max(1, args.repeat // 10)) * 1000,
+        "index_cached_ms": per_call(lambda: lobby.page("waiting", 1, limit=args.limit), args.repeat * 10) * 1000,
+        "index_rebuilt_ms": per_call(rebuilt, args.repeat) * 1000,
+        "update_unchanged_us": per_call(lambda: lobby.update(waiting[0]), args.repeat * 10) * 1e6,
+        "index_build_ms": build * 1000,
+    }
+    results = {name: round(value, 4) for name, value in results.items()}
+    if args.json:
+        print(json.dumps({"rooms": args.rooms, "waiting": len(waiting), "limit": args.limit,
+                          "results": results}, indent=2))
+        return
+    print(f"{args.rooms} rooms, {len(waiting)} waiting, page of {args.limit}")
+    print(f"  scan per request:        {results['scan_ms']:.3f} ms")
+    print(f"  index, cached page:      {results['index_cached_ms']:.4f} ms")
+    print(f"  index, rebuilt page:     {results['index_rebuilt_ms']:.3f} ms")
+    print(f"  update, room unchanged:  {results['update_unchanged_us']:.2f} us")
+    print(f"  initial index build:     {results['index_build_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
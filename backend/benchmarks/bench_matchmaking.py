@@ -0,0 +1,111 @@
+"""Бенчмарк подбора: индекс по диапазонам рейтинга против просмотра очереди
+
+Синтетическая нагрузка: заявки приходят пуассоновским потоком с частотой
+--rate в секунду, рейтинги — нормальное распределение (1500, 300).
+Время моделируется (sweep каждые MATCH_INTERVAL), поэтому часы нагрузки
+считаются за секунды; измеряется реальное CPU-время подбора. Вариант "scan"
+ищет соседей просмотром всей очереди заявок; разница заметна, когда очередь
+глубокая — при узких диапазонах (--band) или большом потоке. Запуск из
+каталога backend:
+
+    python benchmarks/bench_matchmaking.py --rate 2000 --duration 60 --band 10
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from matchmaking import MATCH_BAND, MATCH_INTERVAL, Matchmaker, Ticket
+
+
+class ScanMatchmaker(Matchmaker):
+    """Подбор просмотром всей очереди: совместимые заявки в порядке поступления"""
+
+    def _candidates(self, ticket: Ticket, now: float) -> List[Ticket]:
+        group = [ticket]
+        window = self.window(ticket, now)
+        for other in self._waiting.values():
+            if other is ticket:
+                continue
+            distance = abs(other.band - ticket.band)
+            if distance <= window or distance <= self.window(other, now):
+                group.append(other)
+                if len(group) == self.max_players:
+                    break
+        return group
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))] if ordered else 0.0
+
+
+def run(cls, rate: float, duration: float, band: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    groups = []
+    matchmaker = cls(groups.append, band=band)
+    arrivals = []
+    now = 0.0
+    while now < duration:
+        now += rng.expovariate(rate)
+        arrivals.append((now, max(0, int(rng.gauss(1500, 300)))))
+
+    cpu = time.process_time()
+    next_sweep = MATCH_INTERVAL
+    for moment, rating in arrivals:
+        while next_sweep <= moment:
+            matchmaker.sweep(next_sweep)
+            next_sweep += MATCH_INTERVAL
+        matchmaker.enqueue("bench", rating, now=moment)
+    cpu = time.process_time() - cpu
+
+    waits = [ticket.matched_at - ticket.enqueued for group in groups for ticket in group]
+    spreads = [max(t.rating for t in group) - min(t.rating for t in group) for group in groups]
+    sizes = {}
+    for group in groups:
+        sizes[len(group)] = sizes.get(len(group), 0) + 1
+    return {
+        "tickets": len(arrivals),
+        "matches": len(groups),
+        "matches_per_cpu_s": round(len(groups) / cpu) if cpu else None,
+        "enqueue_us": round(cpu / len(arrivals) * 1e6, 1),
+        "wait_p50_s": round(percentile(waits, 0.5), 1),
+        "wait_p90_s": round(percentile(waits, 0.9), 1),
+        "wait_p99_s": round(percentile(waits, 0.99), 1),
+        "spread_p50": percentile(spreads, 0.5),
+        "spread_p99": percentile(spreads, 0.99),
+        "room_sizes": dict(sorted(sizes.items())),
+        "still_waiting": len(matchmaker),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=200, help="заявок в секунду")
+    parser.add_argument("--duration", type=float, default=600, help="моделируемых секунд")
+    parser.add_argument("--band", type=int, default=MATCH_BAND, help="ширина диапазона рейтинга")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    results = {
+        "bands": run(Matchmaker, args.rate, args.duration, args.band, args.seed),
+        "scan": run(ScanMatchmaker, args.rate, args.duration, args.band, args.seed),
+    }
+    if args.json:
+        print(json.dumps({"rate": args.rate, "duration": args.duration, "band": args.band, "results": results}, indent=2))
+        return
+    print(f"{args.rate:g} tickets/s for {args.duration:g} simulated s, band {args.band}")
+    for name, r in results.items():
+        print(f"{name:>6}: {r['matches']} rooms {r['room_sizes']}, {r['matches_per_cpu_s']} matches/CPU s, "
+              f"{r['enqueue_us']} us/ticket, wait p50/p90/p99 {r['wait_p50_s']}/{r['wait_p90_s']}/{r['wait_p99_s']} s, "
+              f"rating spread p50/p99 {r['spread_p50']}/{r['spread_p99']}, waiting {r['still_waiting']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Размер и скорость кодирования сообщений: JSON против MessagePack
+
+Сравнивает текущий JSON, MessagePack со строковыми ключами и MessagePack
+с номерами ключей (protocol.py) на типичных сообщениях комнаты из 4 игроков.
+Запуск из каталога backend:
+
+    python benchmarks/bench_protocol.py --json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import msgpack
+
+from broadcast import encode_message
+from models import GameRoom, create_player, FARM, MINE, WALL
+from protocol import decode_msgpack, encode_msgpack
+
+
+def sample_messages() -> dict:
+    room = GameRoom(code="BENCH001", players={}, game_state="playing", created_at=datetime.now())
+    for index in range(4):
+        player = create_player(f"{index:08d}-6b1f-4c1e-9a3e-1c2d3e4f5a6b", f"Player {index}")
+        player.buildings[FARM] = index
+        player.buildings[MINE] = 1
+        player.buildings[WALL] = index % 2
+        player.technologies.append("trade_routes")
+        room.players[player.id] = player
+    room.commit_revision()
+    ids = list(room.players)
+    attacker, defender = room.players[ids[0]], room.players[ids[1]]
+
+    attacker.resources[0] -= 100
+    attacker.buildings[FARM] += 1
+    build = {
+        "type": "action_result", "player_id": ids[0],
+        "action": {"type": "build", "building_type": "farm"}, "success": True,
+        "patch": room.commit_revision(),
+    }
+    attacker.army[0] -= 1
+    defender.army[0] -= 3
+    battle = {
+        "type": "battle_result", "attacker_id": ids[0], "defender_id": ids[1], "result": "attacker_wins",
+        "battle_details": {
+            "attacker_power": 20.5, "defender_power": 24.6, "attacker_roll": 90, "defender_roll": 31,
+            "attacker_total": 110.5, "defender_total": 55.6,
+            "loot": {"gold": 100, "wood": 50, "stone": 50, "food": 100},
+            "attacker_losses": {"soldiers": 1}, "defender_losses": {"soldiers": 3},
+        },
+        "patch": room.commit_revision(),
+    }
+    for player in room.players.values():
+        for index in range(4):
+            player.resources[index] += 50
+    room.current_turn = ids[1]
+    turn = {"type": "turn_ended", "next_turn": ids[1], "turn_number": 2, "patch": room.commit_revision()}
+    return {
+        "room_state": {"type": "room_state", "room": room.to_dict()},
+        "action_result": build,
+        "battle_result": battle,
+        "turn_ended": turn,
+    }
+
+
+def per_call_us(function, argument, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(argument)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20000)
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    codecs = {
+        "json": (encode_message, json.loads),
+        "msgpack_str_keys": (
+            lambda m: msgpack.packb(m, use_bin_type=True), lambda b: msgpack.unpackb(b, raw=False)
+        ),
+        "msgpack_int_keys": (encode_msgpack, decode_msgpack),
+    }
+    results = {}
+    for name, message in sample_messages().items():
+        row = {}
+        for codec, (encode, decode) in codecs.items():
+            payload = encode(message)
+            assert decode(payload) == json.loads(encode_message(message)), (name, codec)
+            row[codec] = {
+                "bytes": len(payload.encode() if isinstance(payload, str) else payload),
+                "encode_us": round(per_call_us(encode, message, args.repeat), 2),
+                "decode_us": round(per_call_us(decode, payload, args.repeat), 2),
+            }
+        results[name] = row
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'message':>14} {'codec':>17} {'bytes':>7} {'encode us':>10} {'decode us':>10}")
+    for name, row in results.items():
+        for codec, values in row.items():
+            print(f"{name:>14} {codec:>17} {values['bytes']:>7} {values['encode_us']:>10} {values['decode_us']:>10}")
+
+
+if __name__ == "__main__":
+    main()
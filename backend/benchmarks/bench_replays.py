@@ -0,0 +1,169 @@
+"""Бенчмарк повторов: запись по ходам, размер, перемотка и память при чтении
+
+Синтетическая партия 4 игроков на --turns ходов: за каждый ход игроки
+делают по --actions действий (патчи ресурсов и армий, каждое третье —
+бой с battle_details) и завершают ход. События пишутся через
+FileReplayStore во временный каталог. Измеряется цена record на событие,
+размер несжатых событий и сжатых блоков, время перехода к ходу N через
+индекс против чтения несжатого NDJSON с начала и пиковая память при чтении
+всего повтора потоком против загрузки файла целиком. Запуск из каталога
+backend:
+
+    python benchmarks/bench_replays.py --turns 500 --actions 6
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import replays
+from models import GOLD, SOLDIERS, GameRoom, create_player
+from replays import FileReplayStore
+
+
+def make_room() -> GameRoom:
+    players = {f"player-{i}": create_player(f"player-{i}", f"Игрок {i}") for i in range(4)}
+    room = GameRoom(code="BENCH001", players=players, game_state="playing", created_at=datetime.now(),
+                    current_turn="player-0")
+    room.commit_revision()
+    return room
+
+
+def play(store: FileReplayStore, room: GameRoom, turns: int, actions: int, seed: int = 1):
+    """Разыгрывает партию, передавая каждое событие в store; число событий и время в record"""
+    rng = random.Random(seed)
+    ids = list(room.players)
+    events = 0
+    spent = 0.0
+    for turn in range(turns):
+        for index, player_id in enumerate(ids):
+            player = room.players[player_id]
+            for action in range(actions):
+                player.resources[GOLD] += rng.randint(-50, 80)
+                player.army[SOLDIERS] += rng.randint(0, 3)
+                if action % 3 == 2:
+                    message = {
+                        "type": "battle_result", "attacker_id": player_id, "defender_id": ids[index - 1],
+                        "result": rng.choice(("attacker_wins", "defender_wins")),
+                        "battle_details": {
+                            "attacker_power": rng.randint(10, 200), "defender_power": rng.randint(10, 200),
+                            "attacker_roll": rng.randint(1, 6), "defender_roll": rng.randint(1, 6),
+                            "attacker_losses": [rng.randint(0, 5), 0, 0], "defender_losses": [rng.randint(0, 5), 0, 0],
+                        },
+                    }
+                else:
+                    message = {"type": "action_result", "success": True, "player_id": player_id,
+                               "action": {"type": "train_army", "unit_type": "soldiers", "quantity": 3}}
+                message["patch"] = room.commit_revision()
+                began = time.perf_counter()
+                store.record(room, message)
+                spent += time.perf_counter() - began
+                events += 1
+            room.current_turn = ids[(index + 1) % len(ids)]
+            if index == len(ids) - 1:
+                room.turn_number += 1
+            if turn == turns - 1 and index == len(ids) - 1:
+                room.game_state = "finished"
+                room.winner = ids[0]
+            message = {"type": "turn_ended", "next_turn": room.current_turn,
+                       "turn_number": room.turn_number, "patch": room.commit_revision()}
+            began = time.perf_counter()
+            store.record(room, message)
+            spent += time.perf_counter() - began
+            events += 1
+    return events, spent
+
+
+def peak_kib(fn) -> float:
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+async def run(turns: int, actions: int, directory: str) -> dict:
+    store = FileReplayStore(directory, lambda room: room.to_dict())
+    room = make_room()
+    events, record = play(store, room, turns, actions)
+    await asyncio.sleep(0)  # _finish ставится через call_soon
+    meta = await store.meta(room.code)
+    await store.stop()
+
+    chunks_size = os.path.getsize(os.path.join(directory, room.code + replays.CHUNKS_SUFFIX))
+    # Тот же повтор без сжатия одним NDJSON-файлом — как если бы хранили журнал событий
+    plain_path = os.path.join(directory, "plain.ndjson")
+    with open(plain_path, "wb") as f:
+        for part in store.stream(room.code, meta):
+            f.write(part)
+    plain_size = os.path.getsize(plain_path)
+
+    target = max(1, turns - 1)
+
+    def seek_index():
+        return list(store.stream(room.code, meta, target, target))
+
+    def seek_scan():
+        with open(plain_path, "rb") as f:
+            for line in f:
+                if line.startswith(b'{"turn":%d,' % target):
+                    return line
+
+    def seek_ms(fn, repeat=20):
+        began = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - began) / repeat * 1000
+
+    def read_stream():
+        for part in store.stream(room.code, meta):
+            part.splitlines()
+
+    def read_whole():
+        with open(plain_path, "rb") as f:
+            f.read().splitlines()
+
+    return {
+        "events": events,
+        "record_us_per_event": round(record / events * 1e6, 2),
+        "plain_kib": round(plain_size / 1024),
+        "compressed_kib": round(chunks_size / 1024),
+        "ratio": round(plain_size / chunks_size, 1),
+        "seek_index_ms": round(seek_ms(seek_index), 3),
+        "seek_scan_ms": round(seek_ms(seek_scan), 3),
+        "stream_peak_kib": round(peak_kib(read_stream)),
+        "whole_peak_kib": round(peak_kib(read_whole)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--actions", type=int, default=6, help="действий игрока за ход")
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        result = asyncio.run(run(args.turns, args.actions, directory))
+    if args.json:
+        print(json.dumps({"turns": args.turns, "actions": args.actions, "codec": replays.REPLAY_CODEC,
+                          "results": result}, indent=2))
+        return
+    r = result
+    print(f"{args.turns} turns x 4 players x {args.actions} actions, codec {replays.REPLAY_CODEC}")
+    print(f"  record:  {r['events']} events, {r['record_us_per_event']} us/event")
+    print(f"  size:    {r['plain_kib']} KiB plain NDJSON, {r['compressed_kib']} KiB chunks (x{r['ratio']})")
+    print(f"  seek to turn {max(1, args.turns - 1)}: index {r['seek_index_ms']} ms, scan {r['seek_scan_ms']} ms")
+    print(f"  read all, peak memory: stream {r['stream_peak_kib']} KiB, whole file {r['whole_peak_kib']} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Бенчмарк чтения комнаты: сборка ответа на каждый запрос против кэша по ревизии
+
+Горячая комната (4 игрока, идет партия) читается через ASGI-приложение
+FastAPI клиентом httpx без сети. "rebuild" — прежний обработчик: словари
+игроков и JSONResponse на каждый запрос. "cached" — RoomViewCache: готовые
+байты и ETag, пересобираемые только после commit_revision; "304" — клиент
+присылает If-None-Match. Комната меняется каждые --reads-per-commit
+запросов, как от действий игроков. Отдельно — цена только сборки тела
+без HTTP. Запуск из каталога backend:
+
+    python benchmarks/bench_room_read.py --requests 5000 --reads-per-commit 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import httpx
+from fastapi import FastAPI, Request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from http_cache import cached_response
+from models import GOLD, GameRoom, create_player
+from room_views import RoomViewCache
+
+
+def make_room() -> GameRoom:
+    players = {f"player-{i}": create_player(f"player-{i}", f"Игрок {i}") for i in range(4)}
+    room = GameRoom(code="BENCH001", players=players, game_state="playing", created_at=datetime.now(),
+                    current_turn="player-0", bot_players=["player-3"])
+    room.commit_revision()
+    return room
+
+
+def make_app(room: GameRoom, views: RoomViewCache) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/rebuild/{room_code}")
+    async def rebuild(room_code: str):
+        return {
+            "code": room.code,
+            "players": {pid: p.to_dict() for pid, p in room.players.items()},
+            "game_state": room.game_state,
+            "player_count": len(room.players)
+        }
+
+    @app.get("/cached/{room_code}")
+    async def cached(room_code: str, request: Request):
+        view = views.get(room)
+        return cached_response(request, view.body, view.etag)
+
+    return app
+
+
+async def run(mode: str, requests: int, reads_per_commit: int) -> dict:
+    room = make_room()
+    views = RoomViewCache()
+    transport = httpx.ASGITransport(app=make_app(room, views))
+    path = "/rebuild/BENCH001" if mode == "rebuild" else "/cached/BENCH001"
+    statuses = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        etag = None
+        started = time.perf_counter()
+        for i in range(requests):
+            if i % reads_per_commit == 0:
+                room.players["player-0"].resources[GOLD] += 1
+                room.commit_revision()
+            headers = {"If-None-Match": etag} if mode == "304" and etag else {}
+            response = await client.get(path, headers=headers)
+            etag = response.headers.get("etag", etag)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        elapsed = time.perf_counter() - started
+    return {"requests_per_s": round(requests / elapsed), "statuses": statuses}
+
+
+def body_cost(requests: int, reads_per_commit: int) -> dict:
+    """Только сборка тела ответа, без HTTP-обвязки"""
+    room = make_room()
+    views = RoomViewCache()
+    results = {}
+    for mode in ("rebuild", "cached"):
+        started = time.perf_counter()
+        for i in range(requests):
+            if i % reads_per_commit == 0:
+                room.players["player-0"].resources[GOLD] += 1
+                room.commit_revision()
+            if mode == "rebuild":
+                json.dumps({
+                    "code": room.code,
+                    "players": {pid: p.to_dict() for pid, p in room.players.items()},
+                    "game_state": room.game_state,
+                    "player_count": len(room.players)
+                }, ensure_ascii=False, separators=(",", ":")).encode()
+            else:
+                views.get(room).body
+        results[mode] = round((time.perf_counter() - started) / requests * 1e6, 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--reads-per-commit", type=int, default=20, help="чтений между изменениями комнаты")
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    results = {mode: asyncio.run(run(mode, args.requests, args.reads_per_commit))
+               for mode in ("rebuild", "cached", "304")}
+    body_us = body_cost(args.requests * 4, args.reads_per_commit)
+    if args.json:
+        print(json.dumps({"requests": args.requests, "reads_per_commit": args.reads_per_commit,
+                          "results": results, "body_us": body_us}, indent=2))
+        return
+    print(f"{args.requests} GET /api/room, room changes every {args.reads_per_commit} reads")
+    for mode, r in results.items():
+        print(f"{mode:>8}: {r['requests_per_s']:6d} req/s  {r['statuses']}")
+    print(f"body only: rebuild {body_us['rebuild']} us, cached {body_us['cached']} us per request")
+
+
+if __name__ == "__main__":
+    main()
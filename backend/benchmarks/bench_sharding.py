@@ -0,0 +1,110 @@
+"""Нагрузочный тест шардирования: пропускная способность на 1..N воркерах
+
+Для каждого числа воркеров поднимает кластер через sharded.start_workers,
+затем несколько клиентских процессов создают комнаты, присоединяются к ним
+(запрос приходит на случайный воркер и следует редиректу к владельцу)
+и читают состояние комнат. Печатает запросы в секунду и ускорение.
+
+    python benchmarks/bench_sharding.py --workers 1,2,4 --duration 10
+
+Клиенты тоже потребляют CPU, поэтому для честного замера машина должна
+иметь заметно больше ядер, чем максимальное число воркеров.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sharded import start_workers, stop_workers
+
+
+async def client_loop(urls, duration: float, concurrency: int) -> int:
+    done = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal done
+        while time.perf_counter() < deadline:
+            base = random.choice(urls)
+            response = await client.post(f"{base}/api/create-room", params={"player_name": "bench"})
+            room_code = response.json()["room_code"]
+            await client.post(f"{random.choice(urls)}/api/join-room",
+                              params={"room_code": room_code, "player_name": "bench2"})
+            for _ in range(3):
+                await client.get(f"{random.choice(urls)}/api/room/{room_code}")
+            done += 5
+
+    async with httpx.AsyncClient(follow_redirects=True, timeout=30) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return done
+
+
+def run_client(urls, duration, concurrency, results):
+    results.put(asyncio.run(client_loop(urls, duration, concurrency)))
+
+
+def wait_ready(urls, timeout: float = 30):
+    deadline = time.time() + timeout
+    for url in urls:
+        while True:
+            try:
+                httpx.get(f"{url}/api/health", timeout=1)
+                break
+            except httpx.HTTPError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+
+
+def measure(workers: int, args) -> float:
+    processes = start_workers(workers, args.base_port, "127.0.0.1")
+    urls = [f"http://127.0.0.1:{args.base_port + i}" for i in range(workers)]
+    try:
+        wait_ready(urls)
+        results = multiprocessing.Queue()
+        clients = [
+            multiprocessing.Process(target=run_client, args=(urls, args.duration, args.concurrency, results))
+            for _ in range(args.clients)
+        ]
+        for client in clients:
+            client.start()
+        total = sum(results.get() for _ in clients)
+        for client in clients:
+            client.join()
+        return total / args.duration
+    finally:
+        stop_workers(processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=4, help="клиентских процессов")
+    parser.add_argument("--concurrency", type=int, default=32, help="параллельных сессий на клиента")
+    parser.add_argument("--base-port", type=int, default=18000)
+    parser.add_argument("--json", action="store_true", help="вывести результаты в JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for workers in (int(x) for x in args.workers.split(",")):
+        results[workers] = measure(workers, args)
+    baseline = results[min(results)]
+    if args.json:
+        print(json.dumps({"requests_per_second": results}))
+        return
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8}")
+    for workers, rps in results.items():
+        print(f"{workers:>8} {rps:>10.0f} {rps / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Бенчмарк зрителей: зрители как обычные получатели рассылки против SpectatorHub
+
+Секунда игры одной комнаты: --messages рассылок патчей четырем игрокам.
+В варианте "inline" каждую рассылку получают и все зрители; в варианте
+"hub" рассылка только помечает комнату, а зрители получают один снимок
+за интервал (spectators.SpectatorHub). Измеряется время в пути рассылки
+(то, что ждет игровая логика), полное время вместе с писателями соединений
+и число кадров, ушедших зрителям. Запуск из каталога backend:
+
+    python benchmarks/bench_spectators.py --spectators 0,500,5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from connection import Connection
+from models import GameRoom, GOLD, create_player
+from protocol import EncodedMessage
+from spectators import SpectatorHub
+
+
+class FakeWebSocket:
+    """Имитация WebSocket: считает кадры"""
+
+    def __init__(self):
+        self.frames = 0
+
+    async def send_text(self, data: str):
+        self.frames += 1
+        await asyncio.sleep(0)
+
+
+def make_room() -> GameRoom:
+    players = {f"player-{i}": create_player(f"player-{i}", f"Игрок {i}") for i in range(4)}
+    room = GameRoom(code="BENCH001", players=players, game_state="playing", created_at=datetime.now())
+    room.commit_revision()
+    return room
+
+
+def connect(count: int, name: str):
+    connections = []
+    for i in range(count):
+        # Очередь больше числа сообщений: бенчмарк не должен отключать клиентов
+        connection = Connection(FakeWebSocket(), "BENCH001", f"{name}-{i}", max_queue=1000, high_water=1000)
+        connection.start()
+        connections.append(connection)
+    return connections
+
+
+async def drain(connections):
+    while any(connection.queue_depth for connection in connections):
+        await asyncio.sleep(0)
+    # Последний кадр каждого писателя еще в wait_for
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def run(mode: str, spectator_count: int, messages: int) -> dict:
+    room = make_room()
+    players = connect(4, "player")
+    viewers = connect(spectator_count, "spectator")
+    hub = SpectatorHub(lambda code: room.to_dict(), interval=1.0, delay=0.0)
+    if mode == "hub":
+        for connection in viewers:
+            hub.add(room.code, connection)
+        receivers = players
+    else:
+        receivers = players + viewers
+
+    started = time.perf_counter()
+    in_path = 0.0
+    for _ in range(messages):
+        room.players["player-0"].resources[GOLD] += 1
+        began = time.perf_counter()
+        encoded = EncodedMessage({"type": "action_result", "success": True, "patch": room.commit_revision()})
+        for connection in receivers:
+            connection.send_encoded(encoded)
+        if mode == "hub":
+            hub.mark(room.code)
+        in_path += time.perf_counter() - began
+        # Между рассылками писатели успевают разобрать очереди
+        await drain(players + viewers)
+    if mode == "hub":
+        await hub.tick()
+    await drain(players + viewers)
+    total = time.perf_counter() - started
+
+    frames = sum(connection.websocket.frames for connection in viewers)
+    for connection in players + viewers:
+        await connection.close()
+    return {
+        "broadcast_path_ms": round(in_path * 1000, 2),
+        "total_ms": round(total * 1000, 1),
+        "spectator_frames": frames,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spectators", default="0,500,5000")
+    parser.add_argument("--messages", type=int, default=20, help="рассылок за секунду игры")
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for count in (int(value) for value in args.spectators.split(",")):
+        for mode in ("inline", "hub"):
+            results[f"{mode}/{count}"] = asyncio.run(run(mode, count, args.messages))
+
+    if args.json:
+        print(json.dumps({"messages": args.messages, "results": results}, indent=2))
+        return
+    print(f"{args.messages} broadcasts to 4 players per second of play")
+    print(f"{'mode/spectators':>16} {'path ms':>9} {'total ms':>9} {'frames':>8}")
+    for name, r in results.items():
+        print(f"{name:>16} {r['broadcast_path_ms']:9.2f} {r['total_ms']:9.1f} {r['spectator_frames']:8d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Бенчмарк представления игрового состояния: прежние Pydantic-модели со
+словарями против классов со __slots__ и векторов по индексам (models.py)
+
+Меряет память на комнату и скорость типичных операций для N одновременных
+комнат. Запуск из каталога backend:
+
+    python benchmarks/bench_state.py --rooms 10000 --players 4
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models import GameRoom, create_player, FARM, GOLD, FOOD, MINE
+
+
+# Прежние модели (до перехода на __slots__) — точка сравнения
+class LegacyPlayer(BaseModel):
+    model_config = ConfigDict()
+
+    id: str
+    name: str
+    resources: Dict[str, int]
+    army: Dict[str, int]
+    territories: List[str]
+    buildings: Dict[str, int] = {}
+    technologies: List[str] = []
+    victory_points: int = 0
+    is_ready: bool = False
+
+
+class LegacyGameRoom(BaseModel):
+    model_config = ConfigDict()
+
+    code: str
+    players: Dict[str, LegacyPlayer]
+    game_state: str
+    created_at: datetime
+    current_turn: Optional[str] = None
+    turn_number: int = 1
+    winner: Optional[str] = None
+
+    def to_dict(self):
+        data = self.model_dump()
+        data['created_at'] = self.created_at.isoformat()
+        data['players'] = {pid: p.model_dump() for pid, p in self.players.items()}
+        return data
+
+
+LEGACY_FARM_COST = {"wood": 50, "gold": 100}
+FARM_COST = (100, 50, 0, 0)
+
+
+def legacy_create_player(player_id: str, name: str) -> LegacyPlayer:
+    return LegacyPlayer(
+        id=player_id,
+        name=name,
+        resources={"gold": 1000, "wood": 500, "stone": 500, "food": 1000},
+        army={"soldiers": 10, "archers": 5, "cavalry": 3},
+        territories=[],
+    )
+
+
+def make_legacy_rooms(count: int, players: int) -> List[LegacyGameRoom]:
+    return [
+        LegacyGameRoom(
+            code=f"R{i:07d}",
+            players={f"p{i}-{j}": legacy_create_player(f"p{i}-{j}", f"Player {j}") for j in range(players)},
+            game_state="playing",
+            created_at=datetime.now(),
+        )
+        for i in range(count)
+    ]
+
+
+def make_rooms(count: int, players: int) -> List[GameRoom]:
+    return [
+        GameRoom(
+            code=f"R{i:07d}",
+            players={f"p{i}-{j}": create_player(f"p{i}-{j}", f"Player {j}") for j in range(players)},
+            game_state="playing",
+            created_at=datetime.now(),
+        )
+        for i in range(count)
+    ]
+
+
+def legacy_build(player: LegacyPlayer):
+    # Как прежний обработчик build: проверка, списание, эффект, счетчик
+    if all(player.resources.get(r, 0) >= a for r, a in LEGACY_FARM_COST.items()):
+        for r, a in LEGACY_FARM_COST.items():
+            player.resources[r] -= a
+        player.resources.update({"food": player.resources.get("food", 0) + 100})
+        player.buildings["farm"] = player.buildings.get("farm", 0) + 1
+
+
+def build(player):
+    resources = player.resources
+    if all(have >= amount for have, amount in zip(resources, FARM_COST)):
+        for index, amount in enumerate(FARM_COST):
+            resources[index] -= amount
+        resources[FOOD] += 100
+        player.buildings[FARM] += 1
+
+
+def legacy_income(player: LegacyPlayer):
+    resources = player.resources
+    resources["gold"] += 50 + player.buildings.get("mine", 0) * 25
+    resources["wood"] += 25
+    resources["stone"] += 25
+    resources["food"] += 50 + player.buildings.get("farm", 0) * 30
+
+
+def income(player):
+    resources = player.resources
+    resources[0] += 50
+    resources[1] += 25
+    resources[2] += 25
+    resources[3] += 50
+    resources[GOLD] += player.buildings[MINE] * 25
+    resources[FOOD] += player.buildings[FARM] * 30
+
+
+def measure_memory(factory, count: int, players: int):
+    gc.collect()
+    tracemalloc.start()
+    rooms = factory(count, players)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rooms, current / count
+
+
+def ops_per_sec(rooms, operation, repeat: int) -> float:
+    players = [p for room in rooms for p in room.players.values()]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for player in players:
+            operation(player)
+    return len(players) * repeat / (time.perf_counter() - start)
+
+
+def rooms_per_sec(rooms, operation) -> float:
+    start = time.perf_counter()
+    for room in rooms:
+        operation(room)
+    return len(rooms) / (time.perf_counter() - start)
+
+
+def run(count: int, players: int, repeat: int) -> dict:
+    results = {}
+    for name, factory, build_op, income_op in (
+        ("pydantic", make_legacy_rooms, legacy_build, legacy_income),
+        ("slots", make_rooms, build, income),
+    ):
+        rooms, bytes_per_room = measure_memory(factory, count, players)
+        results[name] = {
+            "bytes_per_room": round(bytes_per_room),
+            "build_ops_per_sec": round(ops_per_sec(rooms, build_op, repeat)),
+            "income_ops_per_sec": round(ops_per_sec(rooms, income_op, repeat)),
+            "to_dict_rooms_per_sec": round(rooms_per_sec(rooms, lambda room: room.to_dict())),
+        }
+        del rooms
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=10000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    results = run(args.rooms, args.players, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.rooms} rooms x {args.players} players")
+    for name, row in results.items():
+        print(
+            f"{name:>9}: {row['bytes_per_room']:>7} B/room  "
+            f"build {row['build_ops_per_sec']:>10}/s  "
+            f"income {row['income_ops_per_sec']:>10}/s  "
+            f"to_dict {row['to_dict_rooms_per_sec']:>8} rooms/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Бенчмарк часов ходов: одно колесо таймеров против задачи asyncio на комнату
+
+Каждой из N комнат ставится дедлайн в пределах --spread секунд, половина
+комнат затем переносит дедлайн (игрок завершил ход раньше). Измеряются
+память на постановку, CPU процесса до срабатывания всех дедлайнов и
+задержка срабатывания относительно дедлайна. Запуск из каталога backend:
+
+    python benchmarks/bench_turn_clock.py --rooms 10000 --spread 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from turn_clock import TURN_CLOCK_TICK, TurnClock
+
+
+async def run_tasks(deadlines, moved):
+    # Прежний подход для таймеров: задача со sleep на каждую комнату
+    loop = asyncio.get_running_loop()
+    lags = []
+    done = asyncio.Event()
+
+    async def timer(deadline):
+        await asyncio.sleep(deadline - time.time())
+        lags.append(time.time() - deadline)
+        if len(lags) == len(deadlines):
+            done.set()
+
+    tracemalloc.start()
+    tasks = {code: loop.create_task(timer(deadline)) for code, deadline in deadlines.items()}
+    for code, deadline in moved.items():
+        tasks[code].cancel()
+        tasks[code] = loop.create_task(timer(deadline))
+        deadlines[code] = deadline
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    await done.wait()
+    return lags, memory
+
+
+async def run_wheel(deadlines, moved, tick):
+    lags = []
+    done = asyncio.Event()
+
+    def on_expire(code, deadline):
+        lags.append(time.time() - deadline)
+        if len(lags) == len(deadlines):
+            done.set()
+
+    tracemalloc.start()
+    clock = TurnClock(on_expire, tick=tick)
+    for code, deadline in deadlines.items():
+        clock.schedule(code, deadline)
+    for code, deadline in moved.items():
+        clock.schedule(code, deadline)
+        deadlines[code] = deadline
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    await clock.start()
+    await done.wait()
+    await clock.stop()
+    return lags, memory
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def measure(mode: str, rooms: int, spread: float, tick: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    start = time.time() + 0.5
+    deadlines = {f"R{i:07d}": start + rng.random() * spread for i in range(rooms)}
+    moved = {code: start + rng.random() * spread for code in list(deadlines)[::2]}
+    cpu = time.process_time()
+    if mode == "tasks":
+        lags, memory = asyncio.run(run_tasks(deadlines, moved))
+    else:
+        lags, memory = asyncio.run(run_wheel(deadlines, moved, tick))
+    return {
+        "cpu_ms": round((time.process_time() - cpu) * 1000, 1),
+        "memory_kb": round(memory / 1024),
+        "lag_p50_ms": round(percentile(lags, 0.5) * 1000, 1),
+        "lag_p99_ms": round(percentile(lags, 0.99) * 1000, 1),
+        "lag_max_ms": round(max(lags) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=10000)
+    parser.add_argument("--spread", type=float, default=5.0, help="дедлайны в пределах стольких секунд")
+    parser.add_argument("--tick-ms", type=float, default=TURN_CLOCK_TICK * 1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    results = {
+        mode: measure(mode, args.rooms, args.spread, args.tick_ms / 1000, args.seed)
+        for mode in ("tasks", "wheel")
+    }
+    if args.json:
+        print(json.dumps({"rooms": args.rooms, "spread": args.spread, "tick_ms": args.tick_ms,
+                          "results": results}, indent=2))
+        return
+    print(f"{args.rooms} rooms, deadlines within {args.spread}s, wheel tick {args.tick_ms} ms")
+    print(f"{'mode':>6} {'cpu ms':>8} {'mem KB':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for mode, r in results.items():
+        print(f"{mode:>6} {r['cpu_ms']:8.1f} {r['memory_kb']:8d} {r['lag_p50_ms']:8.1f} "
+              f"{r['lag_p99_ms']:8.1f} {r['lag_max_ms']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
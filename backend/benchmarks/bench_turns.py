@@ -0,0 +1,121 @@
+"""Бенчмарк начисления дохода за ход для множества комнат на одном тике
+
+Сравнивает пересчет бонусов на каждом ходу, кэшированный доход
+(turns.apply_income для каждой комнаты) и вариант с матрицей NumPy. Запуск из каталога backend:
+
+    python benchmarks/bench_turns.py --rooms 10000 --players 4
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models import GameRoom, create_player, FARM, MINE, GOLD, FOOD
+from rules import current_rules, rules_for
+from turns import apply_income, compute_income, player_income
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+RULES = current_rules()
+
+
+def make_rooms(count: int, players: int):
+    rooms = []
+    for i in range(count):
+        room = GameRoom(
+            code=f"R{i:07d}",
+            players={f"p{i}-{j}": create_player(f"p{i}-{j}", f"Player {j}") for j in range(players)},
+            game_state="playing",
+            created_at=datetime.now(),
+            rules_version=RULES.version,
+        )
+        for j, player in enumerate(room.players.values()):
+            player.buildings[FARM] = j % 3
+            player.buildings[MINE] = (i + j) % 2
+            if j % 2:
+                player.technologies.append("trade_routes")
+        rooms.append(room)
+    return rooms
+
+
+def recompute_each_turn(rooms):
+    # Как прежний handle_end_turn: бонусы и проверки технологий на каждом ходу
+    for room in rooms:
+        for player in room.players.values():
+            resources = player.resources
+            for index, amount in enumerate(RULES.base_income):
+                resources[index] += amount
+            resources[GOLD] += player.buildings[MINE] * 25
+            resources[FOOD] += player.buildings[FARM] * 30
+            if "trade_routes" in player.technologies:
+                resources[GOLD] += 25
+            if "military_tactics" in player.technologies:
+                resources[FOOD] += 10
+
+
+def cached_income(rooms):
+    # Как handle_end_turn: кэшированный доход, комнаты по одной
+    for room in rooms:
+        apply_income(room.players.values(), rules_for(room))
+
+
+def numpy_matrix(rooms):
+    # Матрица игроки x ресурсы: сборка из списков, сложение, раскладка обратно
+    players = [player for room in rooms for player in room.players.values()]
+    size = len(players) * 4
+    resources = np.fromiter(itertools.chain.from_iterable(p.resources for p in players), np.int64, size)
+    resources += np.fromiter(itertools.chain.from_iterable(player_income(p, RULES) for p in players), np.int64, size)
+    flat = resources.tolist()
+    for index, player in enumerate(players):
+        player.resources[:] = flat[index * 4:index * 4 + 4]
+
+
+def timed(function, rooms, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(rooms)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=10000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = parser.parse_args()
+
+    rooms = make_rooms(args.rooms, args.players)
+    expected = [compute_income(p, RULES) for room in rooms for p in room.players.values()]
+    variants = {"recompute": recompute_each_turn, "cached": cached_income}
+    if np is not None:
+        variants["numpy"] = numpy_matrix
+
+    results = {}
+    for name, function in variants.items():
+        before = [list(p.resources) for room in rooms for p in room.players.values()]
+        function(rooms)
+        after = [p.resources for room in rooms for p in room.players.values()]
+        # Все варианты должны начислять одно и то же
+        assert all([b + i for b, i in zip(old, income)] == new
+                   for old, income, new in zip(before, expected, after)), name
+        results[name] = round(timed(function, rooms, args.repeat), 2)
+
+    if args.json:
+        print(json.dumps({"rooms": args.rooms, "players": args.players, "ms_per_tick": results}, indent=2))
+        return
+    print(f"{args.rooms} rooms x {args.players} players, ms per tick")
+    for name, ms in results.items():
+        print(f"{name:>10}: {ms:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""Боты: выбор хода поиском с ограниченным временем вне цикла событий
+
+Поиск — плоский Монте-Карло с UCB1: для каждого допустимого действия бота
+разыгрываются случайные продолжения партии на BOT_ROLLOUT_TURNS ходов по
+тем же правилам (rules.Rules, combat.resolve_battle, turns.compute_income)
+на легкой копии состояния, пока не выйдет бюджет BOT_THINK_MS. Выбирается
+действие с лучшей средней оценкой. Поиск (choose_action) выполняется
+в ProcessPoolExecutor и получает только сериализуемый снимок (export_state),
+поэтому цикл событий и другие комнаты его не ждут.
+
+BotManager решает, когда боту ходить, и применяет выбранные действия через
+те же обработчики, что и сообщения клиентов: ход бота — это обычные
+game_action и end_turn в очереди комнаты. Одновременно считается не больше
+BOT_MAX_CONCURRENT решений на процесс; если ход бота закончился раньше
+(например, по часам хода), задача бота отменяется, а еще не начатое
+вычисление снимается с очереди пула.
+"""
+import asyncio
+import math
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from combat import army_power, resolve_battle
+from metrics import bot_decision_seconds, bot_rollouts
+from models import BUILDINGS, UNITS, WALL
+from rules import Rules
+from turns import compute_income
+
+# Передавать управление ботом игроку, отключившемуся во время партии
+BOT_TAKEOVER = os.getenv("BOT_TAKEOVER", "true").lower() == "true"
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", str(os.cpu_count() or 1)))
+BOT_MAX_CONCURRENT = int(os.getenv("BOT_MAX_CONCURRENT", str(BOT_WORKERS)))
+BOT_THINK = float(os.getenv("BOT_THINK_MS", "200")) / 1000
+BOT_ACTIONS_PER_TURN = int(os.getenv("BOT_ACTIONS_PER_TURN", "3"))
+BOT_ROLLOUT_TURNS = int(os.getenv("BOT_ROLLOUT_TURNS", "6"))
+# Максимум юнитов, обучаемых ботом за одно действие
+BOT_TRAIN_BATCH = 5
+
+# Действие поиска: ("build", здание), ("train", юнит, количество),
+# ("research", технология), ("attack", индекс цели), ("end",)
+Move = tuple
+END_TURN: Move = ("end",)
+
+
+class SimPlayer:
+    """Легкая копия игрока для розыгрышей (совместима с turns.compute_income)"""
+
+    __slots__ = ("resources", "army", "buildings", "technologies", "victory_points")
+
+    def __init__(self, resources, army, buildings, technologies, victory_points):
+        self.resources = list(resources)
+        self.army = list(army)
+        self.buildings = list(buildings)
+        self.technologies = list(technologies)
+        self.victory_points = victory_points
+
+    def copy(self) -> "SimPlayer":
+        return SimPlayer(self.resources, self.army, self.buildings, self.technologies, self.victory_points)
+
+
+def portable_rules(rules: Rules) -> Rules:
+    """Правила, которые можно передать в другой процесс (MappingProxyType не сериализуется)"""
+    return rules._replace(tech_costs=dict(rules.tech_costs), tech_income=dict(rules.tech_income))
+
+def export_state(room, player_id: str) -> tuple:
+    """Сериализуемый снимок комнаты для поиска: (игроки по порядку ходов, индекс бота)"""
+    players = tuple(
+        (p.id, tuple(p.resources), tuple(p.army), tuple(p.buildings), tuple(p.technologies), p.victory_points)
+        for p in room.players.values()
+    )
+    return players, [p[0] for p in players].index(player_id)
+
+
+def _affordable(resources: Sequence[int], cost: Sequence[int], times: int = 1) -> bool:
+    return all(have >= amount * times for have, amount in zip(resources, cost))
+
+def _pay(resources: List[int], cost: Sequence[int], times: int = 1):
+    for index, amount in enumerate(cost):
+        resources[index] -= amount * times
+
+def legal_moves(players: List[SimPlayer], me: int, rules: Rules) -> List[Move]:
+    """Допустимые действия игрока; завершение хода допустимо всегда"""
+    player = players[me]
+    resources = player.resources
+    moves = [END_TURN]
+    for index, cost in enumerate(rules.building_costs):
+        if _affordable(resources, cost):
+            moves.append(("build", index))
+    for index, cost in enumerate(rules.unit_costs):
+        quantity = min((have // amount for have, amount in zip(resources, cost) if amount), default=0)
+        if quantity > 0:
+            moves.append(("train", index, min(quantity, BOT_TRAIN_BATCH)))
+    for tech, cost in rules.tech_costs.items():
+        if tech not in player.technologies and _affordable(resources, cost):
+            moves.append(("research", tech))
+    if sum(player.army):
+        moves.extend(("attack", target) for target in range(len(players)) if target != me)
+    return moves
+
+def apply_move(players: List[SimPlayer], me: int, move: Move, rules: Rules, rng: random.Random):
+    """Применяет действие к копии состояния так же, как обработчики main"""
+    player = players[me]
+    kind = move[0]
+    if kind == "build":
+        index = move[1]
+        _pay(player.resources, rules.building_costs[index])
+        effect = rules.building_effects[index]
+        if effect is not None:
+            for resource, amount in enumerate(effect):
+                player.resources[resource] += amount
+        player.buildings[index] += 1
+    elif kind == "train":
+        _, index, quantity = move
+        _pay(player.resources, rules.unit_costs[index], quantity)
+        player.army[index] += quantity
+    elif kind == "research":
+        _pay(player.resources, rules.tech_costs[move[1]])
+        player.technologies.append(move[1])
+        player.victory_points += 2
+    elif kind == "attack":
+        defender = players[move[1]]
+        outcome = resolve_battle(
+            player.army, defender.army, defender.buildings[WALL],
+            rng.randint(rules.roll_min, rules.roll_max), rng.randint(rules.roll_min, rules.roll_max), rules
+        )
+        player.army[:] = outcome["attacker_army"]
+        defender.army[:] = outcome["defender_army"]
+        if outcome["attacker_wins"]:
+            for index, amount in enumerate(defender.resources):
+                loot = int(amount * rules.loot_share)
+                player.resources[index] += loot
+                defender.resources[index] = max(0, amount - loot)
+            player.victory_points += 1
+        else:
+            defender.victory_points += 1
+
+def winner(players: List[SimPlayer]) -> Optional[int]:
+    """Индекс победителя по правилам main.check_victory_conditions"""
+    for index, player in enumerate(players):
+        if player.victory_points >= 10:
+            return index
+        if sum(player.army) > 0 and all(
+            sum(other.army) == 0 for other_index, other in enumerate(players) if other_index != index
+        ):
+            return index
+    return None
+
+def end_turn(players: List[SimPlayer], rules: Rules):
+    """Доход за ход начисляется всем игрокам, как в handle_end_turn"""
+    for player in players:
+        for index, amount in enumerate(compute_income(player, rules)):
+            player.resources[index] += amount
+
+def evaluate(players: List[SimPlayer], me: int, rules: Rules) -> float:
+    """Оценка позиции для игрока me в [0, 1]: доля его силы среди всех"""
+    won = winner(players)
+    if won is not None:
+        return 1.0 if won == me else 0.0
+    values = [
+        p.victory_points * 50 + army_power(p.army, rules) * 2 + sum(compute_income(p, rules)) + sum(p.resources) * 0.05
+        for p in players
+    ]
+    total = sum(values)
+    return values[me] / total if total else 1 / len(players)
+
+def rollout(players: List[SimPlayer], me: int, move: Move, rules: Rules, turns: int, rng: random.Random) -> float:
+    """Разыгрывает продолжение после move случайными действиями всех игроков"""
+    apply_move(players, me, move, rules, rng)
+    current = me
+    for _ in range(turns * len(players)):
+        if winner(players) is not None:
+            break
+        if move != END_TURN:
+            # Ход продолжается: до двух случайных действий и завершение
+            for _ in range(2):
+                move = rng.choice(legal_moves(players, current, rules))
+                if move == END_TURN:
+                    break
+                apply_move(players, current, move, rules, rng)
+        end_turn(players, rules)
+        current = (current + 1) % len(players)
+        move = None
+    return evaluate(players, me, rules)
+
+
+def to_action(move: Move, player_ids: Sequence[str]) -> Optional[dict]:
+    """Действие поиска -> game_action клиента; None — завершить ход"""
+    kind = move[0]
+    if kind == "build":
+        return {"type": "build", "building_type": BUILDINGS[move[1]]}
+    if kind == "train":
+        return {"type": "train_army", "unit_type": UNITS[move[1]], "quantity": move[2]}
+    if kind == "research":
+        return {"type": "research", "tech_type": move[1]}
+    if kind == "attack":
+        return {"type": "attack", "target_player_id": player_ids[move[1]]}
+    return None
+
+def choose_action(state: tuple, rules: Rules, budget: float = BOT_THINK,
+                  turns: int = BOT_ROLLOUT_TURNS, seed: Optional[int] = None) -> Tuple[Optional[dict], int]:
+    """Выбирает действие бота за budget секунд (выполняется в процессе пула)
+
+    Возвращает (game_action или None — завершить ход, число розыгрышей).
+    """
+    deadline = time.perf_counter() + budget
+    rng = random.Random(seed)
+    rows, me = state
+    player_ids = [row[0] for row in rows]
+    players = [SimPlayer(*row[1:]) for row in rows]
+    moves = legal_moves(players, me, rules)
+    if len(moves) == 1:
+        return None, 0
+    totals = [0.0] * len(moves)
+    counts = [0] * len(moves)
+    rollouts = 0
+    while True:
+        # Каждое действие хотя бы раз, затем UCB1
+        if rollouts < len(moves):
+            choice = rollouts
+        else:
+            log_n = math.log(rollouts)
+            choice = max(
+                range(len(moves)),
+                key=lambda i: totals[i] / counts[i] + math.sqrt(2 * log_n / counts[i])
+            )
+        score = rollout([p.copy() for p in players], me, moves[choice], rules, turns, rng)
+        totals[choice] += score
+        counts[choice] += 1
+        rollouts += 1
+        if rollouts >= len(moves) and time.perf_counter() >= deadline:
+            break
+    best = max(range(len(moves)), key=lambda i: totals[i] / counts[i])
+    return to_action(moves[best], player_ids), rollouts
+
+
+class BotTurn:
+    """Задача, играющая один ход бота"""
+
+    __slots__ = ("player_id", "task")
+
+    def __init__(self, player_id: str, task: asyncio.Task):
+        self.player_id = player_id
+        self.task = task
+
+
+class BotManager:
+    """Запускает ходы ботов и ограничивает число одновременных вычислений"""
+
+    def __init__(
+        self,
+        bot_turn: Callable[[str], Optional[str]],
+        snapshot: Callable[[str, str], Optional[Tuple[tuple, Rules]]],
+        act: Callable[[str, str, dict], Awaitable[bool]],
+        workers: int = BOT_WORKERS,
+        max_concurrent: int = BOT_MAX_CONCURRENT,
+        think: float = BOT_THINK,
+        actions_per_turn: int = BOT_ACTIONS_PER_TURN,
+    ):
+        # bot_turn(room_code) -> ID бота, который должен ходить сейчас, или None
+        self.bot_turn = bot_turn
+        # snapshot(room_code, player_id) -> (export_state, правила) или None
+        self.snapshot = snapshot
+        # act(room_code, player_id, message) -> применено ли сообщение
+        self.act = act
+        self.workers = workers
+        self.max_concurrent = max_concurrent
+        self.think = think
+        self.actions_per_turn = actions_per_turn
+        self._turns: Dict[str, BotTurn] = {}
+        self._rules: Dict[int, Rules] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def notify(self, room_code: str):
+        """Проверяет, не должен ли в комнате ходить бот (после смены хода и т.п.)"""
+        player_id = self.bot_turn(room_code)
+        current = self._turns.get(room_code)
+        if current is not None and not current.task.done():
+            if current.player_id == player_id:
+                return
+            # Ход бота закончился без него — вычисление больше не нужно
+            current.task.cancel()
+        if player_id is None:
+            self._turns.pop(room_code, None)
+            return
+        task = asyncio.create_task(self._play_turn(room_code, player_id))
+        self._turns[room_code] = BotTurn(player_id, task)
+        task.add_done_callback(lambda done: self._finished(room_code, done))
+
+    def _finished(self, room_code: str, task: asyncio.Task):
+        current = self._turns.get(room_code)
+        if current is not None and current.task is task:
+            del self._turns[room_code]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Bot error in room {room_code}: {task.exception()!r}")
+
+    def cancel(self, room_code: str):
+        current = self._turns.pop(room_code, None)
+        if current is not None:
+            current.task.cancel()
+
+    def _portable(self, rules: Rules) -> Rules:
+        portable = self._rules.get(rules.version)
+        if portable is None:
+            portable = self._rules[rules.version] = portable_rules(rules)
+        return portable
+
+    async def decide(self, state: tuple, rules: Rules) -> Optional[dict]:
+        """Выбирает действие в пуле процессов, не больше max_concurrent одновременно"""
+        if self._executor is None:
+            # spawn: к этому моменту сервер уже держит потоки (журнал, хранилище),
+            # а fork процесса с потоками небезопасен
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        async with self._slots:
+            started = time.perf_counter()
+            future = self._executor.submit(choose_action, state, self._portable(rules), self.think)
+            # Отмена задачи бота снимает еще не начатое вычисление с очереди пула
+            action, rollouts = await asyncio.wrap_future(future)
+            bot_decision_seconds.observe(time.perf_counter() - started)
+            bot_rollouts.inc(rollouts)
+            return action
+
+    async def _play_turn(self, room_code: str, player_id: str):
+        for _ in range(self.actions_per_turn):
+            snapshot = self.snapshot(room_code, player_id)
+            if snapshot is None:
+                return
+            action = await self.decide(*snapshot)
+            if action is None:
+                break
+            if not await self.act(room_code, player_id, {"type": "game_action", "action": action}):
+                return
+        await self.act(room_code, player_id, {"type": "end_turn"})
+
+    async def stop(self):
+        for room_code in list(self._turns):
+            self.cancel(room_code)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
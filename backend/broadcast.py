@@ -0,0 +1,75 @@
+"""Сериализация исходящих сообщений: один раз на сообщение, а не на получателя,
+и объединение сообщений одного события в один кадр"""
+import asyncio
+import json
+import os
+from typing import Dict, List, Optional
+
+from fastapi import WebSocket
+
+try:
+    import orjson  # Быстрый JSON-энкодер, если установлен
+except ImportError:
+    orjson = None
+
+# Таймаут отправки одного сообщения одному клиенту (секунды)
+SEND_TIMEOUT = float(os.getenv("BROADCAST_SEND_TIMEOUT", "2.0"))
+
+# Код закрытия для клиентов, которые не успевают принимать сообщения
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+# Объединять сообщения одного входящего события в один кадр
+BATCHING_ENABLED = os.getenv("BROADCAST_BATCHING", "true").lower() == "true"
+
+
+def encode_message(message: dict) -> str:
+    """Сериализует сообщение в JSON один раз для всех получателей"""
+    if orjson is not None:
+        return orjson.dumps(message).decode()
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+async def close_quietly(connection: WebSocket, code: int = SLOW_CLIENT_CLOSE_CODE, reason: str = ""):
+    """Закрывает соединение, игнорируя ошибки уже разорванных сокетов"""
+    try:
+        await asyncio.wait_for(connection.close(code=code, reason=reason), SEND_TIMEOUT)
+    except Exception:
+        pass
+
+
+
+class MessageBatcher:
+    """Копит сообщения комнаты, порожденные одним входящим событием
+
+    Пока пакет комнаты открыт, рассылка добавляет сообщения в него вместо
+    отправки; finish возвращает одно сообщение как есть, а несколько —
+    конвертом {"type": "batch", "messages": [...]} с исходным порядком.
+    """
+
+    def __init__(self, enabled: bool = BATCHING_ENABLED):
+        self.enabled = enabled
+        self._pending: Dict[str, List[dict]] = {}
+
+    def begin(self, room_code: str) -> bool:
+        """Открывает пакет; False — батчинг выключен или пакет уже открыт выше по стеку"""
+        if not self.enabled or room_code in self._pending:
+            return False
+        self._pending[room_code] = []
+        return True
+
+    def add(self, room_code: str, message: dict) -> bool:
+        """Добавляет сообщение в открытый пакет; False — пакета нет, отправлять сразу"""
+        messages = self._pending.get(room_code)
+        if messages is None:
+            return False
+        messages.append(message)
+        return True
+
+    def finish(self, room_code: str) -> Optional[dict]:
+        """Закрывает пакет и возвращает сообщение для отправки (или None, если пусто)"""
+        messages = self._pending.pop(room_code, None)
+        if not messages:
+            return None
+        if len(messages) == 1:
+            return messages[0]
+        return {"type": "batch", "messages": messages}
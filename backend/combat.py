@@ -0,0 +1,108 @@
+"""Боевая система: чистое разрешение боя без сети и состояния комнаты
+
+resolve_battle получает составы армий, число стен защитника, броски и
+правила комнаты (rules.Rules) и возвращает итог боя, не изменяя входные
+данные. Его используют обработчик атаки (main.handle_attack) и пакетный
+симулятор (battle_sim.py).
+"""
+import random
+from typing import Dict, List, Sequence, Tuple
+
+from models import UNITS
+from rules import Rules
+
+
+def army_power(army: Sequence[int], rules: Rules) -> float:
+    """Сила армии с учетом типов юнитов"""
+    power = rules.unit_power
+    return army[0] * power[0] + army[1] * power[1] + army[2] * power[2]
+
+def defense_power(army: Sequence[int], walls: int, rules: Rules) -> float:
+    """Сила защитника с бонусом от стен"""
+    return army_power(army, rules) * (1 + walls * rules.wall_bonus)
+
+def allocate_damage(army: List[int], damage: int) -> Dict[str, int]:
+    """Распределяет урон по юнитам по порядку, пока он не исчерпан"""
+    losses = {}
+    for index, count in enumerate(army):
+        if count > 0:
+            unit_damage = min(damage, count)
+            army[index] -= unit_damage
+            losses[UNITS[index]] = unit_damage
+            damage -= unit_damage
+            if damage <= 0:
+                break
+    return losses
+
+def allocate_attrition(army: List[int], budget: int, divisor: int) -> Dict[str, int]:
+    """Небольшие потери стороны: не больше count // divisor юнитов каждого типа"""
+    losses = {}
+    for index, count in enumerate(army):
+        if count > 0 and budget > 0:
+            unit_damage = min(budget, count // divisor)
+            army[index] -= unit_damage
+            losses[UNITS[index]] = unit_damage
+            budget -= unit_damage
+    return losses
+
+def roll_dice(rules: Rules) -> Tuple[int, int]:
+    """Броски атакующего и защитника"""
+    return random.randint(rules.roll_min, rules.roll_max), random.randint(rules.roll_min, rules.roll_max)
+
+def compute_loot(resources: Sequence[int], rules: Rules) -> List[int]:
+    """Добыча атакующего с ресурсов защитника"""
+    return [int(amount * rules.loot_share) for amount in resources]
+
+def resolve_battle(
+    attacker_army: Sequence[int],
+    defender_army: Sequence[int],
+    defender_walls: int,
+    attacker_roll: int,
+    defender_roll: int,
+    rules: Rules,
+) -> dict:
+    """Разрешает бой и возвращает итог
+
+    Результат: attacker_wins, новые составы армий (attacker_army,
+    defender_army), потери (attacker_losses, defender_losses) и details —
+    силы, броски и итоговые значения для battle_result.
+    """
+    attacker = list(attacker_army)
+    defender = list(defender_army)
+    attacker_power = army_power(attacker, rules)
+    defender_power = defense_power(defender, defender_walls, rules)
+    attacker_total = attacker_power + attacker_roll
+    defender_total = defender_power + defender_roll
+
+    attacker_wins = attacker_total > defender_total
+    if attacker_wins:
+        winner, loser = attacker, defender
+        winner_total, loser_total = attacker_total, defender_total
+    else:
+        winner, loser = defender, attacker
+        winner_total, loser_total = defender_total, attacker_total
+
+    # Урон проигравшему пропорционален перевесу победителя
+    damage_ratio = (winner_total - loser_total) / winner_total
+    damage = max(1, int(sum(loser) * damage_ratio * rules.damage_factor[attacker_wins]))
+    loser_losses = allocate_damage(loser, damage)
+
+    # Небольшие потери победителя
+    share, divisor = rules.attrition[attacker_wins]
+    winner_losses = allocate_attrition(winner, max(1, int(sum(winner) * share)), divisor)
+
+    return {
+        "attacker_wins": attacker_wins,
+        "attacker_army": attacker,
+        "defender_army": defender,
+        "attacker_losses": winner_losses if attacker_wins else loser_losses,
+        "defender_losses": loser_losses if attacker_wins else winner_losses,
+        "details": {
+            "attacker_power": round(attacker_power, 1),
+            "defender_power": round(defender_power, 1),
+            "attacker_roll": attacker_roll,
+            "defender_roll": defender_roll,
+            "attacker_total": round(attacker_total, 1),
+            "defender_total": round(defender_total, 1),
+        },
+    }
@@ -0,0 +1,88 @@
+"""Сжатие WebSocket-сообщений (permessage-deflate) с порогом по размеру
+
+uvicorn по умолчанию сжимает каждое сообщение, если клиент согласовал
+permessage-deflate (браузеры предлагают его всегда). Для коротких
+сообщений (ошибки, готовность игрока) заголовок и сброс deflate съедают
+выигрыш, а CPU тратится. Расширение ниже сжимает только сообщения не короче
+WS_DEFLATE_MIN_SIZE байт: RFC 7692 разрешает отправлять часть сообщений
+несжатыми (бит RSV1 выставляется на каждое сообщение отдельно), поэтому
+клиентам ничего менять не нужно.
+
+Протокол подключается при запуске сервера из кода:
+
+    uvicorn.run(app, ws=CompressedWebSocketProtocol)
+
+WS_DEFLATE_MIN_SIZE=0 сжимает все сообщения, как uvicorn по умолчанию.
+"""
+import os
+
+from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
+from websockets import frames
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+
+# Сообщения короче порога (в байтах) отправляются без сжатия
+WS_DEFLATE_MIN_SIZE = int(os.getenv("WS_DEFLATE_MIN_SIZE", "256"))
+# Уровень сжатия zlib (1 — быстрее, 9 — плотнее)
+WS_DEFLATE_LEVEL = int(os.getenv("WS_DEFLATE_LEVEL", "6"))
+# Окно deflate: 2**bits байт истории на соединение в каждую сторону. Патчи
+# соседних сообщений похожи, поэтому окно 12 дает примерно на четверть
+# больше байт, чем 15, но экономит память при тысячах соединений
+WS_DEFLATE_WINDOW_BITS = int(os.getenv("WS_DEFLATE_WINDOW_BITS", "15"))
+WS_DEFLATE_MEM_LEVEL = int(os.getenv("WS_DEFLATE_MEM_LEVEL", "8"))
+
+
+class ThresholdPerMessageDeflate(PerMessageDeflate):
+    """permessage-deflate, пропускающий сообщения короче min_size"""
+
+    def __init__(self, *args, min_size: int = WS_DEFLATE_MIN_SIZE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+
+    def encode(self, frame: frames.Frame) -> frames.Frame:
+        # Решение принимается по первому кадру целого сообщения; фрагменты
+        # сжатого сообщения (OP_CONT) обязаны сжиматься дальше
+        if (
+            frame.fin
+            and frame.opcode not in frames.CTRL_OPCODES
+            and frame.opcode is not frames.OP_CONT
+            and len(frame.data) < self.min_size
+        ):
+            return frame
+        return super().encode(frame)
+
+
+class ThresholdDeflateFactory(ServerPerMessageDeflateFactory):
+    """Согласует permessage-deflate и выдает расширение с порогом"""
+
+    def __init__(self, min_size: int = WS_DEFLATE_MIN_SIZE, **kwargs):
+        super().__init__(**kwargs)
+        self.min_size = min_size
+
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, ThresholdPerMessageDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings,
+            min_size=self.min_size,
+        )
+
+
+def create_deflate_factory(min_size: int = WS_DEFLATE_MIN_SIZE) -> ThresholdDeflateFactory:
+    return ThresholdDeflateFactory(
+        min_size=min_size,
+        server_max_window_bits=WS_DEFLATE_WINDOW_BITS,
+        client_max_window_bits=WS_DEFLATE_WINDOW_BITS,
+        compress_settings={"level": WS_DEFLATE_LEVEL, "memLevel": WS_DEFLATE_MEM_LEVEL},
+    )
+
+
+class CompressedWebSocketProtocol(WebSocketProtocol):
+    """Протокол uvicorn (websockets) со сжатием по порогу вместо сжатия всего"""
+
+    def __init__(self, config, *args, **kwargs):
+        super().__init__(config, *args, **kwargs)
+        if config.ws_per_message_deflate:
+            self.available_extensions = [create_deflate_factory()]
@@ -0,0 +1,173 @@
+"""Соединение игрока: собственная очередь отправки и задача-писатель
+
+Игровая логика только кладет сообщения в очередь (Connection.send) и никогда
+не ждет сеть. Payload — str (JSON, текстовый кадр) или bytes (MessagePack,
+бинарный кадр) в кодировке, согласованной при подключении (protocol.py). Медленный клиент копит свою очередь, не задерживая остальных,
+а если отстает слишком долго — отключается с кодом SLOW_CLIENT_CLOSE_CODE.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple, Union
+
+from fastapi import WebSocket
+
+from broadcast import close_quietly, SEND_TIMEOUT, SLOW_CLIENT_CLOSE_CODE
+from metrics import send_queue_depth, ws_evictions
+from protocol import ENCODERS, EncodedMessage, observe_size
+
+# Порог очереди, выше которого клиент считается отстающим
+QUEUE_HIGH_WATER = int(os.getenv("CONNECTION_QUEUE_HIGH_WATER", "32"))
+# Жесткий предел очереди — при переполнении клиент отключается сразу
+QUEUE_MAX = int(os.getenv("CONNECTION_QUEUE_MAX", "256"))
+# Сколько секунд клиент может оставаться отстающим до отключения
+EVICT_AFTER = float(os.getenv("CONNECTION_EVICT_AFTER", "10.0"))
+
+
+class Connection:
+    """WebSocket с ограниченной очередью исходящих сообщений"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        room_code: str,
+        player_id: str,
+        high_water: int = QUEUE_HIGH_WATER,
+        max_queue: int = QUEUE_MAX,
+        evict_after: float = EVICT_AFTER,
+        encoding: str = "json",
+    ):
+        self.websocket = websocket
+        self.room_code = room_code
+        self.player_id = player_id
+        self.high_water = high_water
+        self.low_water = high_water // 2
+        self.max_queue = max_queue
+        self.evict_after = evict_after
+        self.encoding = encoding
+        self.closed = False
+        self.close_reason: Optional[str] = None
+        # (ключ слияния, готовый payload)
+        self._queue: Deque[Tuple[Optional[str], Union[str, bytes]]] = deque()
+        self._wakeup = asyncio.Event()
+        self._lagging_since: Optional[float] = None
+        self._writer: Optional[asyncio.Task] = None
+        # Закрытие сокета после evict; ссылка не дает сборщику мусора снять задачу
+        self._closer: Optional[asyncio.Task] = None
+        # (код, причина) закрытия после отправки уже поставленных сообщений
+        self._finish: Optional[Tuple[int, str]] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def is_lagging(self) -> bool:
+        """Клиент не успевает разбирать очередь"""
+        return self._lagging_since is not None
+
+    def start(self):
+        """Запускает задачу-писатель"""
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, payload: Union[str, bytes], coalesce_key: Optional[str] = None) -> bool:
+        """Кладет готовый payload в очередь, не дожидаясь отправки
+
+        Сообщение с coalesce_key вытесняет еще не отправленное сообщение
+        с тем же ключом (например, устаревший полный снимок комнаты).
+        Возвращает False, если соединение закрыто или было отключено.
+        """
+        if self.closed:
+            return False
+
+        if coalesce_key is not None:
+            for index, (key, _) in enumerate(self._queue):
+                if key == coalesce_key:
+                    del self._queue[index]
+                    break
+
+        if len(self._queue) >= self.max_queue:
+            self.evict("Send queue overflow")
+            return False
+
+        self._queue.append((coalesce_key, payload))
+        send_queue_depth.observe(len(self._queue))
+
+        if len(self._queue) >= self.high_water:
+            now = time.monotonic()
+            if self._lagging_since is None:
+                self._lagging_since = now
+            elif now - self._lagging_since > self.evict_after:
+                self.evict("Client too slow")
+                return False
+
+        self._wakeup.set()
+        return True
+
+    def send_json(self, message: dict, coalesce_key: Optional[str] = None) -> bool:
+        """Сериализует сообщение в кодировке соединения и кладет его в очередь"""
+        payload = ENCODERS[self.encoding](message)
+        observe_size(message["type"], self.encoding, payload)
+        return self.send(payload, coalesce_key)
+
+    def send_encoded(self, message: EncodedMessage, coalesce_key: Optional[str] = None) -> bool:
+        """Кладет в очередь общее для нескольких получателей сообщение"""
+        return self.send(message.get(self.encoding), coalesce_key)
+
+    def close_after_send(self, reason: str, code: int = 1000):
+        """Закрывает сокет, когда писатель отправит уже поставленные в очередь сообщения"""
+        if self.closed:
+            return
+        self._finish = (code, reason)
+        self._wakeup.set()
+
+    def evict(self, reason: str, code: int = SLOW_CLIENT_CLOSE_CODE):
+        """Отключает клиента (по умолчанию — не справляющегося с потоком сообщений)"""
+        if self.closed:
+            return
+        self.closed = True
+        self.close_reason = reason
+        ws_evictions.labels(reason).inc()
+        self._queue.clear()
+        self._wakeup.set()
+        self._closer = asyncio.create_task(close_quietly(self.websocket, code, reason))
+
+    async def close(self):
+        """Останавливает писателя при отключении клиента"""
+        self.closed = True
+        self._queue.clear()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self._closer is not None and self._closer is not asyncio.current_task():
+            # close_quietly ограничено SEND_TIMEOUT; wait не бросает, даже если задачу отменили
+            await asyncio.wait((self._closer,))
+
+    async def _write_loop(self):
+        try:
+            while not self.closed:
+                if not self._queue:
+                    if self._finish is not None:
+                        self.closed = True
+                        self.close_reason = self._finish[1]
+                        await close_quietly(self.websocket, *self._finish)
+                        return
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                _, payload = self._queue.popleft()
+                if isinstance(payload, bytes):
+                    await asyncio.wait_for(self.websocket.send_bytes(payload), SEND_TIMEOUT)
+                else:
+                    await asyncio.wait_for(self.websocket.send_text(payload), SEND_TIMEOUT)
+                if self._lagging_since is not None and len(self._queue) <= self.low_water:
+                    self._lagging_since = None
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Сокет разорван или отправка не уложилась в таймаут
+            self.evict("Send failed")
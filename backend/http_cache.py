@@ -0,0 +1,31 @@
+"""Условные HTTP-ответы: ETag и If-None-Match
+
+Тело ответа сериализуется заранее и хранится вместе со своим ETag (хеш
+тела); клиент, приславший совпадающий If-None-Match, получает 304 без тела.
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def etag_for(body: bytes) -> str:
+    """Сильный ETag по содержимому тела"""
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Совпадает ли If-None-Match с ETag (слабое сравнение, как требует RFC 9110)"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def cached_response(request: Request, body: bytes, etag: str) -> Response:
+    """200 с готовым телом или 304, если у клиента уже есть эта версия"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,165 @@
+"""Входящий поток клиента: ограничение частоты и слияние однотипных действий
+
+InboundLimiter — маркерные корзины (token bucket) на соединение, отдельная
+корзина на каждый тип сообщения. Бюджеты задаются переменной окружения
+WS_RATE_LIMITS в виде "train_army=5:10,attack=2:4", где 5 — маркеров
+в секунду, 10 — емкость корзины (допустимый всплеск). Не указанные типы
+берут значения из DEFAULT_RATE_LIMITS.
+
+ActionCoalescer копит train_army одного вида юнитов, пришедшие подряд
+в течение окна WS_COALESCE_WINDOW_MS, и передает игровой логике одно
+действие со списком количеств merged_quantities. Обработчик применяет их
+по порядку, как отдельные запросы, но рассылка уходит один раз.
+Каждое слитое сообщение оплачивается маркером, как обычное, а список
+ограничен WS_COALESCE_MAX: следующее сообщение начинает новое действие.
+Любое другое сообщение сначала выталкивает накопленное действие, так что
+порядок сообщений клиента сохраняется.
+"""
+import asyncio
+import os
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from metrics import inbound_merged, inbound_rejected
+
+# Типы входящих сообщений (для game_action — тип действия); прочие — "other"
+MESSAGE_KINDS = (
+    "player_ready", "build", "train_army", "attack", "research", "trade", "end_turn", "sync_request", "other",
+)
+
+# Бюджеты по умолчанию: (маркеров в секунду, емкость корзины)
+DEFAULT_RATE_LIMITS: Dict[str, Tuple[float, float]] = {
+    "player_ready": (2, 5),
+    "build": (5, 10),
+    "train_army": (10, 20),
+    "attack": (2, 5),
+    "research": (2, 5),
+    "trade": (2, 5),
+    "end_turn": (2, 5),
+    "sync_request": (1, 3),
+    "other": (5, 10),
+}
+
+# Окно слияния train_army; 0 — не сливать
+COALESCE_WINDOW = float(os.getenv("WS_COALESCE_WINDOW_MS", "50")) / 1000
+# Сколько запросов можно слить в одно действие
+COALESCE_MAX = int(os.getenv("WS_COALESCE_MAX", "20"))
+
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """Разбирает "kind=rate:burst,..." поверх бюджетов по умолчанию"""
+    limits = dict(DEFAULT_RATE_LIMITS)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        kind, _, budget = item.partition("=")
+        rate, _, burst = budget.partition(":")
+        limits[kind.strip()] = (float(rate), float(burst) if burst else max(1.0, float(rate)))
+    return limits
+
+RATE_LIMITS = parse_rate_limits(os.getenv("WS_RATE_LIMITS", ""))
+# Ошибка action_result сверх бюджета; по ней клиенты отличают ее от отказа правил
+RATE_LIMIT_ERROR = "Rate limit exceeded"
+
+def message_kind(data: dict) -> str:
+    """Тип сообщения для бюджетов и метрик"""
+    kind = data.get("type")
+    if kind == "game_action":
+        kind = (data.get("action") or {}).get("type")
+    return kind if kind in DEFAULT_RATE_LIMITS else "other"
+
+
+class TokenBucket:
+    """Корзина на capacity маркеров, пополняемая со скоростью rate в секунду"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class InboundLimiter:
+    """Ограничитель частоты сообщений одного соединения"""
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]] = RATE_LIMITS):
+        self.limits = limits
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def allow(self, kind: str) -> bool:
+        bucket = self._buckets.get(kind)
+        if bucket is None:
+            bucket = self._buckets[kind] = TokenBucket(*self.limits.get(kind, self.limits["other"]))
+        if bucket.take(time.monotonic()):
+            return True
+        inbound_rejected.labels(kind).inc()
+        return False
+
+
+def _train_key(data: dict) -> Optional[str]:
+    """Вид юнитов, если сообщение — сливаемый train_army"""
+    if data.get("type") != "game_action":
+        return None
+    action = data.get("action") or {}
+    quantity = action.get("quantity", 1)
+    if (action.get("type") != "train_army" or "merged_quantities" in action
+            or type(quantity) is not int or quantity <= 0):
+        return None
+    return action.get("unit_type")
+
+
+class ActionCoalescer:
+    """Сливает подряд идущие train_army одного вида юнитов в одно действие"""
+
+    def __init__(self, submit: Callable[[dict], None], window: float = COALESCE_WINDOW,
+                 max_merged: int = COALESCE_MAX):
+        self.submit = submit
+        self.window = window
+        self.max_merged = max_merged
+        self._pending: Optional[dict] = None
+        self._pending_key: Optional[str] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def merge(self, data: dict) -> bool:
+        """Добавляет сообщение к накопленному действию, если оно совместимо и не заполнено"""
+        if self._pending is None or _train_key(data) != self._pending_key:
+            return False
+        action = self._pending["action"]
+        if len(action.get("merged_quantities", ())) >= self.max_merged:
+            return False
+        if "merged_quantities" not in action:
+            # Второе сообщение подряд — заменяем исходное действие слитым
+            action = {"type": "train_army", "unit_type": self._pending_key,
+                      "merged_quantities": [action.get("quantity", 1)]}
+            self._pending = {"type": "game_action", "action": action}
+        action["merged_quantities"].append(data["action"].get("quantity", 1))
+        inbound_merged.labels("train_army").inc()
+        return True
+
+    def push(self, data: dict):
+        """Передает сообщение дальше, при необходимости начиная накопление"""
+        self.flush()
+        key = _train_key(data) if self.window > 0 else None
+        if key is None:
+            self.submit(data)
+            return
+        self._pending = data
+        self._pending_key = key
+        self._timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+    def flush(self):
+        """Отправляет накопленное действие"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending, self._pending_key = self._pending, None, None
+        if pending is not None:
+            self.submit(pending)
@@ -0,0 +1,150 @@
+"""Жизненный цикл комнат: выселение простаивающих и завершенных комнат
+
+Для каждого состояния комнаты ("waiting", "playing", "finished") ведется
+OrderedDict room_code -> время последней активности в порядке активности.
+Любая активность переносит комнату в конец своей очереди за O(1), поэтому
+проход уборщика смотрит только на голову каждой очереди и выполняет работу,
+пропорциональную числу истекших комнат, а не всех комнат. Жесткий предел
+числа живых комнат соблюдается вытеснением самой давно активной комнаты (LRU)
+без подключенных игроков. Комната с игроками вытесняется, только если
+без игроков не осталось ни одной, кроме только что созданной: предел
+защищает память процесса, и он важнее идущих партий.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+# Время простоя (секунды), после которого комната выселяется, по состояниям
+DEFAULT_TTLS = {
+    "waiting": float(os.getenv("ROOM_TTL_WAITING", "1800")),
+    "playing": float(os.getenv("ROOM_TTL_PLAYING", "7200")),
+    "finished": float(os.getenv("ROOM_TTL_FINISHED", "300")),
+}
+MAX_LIVE_ROOMS = int(os.getenv("MAX_LIVE_ROOMS", "10000"))
+SWEEP_INTERVAL = float(os.getenv("ROOM_SWEEP_INTERVAL", "10"))
+
+
+class RoomLifecycleManager:
+    """Отслеживает активность комнат и выселяет их по TTL и пределу числа комнат"""
+
+    def __init__(
+        self,
+        on_evict: Callable[[str, str], None],
+        has_connections: Callable[[str], bool],
+        ttls: Optional[Dict[str, float]] = None,
+        max_rooms: int = MAX_LIVE_ROOMS,
+        sweep_interval: float = SWEEP_INTERVAL,
+    ):
+        self.on_evict = on_evict
+        self.has_connections = has_connections
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.max_rooms = max_rooms
+        self.sweep_interval = sweep_interval
+        self._queues: Dict[str, "OrderedDict[str, float]"] = {state: OrderedDict() for state in self.ttls}
+        self._state: Dict[str, str] = {}
+        self.evictions: Dict[str, int] = {"idle": 0, "finished": 0, "capacity": 0}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def touch(self, room_code: str, game_state: str):
+        """Отмечает активность в комнате"""
+        now = time.monotonic()
+        previous = self._state.get(room_code)
+        if previous is not None and previous != game_state:
+            del self._queues[previous][room_code]
+        self._state[room_code] = game_state
+        queue = self._queues[game_state]
+        queue[room_code] = now
+        queue.move_to_end(room_code)
+        if previous is None and len(self._state) > self.max_rooms:
+            # Новую комнату не вытесняем: у нее еще не было шанса получить игроков
+            self._enforce_capacity(keep=room_code)
+
+    def track(self, room_code: str, game_state: str):
+        """Начинает отслеживать комнату, не обновляя ее активность"""
+        if room_code not in self._state:
+            self.touch(room_code, game_state)
+
+    def forget(self, room_code: str):
+        """Перестает отслеживать комнату"""
+        state = self._state.pop(room_code, None)
+        if state is not None:
+            del self._queues[state][room_code]
+
+    def _evict(self, room_code: str, reason: str):
+        self.forget(room_code)
+        self.evictions[reason] += 1
+        self.on_evict(room_code, reason)
+
+    def _enforce_capacity(self, keep: str):
+        """Вытесняет самые давно активные комнаты сверх предела, кроме keep
+
+        Сначала ищется комната без подключенных игроков; просмотр каждой очереди
+        идет от головы и пропускает только комнаты с игроками.
+        """
+        while len(self._state) > self.max_rooms:
+            victim = self._oldest(keep, skip_connected=True) or self._oldest(keep, skip_connected=False)
+            if victim is None:
+                return
+            self._evict(victim, "capacity")
+
+    def _oldest(self, keep: str, skip_connected: bool) -> Optional[str]:
+        oldest_code, oldest_time = None, None
+        for queue in self._queues.values():
+            for room_code, last_activity in queue.items():
+                if oldest_time is not None and last_activity >= oldest_time:
+                    break
+                if room_code == keep or (skip_connected and self.has_connections(room_code)):
+                    continue
+                oldest_code, oldest_time = room_code, last_activity
+                break
+        return oldest_code
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Выселяет комнаты с истекшим TTL; работа пропорциональна числу истекших"""
+        now = time.monotonic() if now is None else now
+        evicted = 0
+        for state, queue in self._queues.items():
+            ttl = self.ttls[state]
+            while queue:
+                room_code, last_activity = next(iter(queue.items()))
+                if now - last_activity < ttl:
+                    break
+                if self.has_connections(room_code):
+                    # Игроки еще подключены — считаем комнату активной
+                    queue[room_code] = now
+                    queue.move_to_end(room_code)
+                    continue
+                self._evict(room_code, "finished" if state == "finished" else "idle")
+                evicted += 1
+        return evicted
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Room sweep error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "tracked_rooms": len(self._state),
+            "rooms_by_state": {state: len(queue) for state, queue in self._queues.items()},
+            "evictions": dict(self.evictions),
+        }
+
+    async def start(self):
+        self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
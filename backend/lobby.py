@@ -0,0 +1,178 @@
+"""Лобби: список комнат по вторичным индексам и готовые страницы ответа
+
+Для каждой комнаты хранится короткая запись LobbyEntry (состояние, число
+игроков, свободные места, хост, время создания). Записи разложены по
+индексам (состояние, свободные места) -> отсортированный список ключей
+(время создания, код). Индексы обновляются при создании комнаты, входе
+игрока, старте, завершении и выселении; запрос списка берет из нужных
+индексов срезы после курсора и сливает их, не трогая объекты комнат.
+
+Сериализованная страница (тело и ETag) кэшируется по параметрам запроса
+вместе с версией индекса и пересобирается только после изменения индекса.
+Если после пересборки тело не изменилось, ETag остается прежним, и
+опрашивающие клиенты продолжают получать 304.
+"""
+import heapq
+import json
+import math
+import os
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from http_cache import etag_for
+from models import MAX_PLAYERS, GameRoom
+
+LOBBY_PAGE_SIZE = int(os.getenv("LOBBY_PAGE_SIZE", "50"))
+LOBBY_PAGE_MAX = int(os.getenv("LOBBY_PAGE_MAX", "200"))
+# Сколько разных запросов (фильтр + курсор) держать в кэше страниц
+LOBBY_CACHE_SIZE = int(os.getenv("LOBBY_CACHE_SIZE", "256"))
+
+Key = Tuple[float, str]
+
+
+class LobbyEntry(NamedTuple):
+    code: str
+    game_state: str
+    created: float
+    created_at: str
+    host: Optional[str]
+    player_count: int
+    free_seats: int
+    turn_seconds: int
+    rules_version: Optional[int]
+
+    def to_dict(self) -> dict:
+        return {
+            "code": self.code,
+            "game_state": self.game_state,
+            "created_at": self.created_at,
+            "host": self.host,
+            "player_count": self.player_count,
+            "free_seats": self.free_seats,
+            "turn_seconds": self.turn_seconds,
+            "rules_version": self.rules_version,
+        }
+
+
+class LobbyPage(NamedTuple):
+    body: bytes
+    etag: str
+
+
+def entry_for(room: GameRoom) -> LobbyEntry:
+    host = next(iter(room.players.values()), None)
+    return LobbyEntry(
+        code=room.code,
+        game_state=room.game_state,
+        created=room.created_at.timestamp(),
+        created_at=room.created_at.isoformat(),
+        host=host.name if host is not None else None,
+        player_count=len(room.players),
+        free_seats=max(0, MAX_PLAYERS - len(room.players)) if room.game_state == "waiting" else 0,
+        turn_seconds=room.turn_seconds,
+        rules_version=room.rules_version,
+    )
+
+
+def format_cursor(key: Key) -> str:
+    return f"{key[0]!r}:{key[1]}"
+
+
+def parse_cursor(cursor: str) -> Key:
+    """Ключ последней комнаты предыдущей страницы; ValueError при мусоре"""
+    created, separator, code = cursor.partition(":")
+    value = float(created)
+    if not separator or not code or not math.isfinite(value):
+        raise ValueError(f"invalid cursor: {cursor!r}")
+    return value, code
+
+
+class LobbyIndex:
+    """Вторичные индексы комнат процесса для /api/rooms"""
+
+    def __init__(self, cache_size: int = LOBBY_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._entries: Dict[str, LobbyEntry] = {}
+        # (состояние, свободные места) -> ключи (время создания, код) по возрастанию
+        self._index: Dict[Tuple[str, int], List[Key]] = {}
+        # Растет при каждом изменении индекса; по ней проверяется кэш страниц
+        self.version = 0
+        self._pages: "OrderedDict[tuple, Tuple[int, LobbyPage]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def update(self, room: GameRoom) -> bool:
+        """Обновляет запись комнаты; False, если для лобби ничего не изменилось"""
+        previous = self._entries.get(room.code)
+        # Быстрый путь для commit_room: остальные поля записи после создания не меняются
+        if (previous is not None and previous.game_state == room.game_state
+                and previous.player_count == len(room.players)):
+            return False
+        entry = entry_for(room)
+        if previous is not None:
+            self._unindex(previous)
+        self._entries[entry.code] = entry
+        insort(self._index.setdefault((entry.game_state, entry.free_seats), []), (entry.created, entry.code))
+        self.version += 1
+        return True
+
+    def remove(self, room_code: str):
+        entry = self._entries.pop(room_code, None)
+        if entry is not None:
+            self._unindex(entry)
+            self.version += 1
+
+    def _unindex(self, entry: LobbyEntry):
+        bucket = (entry.game_state, entry.free_seats)
+        keys = self._index[bucket]
+        del keys[bisect_left(keys, (entry.created, entry.code))]
+        if not keys:
+            del self._index[bucket]
+
+    def page(
+        self,
+        game_state: str = "waiting",
+        min_free_seats: int = 0,
+        created_after: Optional[float] = None,
+        cursor: Optional[str] = None,
+        limit: int = LOBBY_PAGE_SIZE,
+    ) -> Tuple[LobbyPage, bool]:
+        """Страница списка комнат и признак попадания в кэш"""
+        query = (game_state, min_free_seats, created_after, cursor, limit)
+        cached = self._pages.get(query)
+        if cached is not None and cached[0] == self.version:
+            self._pages.move_to_end(query)
+            return cached[1], True
+        page = self._build(game_state, min_free_seats, created_after, cursor, limit)
+        self._pages[query] = (self.version, page)
+        self._pages.move_to_end(query)
+        while len(self._pages) > self.cache_size:
+            self._pages.popitem(last=False)
+        return page, False
+
+    def _build(self, game_state: str, min_free_seats: int, created_after: Optional[float],
+               cursor: Optional[str], limit: int) -> LobbyPage:
+        matching: Key = (-math.inf, "")
+        if created_after is not None:
+            # Код больше любого настоящего: комнаты, созданные ровно в created_after, не входят
+            matching = (created_after, "\uffff")
+        start = max(matching, parse_cursor(cursor)) if cursor else matching
+        runs = []
+        total = 0
+        for (state, free_seats), keys in self._index.items():
+            if state != game_state or free_seats < min_free_seats:
+                continue
+            total += len(keys) - bisect_right(keys, matching)
+            position = bisect_right(keys, start)
+            # Из каждого индекса нужно не больше limit + 1 ключей
+            runs.append(keys[position:position + limit + 1])
+        selected = list(heapq.merge(*runs))[:limit + 1]
+        next_cursor = format_cursor(selected[limit - 1]) if len(selected) > limit else None
+        body = json.dumps({
+            "rooms": [self._entries[code].to_dict() for _, code in selected[:limit]],
+            "total": total,
+            "next_cursor": next_cursor,
+        }, ensure_ascii=False, separators=(",", ":")).encode()
+        return LobbyPage(body, etag_for(body))
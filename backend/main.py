@@ -1,11 +1,46 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Query
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Query, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List, Optional
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Dict, List, Optional, Sequence, Tuple
 import uuid
 import json
 import asyncio
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from pydantic import BaseModel, ConfigDict
+
+from action_log import ActionLog, create_action_log
+from actors import RoomActors, RoomBusyError, RoomClosedError
+from admin import require_admin
+from battle_sim import predicted_odds
+from bots import BOT_TAKEOVER, BotManager, export_state
+from broadcast import MessageBatcher
+from combat import compute_loot, resolve_battle, roll_dice
+from connection import Connection
+from inbound import MESSAGE_KINDS, RATE_LIMIT_ERROR, ActionCoalescer, InboundLimiter, message_kind
+from http_cache import cached_response
+from lifecycle import RoomLifecycleManager
+from lobby import LOBBY_PAGE_MAX, LOBBY_PAGE_SIZE, LobbyIndex
+from matchmaking import Matchmaker, Ticket
+from metrics import (
+    LoopLagMonitor, registry, handler_seconds, broadcast_seconds, broadcast_fanout,
+    ws_connects, ws_disconnects, ws_connections, lobby_requests,
+)
+from profiler import PROFILE_MAX_SECONDS, ProfilerService, RoomTracer
+from protocol import EncodedMessage, describe as describe_protocol, encoding_for, negotiate, receive_message
+from sharding import MATCHMAKING_KEY, ShardRouterMiddleware, create_shard_map
+from models import (
+    Player, GameRoom, create_player, resource_vector, named,
+    RESOURCES, BUILDING_INDEX, UNIT_INDEX, WALL, MAX_PLAYERS,
+)
+from replays import create_replay_store
+from room_views import RoomViewCache
+from rules import Rules, RulesError, current_rules, loaded_versions, reload_rules, rules_for
+from spectators import SpectatorCapacityError, SpectatorHub
+from storage import RoomStore, create_room_store
+from turn_clock import TURN_SECONDS, TURN_SECONDS_MAX, TurnClock
+from turns import apply_income, invalidate_income
 
 app = FastAPI(title="Strategy Game API")
 
@@ -31,6 +66,10 @@ allow_all_origins = os.getenv("ALLOW_ALL_ORIGINS", "false").lower() == "true"
 if allow_all_origins:
     allowed_origins = ["*"]
 
+# Шардирование: запросы к комнатам других воркеров перенаправляются владельцу
+shard_map = create_shard_map()
+app.add_middleware(ShardRouterMiddleware, shard_map=shard_map)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
@@ -39,80 +78,206 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Модели данных
-class Player(BaseModel):
-    model_config = ConfigDict()
-    
-    id: str
-    name: str
-    resources: Dict[str, int]
-    army: Dict[str, int]
-    territories: List[str]
-    buildings: Dict[str, int] = {}  # building_type -> quantity
-    technologies: List[str] = []  # Исследованные технологии
-    victory_points: int = 0  # Очки победы
-    is_ready: bool = False
-
-class GameRoom(BaseModel):
-    model_config = ConfigDict()
-    
-    code: str
-    players: Dict[str, Player]
-    game_state: str  # "waiting", "playing", "finished"
-    created_at: datetime
-    current_turn: Optional[str] = None
-    turn_number: int = 1  # Номер текущего хода
-    winner: Optional[str] = None  # ID победителя
-    
-    def to_dict(self):
-        """Конвертирует комнату в словарь с правильной сериализацией datetime"""
-        data = self.model_dump()
-        # Конвертируем datetime в строку ISO format
-        data['created_at'] = self.created_at.isoformat()
-        # Конвертируем Player объекты в словари
-        data['players'] = {pid: p.model_dump() for pid, p in self.players.items()}
-        # Добавляем дополнительные поля
-        data['turn_number'] = self.turn_number
-        data['winner'] = self.winner
-        return data
+def on_room_loaded(room: GameRoom):
+    # Журнал выгруженной комнаты удален (evict_room): новый начинается со снимка,
+    # иначе после перезапуска его не с чего было бы проигрывать
+    action_log.snapshot(room)
 
 # Хранилище игровых комнат
-game_rooms: Dict[str, GameRoom] = {}
-active_connections: Dict[str, List[WebSocket]] = {}  # room_code -> [websockets]
-
-# Начальные ресурсы
-INITIAL_RESOURCES = {
-    "gold": 1000,
-    "wood": 500,
-    "stone": 500,
-    "food": 1000
-}
-
-# Начальная армия
-INITIAL_ARMY = {
-    "soldiers": 10,
-    "archers": 5,
-    "cavalry": 3
-}
+game_rooms: RoomStore = create_room_store(on_load=on_room_loaded)
+active_connections: Dict[str, List[Connection]] = {}  # room_code -> [соединения]
+# Сообщения, порожденные одним входящим событием, уходят клиентам одним кадром
+batcher = MessageBatcher()
+# Журнал принятых действий для восстановления комнат после перезапуска
+action_log: ActionLog = create_action_log()
+
+def checkpoint_room(room_code: str):
+    """Снимок журнала только между командами, когда обработчик закончил менять комнату"""
+    if action_log.snapshot_due(room_code) and room_code in game_rooms:
+        action_log.snapshot(game_rooms[room_code])
+
+# Очереди команд комнат: изменения одной комнаты выполняются строго по очереди
+actors = RoomActors(after_command=checkpoint_room)
+
+def is_live(room: GameRoom) -> bool:
+    """Объект комнаты еще в памяти: команда, поставленная до выселения, его не воскрешает"""
+    return game_rooms.in_memory(room.code) is room
+
+def evict_room(room_code: str, reason: str):
+    """Выселяет комнату из памяти: закрывает соединения и передает ее хранилищу"""
+    for conn in active_connections.pop(room_code, []):
+        conn.evict("Room closed", code=1001)
+    spectators.close_room(room_code, "Room closed")
+    actors.discard(room_code)
+    turn_clock.cancel(room_code)
+    bots.cancel(room_code)
+    game_rooms.evict(room_code)
+    action_log.discard(room_code)
+    lobby.remove(room_code)
+    room_views.discard(room_code)
+    replays.close(room_code)
+
+# Выселение простаивающих и завершенных комнат
+lifecycle = RoomLifecycleManager(
+    on_evict=evict_room,
+    has_connections=lambda room_code: bool(active_connections.get(room_code))
+)
+
+# Метрики: комнаты по состояниям читаются из очередей lifecycle в момент запроса
+registry.gauge_func(
+    "game_rooms", "Отслеживаемые комнаты по состоянию",
+    lambda: {(state,): count for state, count in lifecycle.stats()["rooms_by_state"].items()},
+    ("state",)
+)
+registry.gauge_func("game_room_actors", "Комнаты с непустой очередью команд", lambda: {(): len(actors)})
+
+# Индексы комнат для /api/rooms: обновляются вместе с lifecycle, а не на каждый запрос
+lobby = LobbyIndex()
+# Полные снимки комнат, сериализованные один раз на ревизию
+room_views = RoomViewCache()
+# Повторы партий: события комнаты по ходам, ключевые кадры — из тех же снимков
+replays = create_replay_store(lambda room: room_views.get(room).room)
+
+def on_turn_expired(room_code: str, deadline: float):
+    # Ход завершается в очереди комнаты, как end_turn от клиента
+    actors.tell(room_code, expire_turn, room_code, deadline, bounded=False)
+
+def spectator_snapshot(room_code: str) -> Optional[dict]:
+    room = game_rooms.get(room_code)
+    return room_views.get(room).room if room is not None else None
+
+# Зрители получают задержанные снимки комнат отдельной задачей, не из обработчиков
+spectators = SpectatorHub(spectator_snapshot)
+registry.gauge_func("game_spectators", "Подключенные зрители", lambda: {(): len(spectators)})
+
+# Дедлайны ходов всех комнат в одном колесе таймеров
+turn_clock = TurnClock(on_turn_expired)
+registry.gauge_func("game_turn_clock_timers", "Комнаты с идущими часами хода", lambda: {(): len(turn_clock)})
+
+def bot_turn(room_code: str) -> Optional[str]:
+    """ID бота, который должен ходить в комнате сейчас, или None"""
+    room = game_rooms.in_memory(room_code)
+    if room is None or room.game_state != "playing" or room.current_turn not in room.bot_players:
+        return None
+    # Боты играют, только пока в комнате есть люди: пустая комната не крутит ходы
+    if not active_connections.get(room_code):
+        return None
+    return room.current_turn
+
+def bot_snapshot(room_code: str, player_id: str) -> Optional[Tuple[tuple, Rules]]:
+    room = game_rooms.in_memory(room_code)
+    if room is None or player_id not in room.players:
+        return None
+    return export_state(room, player_id), rules_for(room)
+
+async def bot_act(room_code: str, player_id: str, message: dict) -> bool:
+    try:
+        return await actors.ask(room_code, run_bot_message, room_code, player_id, message)
+    except RoomClosedError:
+        return False
+
+# Боты выбирают ходы в пуле процессов и ходят через обычные обработчики
+bots = BotManager(bot_turn, bot_snapshot, bot_act)
+registry.gauge_func("game_bot_turns", "Комнаты, где сейчас ходит бот", lambda: {(): len(bots)})
+
+# Соединения заявок подбора, ждущих комнату: ticket_id -> соединение
+matchmaking_connections: Dict[str, Connection] = {}
+
+def match_found_message(ticket: Ticket) -> dict:
+    return {
+        "type": "match_found",
+        "ticket_id": ticket.id,
+        "room_code": ticket.room_code,
+        "player_id": ticket.player_id
+    }
+
+def create_matched_room(tickets: List[Ticket]):
+    """Создает комнату для группы, собранной подбором, и уведомляет игроков"""
+    room_code = shard_map.generate_local_code(generate_room_code)
+    players = {}
+    for ticket in tickets:
+        player_id = str(uuid.uuid4())
+        players[player_id] = create_player(player_id, ticket.name)
+        ticket.room_code = room_code
+        ticket.player_id = player_id
+    room = GameRoom(
+        code=room_code,
+        players=players,
+        game_state="waiting",
+        created_at=datetime.now(),
+        current_turn=tickets[0].player_id,
+        rules_version=current_rules().version,
+        turn_seconds=TURN_SECONDS
+    )
+    game_rooms[room_code] = room
+    active_connections[room_code] = []
+    action_log.snapshot(room)
+    lifecycle.touch(room_code, room.game_state)
+    lobby.update(room)
+    for ticket in tickets:
+        connection = matchmaking_connections.pop(ticket.id, None)
+        if connection is not None:
+            connection.send_json(match_found_message(ticket))
+
+def close_matchmaking_connection(ticket_id: str, message: dict):
+    """Сообщает ожидающему сокету, что заявка снята, и закрывает его"""
+    connection = matchmaking_connections.pop(ticket_id, None)
+    if connection is not None:
+        connection.send_json(message)
+        connection.close_after_send(message["type"])
+
+def expire_ticket(ticket: Ticket):
+    close_matchmaking_connection(ticket.id, {"type": "matchmaking_timeout", "ticket_id": ticket.id})
+
+# Очередь подбора игроков по рейтингу
+matchmaker = Matchmaker(create_matched_room, expire_ticket)
+registry.gauge_func("game_matchmaking_waiting", "Заявки в очереди подбора", lambda: {(): len(matchmaker)})
+loop_lag_monitor = LoopLagMonitor()
+# Дочерние метрики для известных типов сообщений создаются заранее;
+# произвольные типы от клиента попадают в "other"
+HANDLER_METRICS = {name: handler_seconds.labels(name) for name in MESSAGE_KINDS}
+
+# Профилировщик и трассировка комнаты для /api/admin/*
+profiler_service = ProfilerService()
+room_tracer = RoomTracer()
+
+@app.on_event("startup")
+async def startup():
+    await game_rooms.start()
+    await action_log.start()
+    await restore_rooms_from_log()
+    await lifecycle.start()
+    await turn_clock.start()
+    await spectators.start()
+    await matchmaker.start()
+    await loop_lag_monitor.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await loop_lag_monitor.stop()
+    await turn_clock.stop()
+    await spectators.stop()
+    await matchmaker.stop()
+    await bots.stop()
+    await actors.stop()
+    await replays.stop()
+    await lifecycle.stop()
+    await action_log.stop()
+    await game_rooms.stop()
+
+def commit_room(room: GameRoom) -> dict:
+    """Фиксирует ревизию комнаты и помечает ее для сохранения в хранилище"""
+    patch = room.commit_revision()
+    if patch["revision"] != patch["base_revision"]:
+        game_rooms.mark_dirty(room.code)
+    lifecycle.touch(room.code, room.game_state)
+    lobby.update(room)
+    return patch
 
 def generate_room_code() -> str:
     """Генерирует уникальный код комнаты"""
     return str(uuid.uuid4())[:8].upper()
 
-def create_player(player_id: str, name: str) -> Player:
-    """Создает нового игрока"""
-    return Player(
-        id=player_id,
-        name=name,
-        resources=INITIAL_RESOURCES.copy(),
-        army=INITIAL_ARMY.copy(),
-        territories=[],
-        buildings={},
-        technologies=[],
-        victory_points=0,
-        is_ready=False
-    )
-
 @app.get("/")
 async def root():
     return {
@@ -130,9 +295,82 @@ async def health_check():
         "websocket_support": True,
         "active_rooms": len(game_rooms),
         "active_connections": sum(len(conns) for conns in active_connections.values()),
+        "lifecycle": lifecycle.stats(),
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/api/protocol")
+async def protocol_info():
+    """Поддерживаемые кодировки WebSocket и таблица номеров ключей для MessagePack"""
+    return describe_protocol()
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Метрики в текстовом формате Prometheus"""
+    if not registry.enabled:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def admin_profile(duration: float = 10.0, interval_ms: float = 5.0, format: str = "collapsed"):
+    """Снимает выборочный профиль сервера за duration секунд
+
+    format=collapsed — collapsed stacks для flamegraph, format=json — сводка по функциям.
+    """
+    if profiler_service.busy:
+        raise HTTPException(status_code=409, detail="Profile already running")
+    duration = min(max(duration, 0.1), PROFILE_MAX_SECONDS)
+    interval = max(interval_ms, 1.0) / 1000
+    # Эндпоинт выполняется в потоке цикла событий — его и профилируем
+    profiler = profiler_service.start(threading.get_ident(), interval)
+    try:
+        await asyncio.sleep(duration)
+    finally:
+        profiler_service.finish(profiler)
+    
+    if format == "json":
+        return {
+            "duration": duration,
+            "interval_ms": interval * 1000,
+            "samples": profiler.sample_count,
+            "functions": profiler.functions()
+        }
+    return PlainTextResponse(profiler.collapsed())
+
+@app.post("/api/admin/trace", dependencies=[Depends(require_admin)])
+async def admin_trace_start(room_code: str):
+    """Включает запись времени обработки сообщений одной комнаты"""
+    if room_code not in game_rooms:
+        raise HTTPException(status_code=404, detail="Room not found")
+    room_tracer.start(room_code)
+    return {"room_code": room_code, "tracing": True}
+
+@app.get("/api/admin/trace", dependencies=[Depends(require_admin)])
+async def admin_trace_report():
+    """Записи трассировки комнаты"""
+    return room_tracer.report()
+
+@app.delete("/api/admin/trace", dependencies=[Depends(require_admin)])
+async def admin_trace_stop():
+    """Выключает трассировку и возвращает накопленные записи"""
+    room_tracer.stop()
+    return room_tracer.report()
+
+@app.get("/api/admin/rules", dependencies=[Depends(require_admin)])
+async def admin_rules():
+    """Текущая версия правил и версии, по которым еще могут идти партии"""
+    return {"version": current_rules().version, "loaded_versions": loaded_versions()}
+
+@app.post("/api/admin/rules/reload", dependencies=[Depends(require_admin)])
+async def admin_rules_reload():
+    """Перечитывает файл правил; новые правила получают только новые комнаты"""
+    previous = current_rules().version
+    try:
+        rules, changed = reload_rules()
+    except RulesError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"version": rules.version, "previous_version": previous, "changed": changed}
+
 @app.get("/api/test")
 async def test_endpoint():
     """Тестовый endpoint для проверки связи"""
@@ -150,9 +388,12 @@ async def test_endpoint():
 from fastapi import Query
 
 @app.post("/api/create-room")
-async def create_room(player_name: str = Query(..., description="Имя игрока")):
+async def create_room(
+    player_name: str = Query(..., description="Имя игрока"),
+    turn_seconds: int = Query(TURN_SECONDS, ge=0, le=TURN_SECONDS_MAX, description="Длительность хода в секундах; 0 — без таймера"),
+):
     """Создает новую игровую комнату"""
-    room_code = generate_room_code()
+    room_code = shard_map.generate_local_code(generate_room_code)
     player_id = str(uuid.uuid4())
     
     player = create_player(player_id, player_name)
@@ -162,11 +403,16 @@ async def create_room(player_name: str = Query(..., description="Имя игро
         players={player_id: player},
         game_state="waiting",
         created_at=datetime.now(),
-        current_turn=player_id
+        current_turn=player_id,
+        rules_version=current_rules().version,
+        turn_seconds=turn_seconds
     )
     
     game_rooms[room_code] = room
     active_connections[room_code] = []
+    action_log.snapshot(room)
+    lifecycle.touch(room_code, room.game_state)
+    lobby.update(room)
     
     return {
         "room_code": room_code,
@@ -174,37 +420,106 @@ async def create_room(player_name: str = Query(..., description="Имя игро
         "room": room.to_dict()
     }
 
+@app.get("/api/rooms")
+async def list_rooms(
+    request: Request,
+    state: str = Query("waiting", pattern="^(waiting|playing|finished)$", description="Состояние комнат"),
+    min_free_seats: int = Query(0, ge=0, le=MAX_PLAYERS, description="Минимум свободных мест"),
+    created_after: Optional[datetime] = Query(None, description="Только комнаты, созданные позже"),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы"),
+    limit: int = Query(LOBBY_PAGE_SIZE, ge=1, le=LOBBY_PAGE_MAX),
+):
+    """Список комнат процесса из индексов лобби; тело и ETag пересобираются только после изменений"""
+    try:
+        page, cached = lobby.page(state, min_free_seats,
+                                  created_after.timestamp() if created_after else None, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    response = cached_response(request, page.body, page.etag)
+    lobby_requests.labels("not_modified" if response.status_code == 304 else "cached" if cached else "built").inc()
+    return response
+
 @app.get("/api/room/{room_code}")
-async def get_room(room_code: str):
-    """Получает информацию о комнате"""
-    if room_code not in game_rooms:
+async def get_room(room_code: str, request: Request):
+    """Получает информацию о комнате; тело сериализуется один раз на ревизию"""
+    room = await game_rooms.load(room_code)
+    if room is None:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    room = game_rooms[room_code]
+    lifecycle.track(room_code, room.game_state)
+    view = room_views.get(room)
+    return cached_response(request, view.body, view.etag)
+
+@app.get("/api/room/{room_code}/battle-odds")
+async def get_battle_odds(room_code: str, attacker_id: str, defender_id: str):
+    """Прогноз исхода атаки: вероятность победы и ожидаемые потери"""
+    room = await game_rooms.load(room_code)
+    if room is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+
+    if attacker_id not in room.players or defender_id not in room.players:
+        raise HTTPException(status_code=404, detail="Player not found")
+
+    attacker = room.players[attacker_id]
+    defender = room.players[defender_id]
+    # Промах кэша — перебор 100 × 100 бросков (без NumPy десятки мс), поэтому
+    # не в цикле событий; армии копируются, пока их не изменило действие игрока
+    odds = await asyncio.get_running_loop().run_in_executor(
+        None, predicted_odds, tuple(attacker.army), tuple(defender.army),
+        defender.buildings[WALL], rules_for(room)
+    )
     return {
-        "code": room.code,
-        "players": {pid: p.model_dump() for pid, p in room.players.items()},
-        "game_state": room.game_state,
-        "player_count": len(room.players)
+        "attacker_id": attacker_id,
+        "defender_id": defender_id,
+        "odds": odds
     }
 
+@app.get("/api/replays/{room_code}")
+async def get_replay(
+    room_code: str,
+    from_turn: int = Query(1, ge=1, description="Первый ход: перемотка без чтения предыдущих"),
+    to_turn: Optional[int] = Query(None, ge=1, description="Последний ход"),
+):
+    """Повтор завершенной партии потоком NDJSON: описание, затем блоки ходов"""
+    meta = await replays.meta(room_code)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Replay not found")
+    return StreamingResponse(replays.stream(room_code, meta, from_turn, to_turn), media_type="application/x-ndjson")
+
 @app.post("/api/join-room")
 async def join_room(room_code: str, player_name: str):
     """Присоединяется к комнате по коду"""
-    if room_code not in game_rooms:
+    if await game_rooms.load(room_code) is None:
         raise HTTPException(status_code=404, detail="Room not found")
     
+    # Проверки и добавление игрока выполняются в очереди комнаты
+    try:
+        return await actors.ask(room_code, add_player_to_room, room_code, player_name)
+    except RoomClosedError:
+        raise HTTPException(status_code=404, detail="Room not found")
+
+def add_player_to_room(room_code: str, player_name: str) -> dict:
+    """Добавляет нового игрока в комнату (выполняется актором комнаты)"""
+    # Пока запрос ждал в очереди, комнату могли выселить
+    if room_code not in game_rooms:
+        raise HTTPException(status_code=404, detail="Room not found")
     room = game_rooms[room_code]
     
     if room.game_state != "waiting":
         raise HTTPException(status_code=400, detail="Game already started")
     
-    if len(room.players) >= 4:  # Максимум 4 игрока
+    if len(room.players) >= MAX_PLAYERS:
         raise HTTPException(status_code=400, detail="Room is full")
     
     player_id = str(uuid.uuid4())
     player = create_player(player_id, player_name)
     room.players[player_id] = player
+    game_rooms.mark_dirty(room_code)
+    # Вход фиксируется ревизией только при подключении игрока
+    room_views.discard(room_code)
+    action_log.append(room, {"kind": "join", "player_id": player_id, "name": player_name})
+    lifecycle.touch(room_code, room.game_state)
+    lobby.update(room)
     
     return {
         "room_code": room_code,
@@ -212,19 +527,131 @@ async def join_room(room_code: str, player_name: str):
         "room": room.to_dict()
     }
 
-async def broadcast_to_room(room_code: str, message: dict):
-    """Отправляет сообщение всем подключенным клиентам в комнате"""
+@app.post("/api/matchmaking")
+async def matchmaking_enqueue(
+    player_name: str = Query(..., description="Имя игрока"),
+    rating: int = Query(1000, ge=0, le=10000, description="Рейтинг игрока"),
+):
+    """Ставит игрока в очередь подбора; о собранной комнате сообщает /ws/matchmaking/{ticket_id}"""
+    return matchmaker.enqueue(player_name, rating).to_dict()
+
+@app.get("/api/matchmaking/{ticket_id}")
+async def matchmaking_status(ticket_id: str):
+    """Состояние заявки подбора"""
+    ticket = matchmaker.get(ticket_id)
+    if ticket is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return ticket.to_dict()
+
+@app.delete("/api/matchmaking/{ticket_id}")
+async def matchmaking_cancel(ticket_id: str):
+    """Снимает заявку с очереди подбора"""
+    if not matchmaker.cancel(ticket_id):
+        raise HTTPException(status_code=404, detail="Ticket not waiting")
+    close_matchmaking_connection(ticket_id, {"type": "matchmaking_cancelled", "ticket_id": ticket_id})
+    return {"ticket_id": ticket_id, "status": "cancelled"}
+
+@app.post("/api/room/{room_code}/add-bot")
+async def add_bot(room_code: str):
+    """Добавляет в ожидающую комнату бота, сразу готового к игре"""
+    if await game_rooms.load(room_code) is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+    
+    try:
+        return await actors.ask(room_code, add_bot_to_room, room_code)
+    except RoomClosedError:
+        raise HTTPException(status_code=404, detail="Room not found")
+
+async def add_bot_to_room(room_code: str) -> dict:
+    """Добавляет бота (выполняется актором комнаты)"""
+    if room_code not in game_rooms:
+        raise HTTPException(status_code=404, detail="Room not found")
+    room = game_rooms[room_code]
+    result = add_player_to_room(room_code, f"Бот {len(room.bot_players) + 1}")
+    player_id = result["player_id"]
+    with batched(room_code):
+        set_bot_control(room, player_id, True)
+        broadcast_to_room(room_code, {
+            "type": "player_joined",
+            "player_id": player_id,
+            "patch": commit_room(room)
+        })
+        await handle_player_ready(room_code, player_id, True, _ReplayConnection())
+    result["room"] = room.to_dict()
+    return result
+
+def set_bot_control(room: GameRoom, player_id: str, enabled: bool):
+    """Передает игрока боту или возвращает его человеку"""
+    if (player_id in room.bot_players) == enabled:
+        return
+    room.bot_players = [pid for pid in room.bot_players if pid != player_id] + ([player_id] if enabled else [])
+    action_log.append(room, {"kind": "bot", "player_id": player_id, "enabled": enabled})
+
+async def run_bot_message(room_code: str, player_id: str, message: dict) -> bool:
+    """Применяет сообщение бота (выполняется актором комнаты)
+    
+    Пока бот думал, ход мог перейти дальше или игрок мог вернуться — тогда
+    сообщение отбрасывается.
+    """
+    room = game_rooms.in_memory(room_code)
+    if (room is None or room.game_state != "playing" or room.current_turn != player_id
+            or player_id not in room.bot_players):
+        return False
+    await process_client_message(room_code, player_id, message, _ReplayConnection())
+    return True
+
+def broadcast_to_room(room_code: str, message: dict):
+    """Ставит сообщение в очереди всех подключенных клиентов комнаты
+    
+    Во время обработки входящего события сообщение откладывается в пакет
+    комнаты и уходит вместе с остальными одним кадром (см. batched).
+    """
+    room = game_rooms.get(room_code)
+    # Восстановление из журнала проигрывает уже записанные события
+    if room is not None and not action_log.replaying:
+        replays.record(room, message)
+    if not batcher.add(room_code, message):
+        deliver_to_room(room_code, message)
+
+@contextmanager
+def batched(room_code: str):
+    """Объединяет рассылки комнаты внутри блока в одно сообщение"""
+    opened = batcher.begin(room_code)
+    try:
+        yield
+    finally:
+        if opened:
+            message = batcher.finish(room_code)
+            if message is not None:
+                deliver_to_room(room_code, message)
+
+def deliver_to_room(room_code: str, message: dict):
+    """Отправляет сообщение (или пакет) всем подключенным клиентам комнаты
+    
+    Сообщение сериализуется один раз; отправкой занимаются писатели соединений.
+    Отстающим клиентам вместо патчей отправляется один актуальный снимок комнаты.
+    """
+    started = time.perf_counter()
+    # Размер каждой кодировки учитывается при первой сериализации
+    encoded = EncodedMessage(message)
+    # Зрителям — только отметка; снимок снимет их собственная задача
+    spectators.mark(room_code)
     if room_code in active_connections:
-        disconnected = []
-        for connection in active_connections[room_code]:
-            try:
-                await connection.send_json(message)
-            except:
-                disconnected.append(connection)
-        
-        # Удаляем отключенные соединения
-        for conn in disconnected:
-            active_connections[room_code].remove(conn)
+        broadcast_fanout.observe(len(active_connections[room_code]))
+        carries_patch = any("patch" in item for item in message.get("messages", (message,)))
+        snapshot = None
+        for conn in list(active_connections[room_code]):
+            if conn.is_lagging and carries_patch:
+                if snapshot is None:
+                    snapshot = room_views.get(game_rooms[room_code]).message
+                conn.send_encoded(snapshot, coalesce_key="room_state")
+            else:
+                conn.send_encoded(encoded)
+            
+            # Удаляем отключенные и слишком медленные соединения
+            if conn.closed and conn in active_connections[room_code]:
+                active_connections[room_code].remove(conn)
+    broadcast_seconds.observe(time.perf_counter() - started)
 
 @app.websocket("/ws/test/test")
 async def websocket_test(websocket: WebSocket):
@@ -236,10 +663,66 @@ async def websocket_test(websocket: WebSocket):
     except Exception as e:
         print(f"WebSocket test error: {e}")
 
+# Объявлены раньше игрового маршрута, иначе "matchmaking" и "spectate"
+# попадут в room_code и player_id
+@app.websocket("/ws/matchmaking/{ticket_id}")
+async def matchmaking_endpoint(websocket: WebSocket, ticket_id: str):
+    """WebSocket заявки подбора: match_found, когда комната собрана, или закрытие со снятой заявкой"""
+    subprotocol = negotiate(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=subprotocol)
+    
+    ticket = matchmaker.get(ticket_id)
+    if ticket is None:
+        await websocket.close(code=1008, reason="Ticket not found")
+        return
+    
+    connection = Connection(websocket, MATCHMAKING_KEY, ticket_id, encoding=encoding_for(subprotocol))
+    connection.start()
+    if ticket.room_code is not None:
+        connection.send_json(match_found_message(ticket))
+    else:
+        matchmaking_connections[ticket_id] = connection
+    try:
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        if matchmaking_connections.get(ticket_id) is connection:
+            # Игрок перестал ждать — заявка снимается с очереди
+            del matchmaking_connections[ticket_id]
+            matchmaker.cancel(ticket_id)
+        await connection.close()
+
+@app.websocket("/ws/{room_code}/spectate")
+async def spectator_endpoint(websocket: WebSocket, room_code: str):
+    """WebSocket для зрителей: задержанные снимки комнаты, только чтение"""
+    subprotocol = negotiate(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=subprotocol)
+    
+    if await game_rooms.load(room_code) is None:
+        await websocket.close(code=1008, reason="Room not found")
+        return
+    
+    connection = Connection(websocket, room_code, "spectator", encoding=encoding_for(subprotocol))
+    try:
+        spectators.add(room_code, connection)
+    except SpectatorCapacityError:
+        await websocket.close(code=1013, reason="Spectator capacity reached")
+        return
+    connection.start()
+    try:
+        # Сообщения зрителей не обрабатываются; читаем, чтобы заметить отключение
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        spectators.remove(room_code, connection)
+        await connection.close()
+
 @app.websocket("/ws/{room_code}/{player_id}")
 async def websocket_endpoint(websocket: WebSocket, room_code: str, player_id: str):
     """WebSocket endpoint для игрового взаимодействия"""
-    await websocket.accept()
+    # Кодировка согласуется подпротоколом; старые клиенты остаются на JSON
+    subprotocol = negotiate(websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=subprotocol)
     
     # Разрешаем тестовое подключение
     if room_code == "test" and player_id == "test":
@@ -247,107 +730,204 @@ async def websocket_endpoint(websocket: WebSocket, room_code: str, player_id: st
         await websocket.close(code=1000)
         return
     
-    if room_code not in game_rooms:
+    room = await game_rooms.load(room_code)
+    if room is None:
         await websocket.close(code=1008, reason="Room not found")
         return
     
-    if player_id not in game_rooms[room_code].players:
+    if player_id not in room.players:
         await websocket.close(code=1008, reason="Player not in room")
         return
     
-    # Добавляем соединение
+    connection = Connection(websocket, room_code, player_id, encoding=encoding_for(subprotocol))
+    connection.start()
+    ws_connects.inc()
+    ws_connections.inc()
+    # Подключение проходит через очередь комнаты, чтобы снимок не разошелся с патчами
+    try:
+        await actors.ask(room_code, attach_connection, room, connection)
+    except RoomClosedError:
+        ws_connections.dec()
+        await connection.close()
+        await websocket.close(code=1001, reason="Room closed")
+        return
+    
+    def submit(data: dict):
+        # Команды комнаты выполняет ее актор по одной; цикл сразу читает дальше
+        try:
+            actors.tell(room_code, process_client_message, room_code, player_id, data, connection)
+        except RoomBusyError:
+            connection.send_json({
+                "type": "action_result",
+                "success": False,
+                "error": "Room is busy, try again"
+            })
+    
+    limiter = InboundLimiter()
+    coalescer = ActionCoalescer(submit)
+    try:
+        while True:
+            data = await receive_message(websocket)
+            # Бюджет расходует каждое сообщение, в том числе слитое с предыдущим
+            if not limiter.allow(message_kind(data)):
+                connection.send_json({
+                    "type": "action_result",
+                    "success": False,
+                    "error": RATE_LIMIT_ERROR
+                })
+                continue
+            # Подряд идущие train_army сливаются в одно действие
+            if coalescer.merge(data):
+                continue
+            coalescer.push(data)
+            
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Накопленное действие отправляем до сообщения об отключении
+        coalescer.flush()
+        ws_disconnects.inc()
+        ws_connections.dec()
+        # Соединение могло быть уже удалено рассылкой как медленное
+        if connection in active_connections.get(room_code, []):
+            active_connections[room_code].remove(connection)
+        await connection.close()
+        actors.tell(room_code, detach_connection, room, player_id, bounded=False)
+
+def attach_connection(room: GameRoom, connection: Connection):
+    """Регистрирует соединение игрока и отправляет ему полный снимок комнаты"""
+    room_code = connection.room_code
+    if not is_live(room):
+        # Комнату выселили, пока подключение ждало очереди
+        raise RoomClosedError(room_code)
+    # Вернувшийся игрок забирает управление у бота
+    set_bot_control(room, connection.player_id, False)
+    resume_turn_clock(room)
+    # Уведомляем других игроков о подключении; патч фиксирует изменения,
+    # накопленные до подключения (например, вход через /api/join-room)
+    broadcast_to_room(room_code, {
+        "type": "player_joined",
+        "player_id": connection.player_id,
+        "patch": commit_room(room)
+    })
     if room_code not in active_connections:
         active_connections[room_code] = []
-    active_connections[room_code].append(websocket)
+    active_connections[room_code].append(connection)
     
-    room = game_rooms[room_code]
-    
-    # Отправляем текущее состояние комнаты
-    await websocket.send_json({
-        "type": "room_state",
-        "room": room.to_dict()
+    # Полный снимок отправляем только при подключении и по запросу клиента
+    connection.send_encoded(room_views.get(room).message, coalesce_key="room_state")
+    bots.notify(room_code)
+
+def detach_connection(room: GameRoom, player_id: str):
+    """Сообщает комнате об отключении игрока; во время партии за него ходит бот"""
+    if not is_live(room):
+        # Отключение после выселения: сообщать некому, фиксировать нечего
+        return
+    if (BOT_TAKEOVER and room.game_state == "playing"
+            and not any(conn.player_id == player_id for conn in active_connections.get(room.code, []))):
+        set_bot_control(room, player_id, True)
+    broadcast_to_room(room.code, {
+        "type": "player_disconnected",
+        "player_id": player_id,
+        "patch": commit_room(room)
     })
+    bots.notify(room.code)
+
+async def process_client_message(room_code: str, player_id: str, data: dict, connection: Connection):
+    """Обрабатывает одно сообщение клиента (выполняется актором комнаты)"""
+    message_type = data.get("type")
+    started = time.perf_counter()
     
-    # Уведомляем других игроков о подключении
-    await broadcast_to_room(room_code, {
-        "type": "player_joined",
+    # Все рассылки, вызванные этим сообщением, уходят одним кадром
+    with batched(room_code):
+        if message_type == "player_ready":
+            # Игрок готов к игре
+            await handle_player_ready(room_code, player_id, data.get("ready", False), connection)
+        
+        elif message_type == "game_action":
+            # Игровое действие (строительство, атака, и т.д.)
+            action = data.get("action")
+            await handle_game_action(room_code, player_id, action, connection)
+        
+        elif message_type == "end_turn":
+            # Завершение хода
+            await handle_end_turn(room_code, player_id, connection)
+        
+        elif message_type == "sync_request":
+            # Клиент обнаружил пропуск ревизии — отправляем полный снимок
+            connection.send_encoded(room_views.get(game_rooms[room_code]).message, coalesce_key="room_state")
+    
+    kind = message_kind(data)
+    elapsed = time.perf_counter() - started
+    HANDLER_METRICS[kind].observe(elapsed)
+    if room_tracer.room_code == room_code:
+        room_tracer.record(player_id, kind, elapsed)
+
+async def handle_player_ready(room_code: str, player_id: str, ready: bool, connection: Connection):
+    """Обрабатывает готовность игрока и старт игры"""
+    room = game_rooms[room_code]
+    room.players[player_id].is_ready = ready
+    action_log.append(room, {"kind": "player_ready", "player_id": player_id, "ready": ready})
+    broadcast_to_room(room_code, {
+        "type": "player_ready_update",
         "player_id": player_id,
-        "room": room.to_dict()
+        "ready": room.players[player_id].is_ready,
+        "patch": commit_room(room)
     })
     
-    try:
-        while True:
-            data = await websocket.receive_json()
-            message_type = data.get("type")
-            
-            if message_type == "player_ready":
-                # Игрок готов к игре
-                room.players[player_id].is_ready = data.get("ready", False)
-                await broadcast_to_room(room_code, {
-                    "type": "player_ready_update",
-                    "player_id": player_id,
-                    "ready": room.players[player_id].is_ready,
-                    "room": room.to_dict()
-                })
-                
-                # Проверяем, все ли готовы
-                all_ready = all(p.is_ready for p in room.players.values())
-                if all_ready and len(room.players) >= 2:
-                    room.game_state = "playing"
-                    await broadcast_to_room(room_code, {
-                        "type": "game_start",
-                        "room": room.to_dict()
-                    })
-            
-            elif message_type == "game_action":
-                # Игровое действие (строительство, атака, и т.д.)
-                action = data.get("action")
-                await handle_game_action(room_code, player_id, action, websocket)
-            
-            elif message_type == "end_turn":
-                # Завершение хода
-                await handle_end_turn(room_code, player_id, websocket)
-            
-    except WebSocketDisconnect:
-        active_connections[room_code].remove(websocket)
-        await broadcast_to_room(room_code, {
-            "type": "player_disconnected",
-            "player_id": player_id,
-            "room": room.to_dict()
+    # Проверяем, все ли готовы
+    all_ready = all(p.is_ready for p in room.players.values())
+    if all_ready and len(room.players) >= 2:
+        room.game_state = "playing"
+        start_turn_clock(room)
+        bots.notify(room_code)
+        broadcast_to_room(room_code, {
+            "type": "game_start",
+            "patch": commit_room(room)
         })
 
-async def handle_game_action(room_code: str, player_id: str, action: dict, websocket: WebSocket):
+async def handle_game_action(room_code: str, player_id: str, action: dict, connection: Connection):
     """Обрабатывает игровые действия"""
     room = game_rooms[room_code]
     player = room.players[player_id]
+    rules = rules_for(room)
     
     action_type = action.get("type")
     
     if action_type == "build":
         # Строительство здания
         building_type = action.get("building_type")
-        cost = get_building_cost(building_type)
+        building_index = BUILDING_INDEX.get(building_type)
+        if building_index is None:
+            connection.send_json({
+                "type": "action_result",
+                "success": False,
+                "error": "Unknown building type"
+            })
+            return
+        cost = rules.building_costs[building_index]
         
         if can_afford(player.resources, cost):
             # Вычитаем ресурсы
-            for resource, amount in cost.items():
-                player.resources[resource] -= amount
+            pay(player.resources, cost)
             
             # Добавляем эффект здания
-            apply_building_effect(player, building_type)
+            apply_building_effect(player, building_index, rules)
             
             # Увеличиваем счетчик зданий
-            player.buildings[building_type] = player.buildings.get(building_type, 0) + 1
+            player.buildings[building_index] += 1
+            invalidate_income(player)
             
-            await broadcast_to_room(room_code, {
+            action_log.append(room, {"kind": "game_action", "player_id": player_id, "action": action})
+            broadcast_to_room(room_code, {
                 "type": "action_result",
                 "player_id": player_id,
                 "action": action,
                 "success": True,
-                "room": room.to_dict()
+                "patch": commit_room(room)
             })
         else:
-            await websocket.send_json({
+            connection.send_json({
                 "type": "action_result",
                 "success": False,
                 "error": "Not enough resources"
@@ -356,24 +936,47 @@ async def handle_game_action(room_code: str, player_id: str, action: dict, webso
     elif action_type == "train_army":
         # Обучение армии
         unit_type = action.get("unit_type")
-        quantity = action.get("quantity", 1)
-        cost = get_unit_cost(unit_type, quantity)
+        unit_index = UNIT_INDEX.get(unit_type)
+        if unit_index is None:
+            connection.send_json({
+                "type": "action_result",
+                "success": False,
+                "error": "Unknown unit type"
+            })
+            return
         
-        if can_afford(player.resources, cost):
-            for resource, amount in cost.items():
-                player.resources[resource] -= amount
-            
-            player.army[unit_type] = player.army.get(unit_type, 0) + quantity
+        # Слитые подряд запросы (inbound.ActionCoalescer) оплачиваются по одному,
+        # как если бы пришли отдельно, а рассылка уходит одна на все
+        requested = action.get("merged_quantities") or [action.get("quantity", 1)]
+        accepted = trained = 0
+        for quantity in requested:
+            cost = get_unit_cost(unit_index, quantity, rules)
+            if can_afford(player.resources, cost):
+                pay(player.resources, cost)
+                accepted += 1
+                trained += quantity
+        
+        if accepted:
+            player.army[unit_index] += trained
+            if "merged_quantities" in action:
+                action = {
+                    "type": "train_army",
+                    "unit_type": unit_type,
+                    "quantity": trained,
+                    "merged": len(requested),
+                    "rejected": len(requested) - accepted
+                }
             
-            await broadcast_to_room(room_code, {
+            action_log.append(room, {"kind": "game_action", "player_id": player_id, "action": action})
+            broadcast_to_room(room_code, {
                 "type": "action_result",
                 "player_id": player_id,
                 "action": action,
                 "success": True,
-                "room": room.to_dict()
+                "patch": commit_room(room)
             })
         else:
-            await websocket.send_json({
+            connection.send_json({
                 "type": "action_result",
                 "success": False,
                 "error": "Not enough resources"
@@ -383,186 +986,100 @@ async def handle_game_action(room_code: str, player_id: str, action: dict, webso
         # Атака на другого игрока
         target_player_id = action.get("target_player_id")
         if target_player_id in room.players:
-            await handle_attack(room_code, player_id, target_player_id, action, websocket)
+            await handle_attack(room_code, player_id, target_player_id, action, connection)
     
     elif action_type == "research":
         # Исследование технологии
         tech_type = action.get("tech_type")
-        await handle_research(room_code, player_id, tech_type, websocket)
+        await handle_research(room_code, player_id, tech_type, connection)
     
     elif action_type == "trade":
         # Торговля с другим игроком
         target_player_id = action.get("target_player_id")
         trade_offer = action.get("trade_offer")  # {resource: amount}
         trade_request = action.get("trade_request")  # {resource: amount}
-        await handle_trade(room_code, player_id, target_player_id, trade_offer, trade_request, websocket)
+        await handle_trade(room_code, player_id, target_player_id, trade_offer, trade_request, connection)
 
-async def handle_attack(room_code: str, attacker_id: str, defender_id: str, action: dict, websocket: WebSocket):
-    """Обрабатывает атаку с улучшенной боевой системой"""
-    import random
+async def handle_attack(room_code: str, attacker_id: str, defender_id: str, action: dict, connection: Connection,
+                        rolls: Optional[Tuple[int, int]] = None):
+    """Обрабатывает атаку с улучшенной боевой системой
+    
+    rolls — заранее известные броски (атакующий, защитник) при восстановлении из журнала.
+    """
     room = game_rooms[room_code]
+    rules = rules_for(room)
     attacker = room.players[attacker_id]
     defender = room.players[defender_id]
     
-    # Расчет силы армии с учетом типов юнитов
-    attacker_power = (
-        attacker.army.get("soldiers", 0) * 1.0 +
-        attacker.army.get("archers", 0) * 1.2 +
-        attacker.army.get("cavalry", 0) * 1.5
-    )
-    
-    defender_power = (
-        defender.army.get("soldiers", 0) * 1.0 +
-        defender.army.get("archers", 0) * 1.2 +
-        defender.army.get("cavalry", 0) * 1.5
-    )
-    
-    # Бонус от стен
-    wall_bonus = defender.buildings.get("wall", 0) * 0.2
-    defender_power *= (1 + wall_bonus)
-    
     # Случайный фактор
-    attacker_roll = random.randint(1, 100)
-    defender_roll = random.randint(1, 100)
+    attacker_roll, defender_roll = roll_dice(rules) if rolls is None else rolls
+    
+    # Броски записываются в журнал, чтобы восстановление было детерминированным
+    action_log.append(room, {
+        "kind": "game_action",
+        "player_id": attacker_id,
+        "action": {"type": "attack", "target_player_id": defender_id},
+        "rolls": [attacker_roll, defender_roll]
+    })
     
-    attacker_total = attacker_power + attacker_roll
-    defender_total = defender_power + defender_roll
+    outcome = resolve_battle(
+        attacker.army, defender.army, defender.buildings[WALL], attacker_roll, defender_roll, rules
+    )
+    attacker.army[:] = outcome["attacker_army"]
+    defender.army[:] = outcome["defender_army"]
     
     # Детальные результаты боя
-    battle_details = {
-        "attacker_power": round(attacker_power, 1),
-        "defender_power": round(defender_power, 1),
-        "attacker_roll": attacker_roll,
-        "defender_roll": defender_roll,
-        "attacker_total": round(attacker_total, 1),
-        "defender_total": round(defender_total, 1)
-    }
-    
-    # Сохраняем начальные значения для подсчета потерь
-    attacker_initial_army = attacker.army.copy()
-    defender_initial_army = defender.army.copy()
+    battle_details = outcome["details"]
     
-    if attacker_total > defender_total:
-        # Атакующий побеждает
-        damage_ratio = (attacker_total - defender_total) / attacker_total
-        total_defender_units = sum(defender.army.values())
-        damage = max(1, int(total_defender_units * damage_ratio * 0.3))
-        
-        # Распределяем урон по юнитам защитника
-        defender_losses = {}
-        for unit_type in defender.army:
-            if defender.army[unit_type] > 0:
-                unit_damage = min(damage, defender.army[unit_type])
-                defender.army[unit_type] -= unit_damage
-                defender_losses[unit_type] = unit_damage
-                damage -= unit_damage
-                if damage <= 0:
-                    break
-        
-        # Небольшие потери атакующего
-        attacker_losses = {}
-        attacker_damage = max(1, int(sum(attacker.army.values()) * 0.1))
-        for unit_type in attacker.army:
-            if attacker.army[unit_type] > 0 and attacker_damage > 0:
-                unit_damage = min(attacker_damage, attacker.army[unit_type] // 10)
-                attacker.army[unit_type] -= unit_damage
-                attacker_losses[unit_type] = unit_damage
-                attacker_damage -= unit_damage
-        
-        # Захват ресурсов (10% от ресурсов защитника)
-        loot_gold = int(defender.resources.get("gold", 0) * 0.1)
-        loot_wood = int(defender.resources.get("wood", 0) * 0.1)
-        loot_stone = int(defender.resources.get("stone", 0) * 0.1)
-        loot_food = int(defender.resources.get("food", 0) * 0.1)
-        
-        attacker.resources["gold"] += loot_gold
-        attacker.resources["wood"] += loot_wood
-        attacker.resources["stone"] += loot_stone
-        attacker.resources["food"] += loot_food
-        
-        defender.resources["gold"] = max(0, defender.resources["gold"] - loot_gold)
-        defender.resources["wood"] = max(0, defender.resources["wood"] - loot_wood)
-        defender.resources["stone"] = max(0, defender.resources["stone"] - loot_stone)
-        defender.resources["food"] = max(0, defender.resources["food"] - loot_food)
+    if outcome["attacker_wins"]:
+        # Захват ресурсов защитника
+        loot = compute_loot(defender.resources, rules)
+        for index, amount in enumerate(loot):
+            attacker.resources[index] += amount
+            defender.resources[index] = max(0, defender.resources[index] - amount)
         
         # Очки победы за успешную атаку
         attacker.victory_points += 1
         
         result = "attacker_wins"
-        battle_details["loot"] = {"gold": loot_gold, "wood": loot_wood, "stone": loot_stone, "food": loot_food}
-        battle_details["attacker_losses"] = attacker_losses
-        battle_details["defender_losses"] = defender_losses
+        battle_details["loot"] = named(RESOURCES, loot)
     else:
-        # Защитник побеждает
-        damage_ratio = (defender_total - attacker_total) / defender_total
-        total_attacker_units = sum(attacker.army.values())
-        damage = max(1, int(total_attacker_units * damage_ratio * 0.2))
-        
-        # Распределяем урон по юнитам атакующего
-        attacker_losses = {}
-        for unit_type in attacker.army:
-            if attacker.army[unit_type] > 0:
-                unit_damage = min(damage, attacker.army[unit_type])
-                attacker.army[unit_type] -= unit_damage
-                attacker_losses[unit_type] = unit_damage
-                damage -= unit_damage
-                if damage <= 0:
-                    break
-        
-        # Небольшие потери защитника
-        defender_losses = {}
-        defender_damage = max(1, int(sum(defender.army.values()) * 0.05))
-        for unit_type in defender.army:
-            if defender.army[unit_type] > 0 and defender_damage > 0:
-                unit_damage = min(defender_damage, defender.army[unit_type] // 20)
-                defender.army[unit_type] -= unit_damage
-                defender_losses[unit_type] = unit_damage
-                defender_damage -= unit_damage
-        
         # Очки победы за успешную защиту
         defender.victory_points += 1
         
         result = "defender_wins"
-        battle_details["attacker_losses"] = attacker_losses
-        battle_details["defender_losses"] = defender_losses
+    battle_details["attacker_losses"] = outcome["attacker_losses"]
+    battle_details["defender_losses"] = outcome["defender_losses"]
     
     # Проверка условий победы
     await check_victory_conditions(room_code)
     
-    await broadcast_to_room(room_code, {
+    broadcast_to_room(room_code, {
         "type": "battle_result",
         "attacker_id": attacker_id,
         "defender_id": defender_id,
         "result": result,
         "battle_details": battle_details,
-        "room": room.to_dict()
+        "patch": commit_room(room)
     })
 
-async def handle_research(room_code: str, player_id: str, tech_type: str, websocket: WebSocket):
+async def handle_research(room_code: str, player_id: str, tech_type: str, connection: Connection):
     """Обрабатывает исследование технологии"""
     room = game_rooms[room_code]
     player = room.players[player_id]
     
     # Проверяем, не исследована ли уже технология
     if tech_type in player.technologies:
-        await websocket.send_json({
+        connection.send_json({
             "type": "action_result",
             "success": False,
             "error": "Технология уже исследована"
         })
         return
     
-    # Стоимость исследований
-    tech_costs = {
-        "military_tactics": {"gold": 300, "food": 100},
-        "advanced_construction": {"gold": 250, "wood": 150, "stone": 150},
-        "trade_routes": {"gold": 200, "wood": 100},
-        "fortification": {"gold": 400, "stone": 200}
-    }
-    
-    cost = tech_costs.get(tech_type, {})
-    if not cost:
-        await websocket.send_json({
+    cost = rules_for(room).tech_costs.get(tech_type)
+    if cost is None:
+        connection.send_json({
             "type": "action_result",
             "success": False,
             "error": "Неизвестная технология"
@@ -571,35 +1088,41 @@ async def handle_research(room_code: str, player_id: str, tech_type: str, websoc
     
     if can_afford(player.resources, cost):
         # Вычитаем ресурсы
-        for resource, amount in cost.items():
-            player.resources[resource] -= amount
+        pay(player.resources, cost)
         
         # Добавляем технологию
         player.technologies.append(tech_type)
+        invalidate_income(player)
         player.victory_points += 2  # Очки за исследование
         
-        await broadcast_to_room(room_code, {
+        action_log.append(room, {
+            "kind": "game_action",
+            "player_id": player_id,
+            "action": {"type": "research", "tech_type": tech_type}
+        })
+        
+        broadcast_to_room(room_code, {
             "type": "action_result",
             "player_id": player_id,
             "action": {"type": "research", "tech_type": tech_type},
             "success": True,
-            "room": room.to_dict()
+            "patch": commit_room(room)
         })
         
         await check_victory_conditions(room_code)
     else:
-        await websocket.send_json({
+        connection.send_json({
             "type": "action_result",
             "success": False,
             "error": "Недостаточно ресурсов"
         })
 
-async def handle_trade(room_code: str, player_id: str, target_player_id: str, trade_offer: dict, trade_request: dict, websocket: WebSocket):
+async def handle_trade(room_code: str, player_id: str, target_player_id: str, trade_offer: dict, trade_request: dict, connection: Connection):
     """Обрабатывает торговлю между игроками"""
     room = game_rooms[room_code]
     
     if target_player_id not in room.players:
-        await websocket.send_json({
+        connection.send_json({
             "type": "action_result",
             "success": False,
             "error": "Игрок не найден"
@@ -609,9 +1132,19 @@ async def handle_trade(room_code: str, player_id: str, target_player_id: str, tr
     player = room.players[player_id]
     target = room.players[target_player_id]
     
+    offer = resource_vector(trade_offer or {})
+    request = resource_vector(trade_request or {})
+    if offer is None or request is None:
+        connection.send_json({
+            "type": "action_result",
+            "success": False,
+            "error": "Неизвестный ресурс"
+        })
+        return
+    
     # Проверяем, что у игрока есть ресурсы для обмена
-    if not can_afford(player.resources, trade_offer):
-        await websocket.send_json({
+    if not can_afford(player.resources, offer):
+        connection.send_json({
             "type": "action_result",
             "success": False,
             "error": "Недостаточно ресурсов для обмена"
@@ -619,8 +1152,8 @@ async def handle_trade(room_code: str, player_id: str, target_player_id: str, tr
         return
     
     # Проверяем, что у цели есть ресурсы для обмена
-    if not can_afford(target.resources, trade_request):
-        await websocket.send_json({
+    if not can_afford(target.resources, request):
+        connection.send_json({
             "type": "action_result",
             "success": False,
             "error": "У соперника недостаточно ресурсов"
@@ -628,24 +1161,32 @@ async def handle_trade(room_code: str, player_id: str, target_player_id: str, tr
         return
     
     # Выполняем обмен
-    for resource, amount in trade_offer.items():
-        player.resources[resource] -= amount
-        target.resources[resource] = target.resources.get(resource, 0) + amount
+    for index in range(len(RESOURCES)):
+        delta = request[index] - offer[index]
+        player.resources[index] += delta
+        target.resources[index] -= delta
     
-    for resource, amount in trade_request.items():
-        target.resources[resource] -= amount
-        player.resources[resource] = player.resources.get(resource, 0) + amount
+    action_log.append(room, {
+        "kind": "game_action",
+        "player_id": player_id,
+        "action": {
+            "type": "trade",
+            "target_player_id": target_player_id,
+            "trade_offer": trade_offer,
+            "trade_request": trade_request
+        }
+    })
     
-    await broadcast_to_room(room_code, {
+    broadcast_to_room(room_code, {
         "type": "trade_completed",
         "player_id": player_id,
         "target_player_id": target_player_id,
         "trade_offer": trade_offer,
         "trade_request": trade_request,
-        "room": room.to_dict()
+        "patch": commit_room(room)
     })
 
-async def handle_end_turn(room_code: str, player_id: str, websocket: WebSocket):
+async def handle_end_turn(room_code: str, player_id: str, connection: Connection):
     """Обрабатывает завершение хода"""
     room = game_rooms[room_code]
     
@@ -656,59 +1197,78 @@ async def handle_end_turn(room_code: str, player_id: str, websocket: WebSocket):
     next_player_id = player_ids[next_index]
     
     room.current_turn = next_player_id
+    action_log.append(room, {"kind": "end_turn", "player_id": player_id})
     
     # Увеличиваем номер хода, если вернулись к первому игроку
     if next_index == 0:
         room.turn_number += 1
     
     # Начисляем ресурсы за ход
-    for player in room.players.values():
-        base_gold = 50
-        base_wood = 25
-        base_stone = 25
-        base_food = 50
-        
-        # Бонусы от зданий
-        mine_bonus = player.buildings.get("mine", 0) * 25
-        farm_bonus = player.buildings.get("farm", 0) * 30
-        
-        # Бонусы от технологий
-        if "trade_routes" in player.technologies:
-            base_gold += 25
-        if "military_tactics" in player.technologies:
-            # Военная тактика дает небольшой бонус к ресурсам
-            base_food += 10
-        
-        player.resources["gold"] += base_gold + mine_bonus
-        player.resources["wood"] += base_wood
-        player.resources["stone"] += base_stone
-        player.resources["food"] += base_food + farm_bonus
+    apply_income(room.players.values(), rules_for(room))
     
     # Проверяем условия победы в конце хода
     await check_victory_conditions(room_code)
+    start_turn_clock(room)
+    bots.notify(room_code)
     
-    await broadcast_to_room(room_code, {
+    broadcast_to_room(room_code, {
         "type": "turn_ended",
         "next_turn": next_player_id,
         "turn_number": room.turn_number,
-        "room": room.to_dict()
+        "patch": commit_room(room)
     })
     
     # Если игра завершена, отправляем сообщение о победе
     if room.game_state == "finished" and room.winner:
-        await broadcast_to_room(room_code, {
+        broadcast_to_room(room_code, {
             "type": "game_finished",
             "winner_id": room.winner,
             "winner_name": room.players[room.winner].name,
-            "room": room.to_dict()
+            "patch": commit_room(room)
         })
     
-    await broadcast_to_room(room_code, {
+    broadcast_to_room(room_code, {
         "type": "turn_ended",
         "next_turn": next_player_id,
-        "room": room.to_dict()
+        "patch": commit_room(room)
     })
 
+def start_turn_clock(room: GameRoom):
+    """Назначает дедлайн текущего хода; без таймера или вне игры снимает его"""
+    if not room.turn_seconds or room.game_state != "playing":
+        room.turn_deadline = None
+        turn_clock.cancel(room.code)
+        return
+    room.turn_deadline = time.time() + room.turn_seconds
+    turn_clock.schedule(room.code, room.turn_deadline)
+    # Дедлайн журналируется, чтобы восстановленная комната получила тот же
+    action_log.append(room, {"kind": "turn_deadline", "player_id": room.current_turn, "deadline": room.turn_deadline})
+
+def resume_turn_clock(room: GameRoom):
+    """Снова ставит часы комнаты, загруженной из хранилища или ожившей после простоя
+
+    Если дедлайн прошел, пока в комнате никого не было, ход начинается заново.
+    """
+    if room.game_state != "playing" or not room.turn_seconds or room.code in turn_clock:
+        return
+    if room.turn_deadline is None or room.turn_deadline <= time.time():
+        start_turn_clock(room)
+    else:
+        turn_clock.schedule(room.code, room.turn_deadline)
+
+async def expire_turn(room_code: str, deadline: float):
+    """Завершает ход по истечении времени (выполняется актором комнаты)"""
+    # Выселенная комната с диска не подгружается: ее часы уже сняты
+    room = game_rooms.in_memory(room_code)
+    # Игрок мог успеть завершить ход сам — тогда дедлайн уже другой
+    if room is None or room.game_state != "playing" or room.turn_deadline != deadline:
+        return
+    if not active_connections.get(room_code):
+        # Пустую комнату не гоняем по кругу: часы снова пойдут при подключении
+        return
+    with batched(room_code):
+        await handle_end_turn(room_code, room.current_turn, None)
+
 async def check_victory_conditions(room_code: str):
     """Проверяет условия победы"""
     room = game_rooms[room_code]
@@ -727,52 +1287,97 @@ async def check_victory_conditions(room_code: str):
         
         # Проверка по уничтожению армий
         all_others_defeated = all(
-            sum(other.army.values()) == 0 
+            sum(other.army) == 0 
             for other_id, other in room.players.items() 
             if other_id != player_id
         )
-        if all_others_defeated and sum(player.army.values()) > 0:
+        if all_others_defeated and sum(player.army) > 0:
             room.game_state = "finished"
             room.winner = player_id
             return
 
-def can_afford(resources: Dict[str, int], cost: Dict[str, int]) -> bool:
+class _ReplayConnection:
+    """Соединение-заглушка для обработчиков без клиента (восстановление, боты): ответы никуда не уходят"""
+    
+    def send_json(self, message: dict, coalesce_key: Optional[str] = None) -> bool:
+        return False
+
+async def apply_logged_action(room_code: str, entry: dict):
+    """Повторно применяет действие из журнала через те же обработчики"""
+    connection = _ReplayConnection()
+    kind = entry["kind"]
+    player_id = entry["player_id"]
+    if kind == "join":
+        game_rooms[room_code].players[player_id] = create_player(player_id, entry["name"])
+    elif kind == "player_ready":
+        await handle_player_ready(room_code, player_id, entry["ready"], connection)
+    elif kind == "end_turn":
+        await handle_end_turn(room_code, player_id, connection)
+    elif kind == "bot":
+        set_bot_control(game_rooms[room_code], player_id, entry["enabled"])
+    elif kind == "turn_deadline":
+        game_rooms[room_code].turn_deadline = entry["deadline"]
+    elif kind == "game_action":
+        action = entry["action"]
+        if action.get("type") == "attack":
+            await handle_attack(room_code, player_id, action["target_player_id"], action, connection,
+                                rolls=tuple(entry["rolls"]))
+        else:
+            await handle_game_action(room_code, player_id, action, connection)
+
+async def restore_rooms_from_log():
+    """Восстанавливает комнаты из последних снимков и хвостов журнала"""
+    recovered = await action_log.recover()
+    # Чужие комнаты (журнал от другого SHARD_COUNT или общий каталог) не трогаем:
+    # их часы, лобби и файлы журнала принадлежат воркеру-владельцу
+    foreign = [room.code for room, _ in recovered if not shard_map.is_local(room.code)]
+    if foreign:
+        print(f"Skipped {len(foreign)} rooms owned by other shards")
+        recovered = [(room, tail) for room, tail in recovered if shard_map.is_local(room.code)]
+    if not recovered:
+        return
+    action_log.replaying = True
+    try:
+        for room, tail in recovered:
+            game_rooms[room.code] = room
+            active_connections.setdefault(room.code, [])
+            lifecycle.track(room.code, room.game_state)
+            for entry in tail:
+                await apply_logged_action(room.code, entry)
+            lobby.update(room)
+            if room.turn_deadline is not None:
+                # Прошедший дедлайн сработает на первом тике и будет пропущен,
+                # если к тому времени в комнате никого нет
+                turn_clock.schedule(room.code, room.turn_deadline)
+    finally:
+        action_log.replaying = False
+    print(f"Restored {len(recovered)} rooms from action log")
+
+# Стоимости и эффекты берутся из правил комнаты (rules.py)
+def can_afford(resources: Sequence[int], cost: Sequence[int]) -> bool:
     """Проверяет, достаточно ли ресурсов"""
-    return all(resources.get(resource, 0) >= amount for resource, amount in cost.items())
-
-def get_building_cost(building_type: str) -> Dict[str, int]:
-    """Возвращает стоимость здания"""
-    costs = {
-        "barracks": {"wood": 100, "stone": 50, "gold": 200},
-        "farm": {"wood": 50, "gold": 100},
-        "mine": {"stone": 100, "gold": 150},
-        "wall": {"stone": 200, "wood": 100}
-    }
-    return costs.get(building_type, {})
-
-def get_unit_cost(unit_type: str, quantity: int) -> Dict[str, int]:
-    """Возвращает стоимость юнита"""
-    costs_per_unit = {
-        "soldiers": {"gold": 50, "food": 20},
-        "archers": {"gold": 75, "wood": 30, "food": 15},
-        "cavalry": {"gold": 150, "food": 50}
-    }
-    unit_cost = costs_per_unit.get(unit_type, {})
-    return {k: v * quantity for k, v in unit_cost.items()}
+    return all(have >= amount for have, amount in zip(resources, cost))
 
-def apply_building_effect(player: Player, building_type: str):
+def pay(resources: List[int], cost: Sequence[int]):
+    """Списывает стоимость с ресурсов"""
+    for index, amount in enumerate(cost):
+        resources[index] -= amount
+
+def get_unit_cost(unit_index: int, quantity: int, rules: Rules) -> List[int]:
+    """Возвращает стоимость юнитов"""
+    return [amount * quantity for amount in rules.unit_costs[unit_index]]
+
+def apply_building_effect(player: Player, building_index: int, rules: Rules):
     """Применяет эффект здания"""
-    effects = {
-        "barracks": lambda p: None,  # Увеличивает скорость обучения
-        "farm": lambda p: p.resources.update({"food": p.resources.get("food", 0) + 100}),
-        "mine": lambda p: p.resources.update({"gold": p.resources.get("gold", 0) + 50})
-    }
-    if building_type in effects:
-        effects[building_type](player)
+    effect = rules.building_effects[building_index]
+    if effect is not None:
+        for index, amount in enumerate(effect):
+            player.resources[index] += amount
 
 if __name__ == "__main__":
     import uvicorn
     import os
+    from compression import CompressedWebSocketProtocol
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(app, host="0.0.0.0", port=port, ws=CompressedWebSocketProtocol)
 
@@ -0,0 +1,238 @@
+"""Подбор игроков: очередь с индексом по диапазонам рейтинга
+
+Заявки (Ticket) лежат в корзинах по диапазонам рейтинга шириной MATCH_BAND;
+внутри корзины — в порядке поступления. Отсортированный список непустых
+корзин позволяет за O(log B) найти соседей заявки и обходить корзины от
+ближних к дальним, не просматривая очередь целиком. Новая заявка сразу
+пытается собрать комнату вокруг себя.
+
+Окно поиска растет с ожиданием: каждые MATCH_WIDEN_SECONDS секунд на одну
+корзину в обе стороны, но не больше MATCH_MAX_WIDEN. Пока заявка ждет
+меньше MATCH_FILL_SECONDS, комната собирается только полной
+(MATCH_MAX_PLAYERS), потом — от MATCH_MIN_PLAYERS. Периодический проход
+(sweep) повторяет попытку только для заявок, у которых с прошлой попытки
+расширилось окно или закончилось ожидание полной комнаты.
+
+Собранную группу получает on_match: создание комнаты и уведомление
+игроков — забота вызывающего кода (main). Заявку, не дождавшуюся подбора
+за MATCH_TICKET_TTL, sweep снимает и передает on_expire.
+"""
+import asyncio
+import os
+import time
+import uuid
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from metrics import matchmaking_matches, matchmaking_wait_seconds
+
+MATCH_BAND = int(os.getenv("MATCH_BAND", "100"))
+MATCH_MIN_PLAYERS = int(os.getenv("MATCH_MIN_PLAYERS", "2"))
+MATCH_MAX_PLAYERS = int(os.getenv("MATCH_MAX_PLAYERS", "4"))
+MATCH_WIDEN_SECONDS = float(os.getenv("MATCH_WIDEN_SECONDS", "5"))
+MATCH_MAX_WIDEN = int(os.getenv("MATCH_MAX_WIDEN", "10"))
+MATCH_FILL_SECONDS = float(os.getenv("MATCH_FILL_SECONDS", "15"))
+MATCH_INTERVAL = float(os.getenv("MATCH_INTERVAL_MS", "500")) / 1000
+# Сколько хранится заявка без результата и результат подбора для опроса
+MATCH_TICKET_TTL = float(os.getenv("MATCH_TICKET_TTL", "300"))
+MATCH_RESULT_TTL = float(os.getenv("MATCH_RESULT_TTL", "60"))
+
+
+class Ticket:
+    """Заявка игрока в очереди подбора"""
+
+    __slots__ = ("id", "name", "rating", "band", "enqueued", "matched_at", "room_code", "player_id", "attempt")
+
+    def __init__(self, name: str, rating: int, band: int, enqueued: float):
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.rating = rating
+        self.band = band
+        self.enqueued = enqueued
+        self.matched_at: Optional[float] = None
+        self.room_code: Optional[str] = None
+        self.player_id: Optional[str] = None
+        # (окно, только полная комната) последней неудачной попытки
+        self.attempt: Optional[tuple] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "ticket_id": self.id,
+            "status": "waiting" if self.matched_at is None else "matched",
+            "rating": self.rating,
+            "room_code": self.room_code,
+            "player_id": self.player_id,
+        }
+
+
+class Matchmaker:
+    """Очередь подбора одного процесса"""
+
+    def __init__(
+        self,
+        on_match: Callable[[List[Ticket]], None],
+        on_expire: Optional[Callable[[Ticket], None]] = None,
+        band: int = MATCH_BAND,
+        min_players: int = MATCH_MIN_PLAYERS,
+        max_players: int = MATCH_MAX_PLAYERS,
+        widen_seconds: float = MATCH_WIDEN_SECONDS,
+        max_widen: int = MATCH_MAX_WIDEN,
+        fill_seconds: float = MATCH_FILL_SECONDS,
+        interval: float = MATCH_INTERVAL,
+    ):
+        self.on_match = on_match
+        self.on_expire = on_expire
+        self.band = band
+        self.min_players = min_players
+        self.max_players = max_players
+        self.widen_seconds = widen_seconds
+        self.max_widen = max_widen
+        self.fill_seconds = fill_seconds
+        self.interval = interval
+        # Корзина диапазона -> заявки в порядке поступления
+        self._bands: Dict[int, "OrderedDict[str, Ticket]"] = {}
+        self._band_ids: List[int] = []
+        # Все ожидающие заявки в порядке поступления и подобранные — для опроса
+        self._waiting: "OrderedDict[str, Ticket]" = OrderedDict()
+        self._matched: "OrderedDict[str, Ticket]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._waiting)
+
+    def get(self, ticket_id: str) -> Optional[Ticket]:
+        return self._waiting.get(ticket_id) or self._matched.get(ticket_id)
+
+    def enqueue(self, name: str, rating: int, now: Optional[float] = None) -> Ticket:
+        """Ставит игрока в очередь и сразу пытается собрать комнату"""
+        now = time.monotonic() if now is None else now
+        ticket = Ticket(name, rating, rating // self.band, now)
+        self._waiting[ticket.id] = ticket
+        queue = self._bands.get(ticket.band)
+        if queue is None:
+            queue = self._bands[ticket.band] = OrderedDict()
+            insort(self._band_ids, ticket.band)
+        queue[ticket.id] = ticket
+        self._try_match(ticket, now)
+        return ticket
+
+    def cancel(self, ticket_id: str) -> bool:
+        """Убирает ожидающую заявку из очереди"""
+        ticket = self._waiting.pop(ticket_id, None)
+        if ticket is None:
+            return False
+        self._remove_from_band(ticket)
+        return True
+
+    def _remove_from_band(self, ticket: Ticket):
+        queue = self._bands[ticket.band]
+        del queue[ticket.id]
+        if not queue:
+            del self._bands[ticket.band]
+            del self._band_ids[bisect_left(self._band_ids, ticket.band)]
+
+    def window(self, ticket: Ticket, now: float) -> int:
+        """Сколько соседних корзин в каждую сторону видит заявка"""
+        return min(self.max_widen, int((now - ticket.enqueued) / self.widen_seconds))
+
+    def _candidates(self, ticket: Ticket, now: float) -> List[Ticket]:
+        """До max_players совместимых заявок из ближайших корзин, включая ticket
+
+        Пара совместима, если разница корзин укладывается в окно хотя бы
+        одной из заявок: новая заявка находит старые, чье окно уже расширилось.
+        """
+        group = [ticket]
+        window = self.window(ticket, now)
+        ids = self._band_ids
+        right = bisect_left(ids, ticket.band)
+        left = right - 1
+        while len(group) < self.max_players:
+            # Следующая по удаленности корзина слева или справа
+            left_distance = ticket.band - ids[left] if left >= 0 else None
+            right_distance = ids[right] - ticket.band if right < len(ids) else None
+            if right_distance is not None and (left_distance is None or right_distance <= left_distance):
+                band_id, distance = ids[right], right_distance
+                right += 1
+            elif left_distance is not None:
+                band_id, distance = ids[left], left_distance
+                left -= 1
+            else:
+                break
+            if distance > self.max_widen:
+                break
+            for other in self._bands[band_id].values():
+                if other is ticket:
+                    continue
+                # В корзине заявки по возрасту: дальше окна только уже
+                if distance > window and distance > self.window(other, now):
+                    break
+                group.append(other)
+                if len(group) == self.max_players:
+                    break
+        return group
+
+    def _try_match(self, ticket: Ticket, now: float) -> bool:
+        window = self.window(ticket, now)
+        full_only = now - ticket.enqueued < self.fill_seconds
+        if ticket.attempt == (window, full_only):
+            # С прошлой попытки окно не изменилось; новые заявки ищут старые сами
+            return False
+        group = self._candidates(ticket, now)
+        # Неполная комната допустима, если кто-то из группы ждет достаточно долго
+        if any(now - member.enqueued >= self.fill_seconds for member in group):
+            needed = self.min_players
+        else:
+            needed = self.max_players
+        if len(group) < needed:
+            ticket.attempt = (window, full_only)
+            return False
+        for member in group:
+            del self._waiting[member.id]
+            self._remove_from_band(member)
+            member.matched_at = now
+            self._matched[member.id] = member
+            matchmaking_wait_seconds.observe(now - member.enqueued)
+        matchmaking_matches.labels(str(len(group))).inc()
+        self.on_match(group)
+        return True
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Повторяет подбор для заявок, чье окно расширилось; чистит старые заявки"""
+        now = time.monotonic() if now is None else now
+        matched = 0
+        # Старые заявки первыми: у них самое широкое окно
+        for ticket in list(self._waiting.values()):
+            if ticket.id not in self._waiting:
+                continue
+            if now - ticket.enqueued > MATCH_TICKET_TTL:
+                self.cancel(ticket.id)
+                if self.on_expire is not None:
+                    self.on_expire(ticket)
+            elif self._try_match(ticket, now):
+                matched += 1
+        while self._matched:
+            ticket = next(iter(self._matched.values()))
+            if now - ticket.matched_at < MATCH_RESULT_TTL:
+                break
+            del self._matched[ticket.id]
+        return matched
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Matchmaking error: {e!r}")
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,300 @@
+"""Метрики сервера в формате Prometheus
+
+Все метрики обновляются инкрементально за O(1): счетчик — одно сложение,
+гистограмма — поиск корзины bisect и два сложения. Дочерние метрики с
+метками создаются один раз и кэшируются по значению метки, поэтому на
+горячем пути не создаются словари меток. Текст для /metrics собирается
+только при запросе.
+
+METRICS_ENABLED=0 при старте заменяет все метрики заглушками без работы.
+"""
+import abc
+import asyncio
+import os
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+# Корзины по умолчанию: секунды от 0.1 мс до 10 с
+TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+SIZE_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536, 262144)
+DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "_Metric"] = {}
+
+    def labels(self, *values: str) -> "_Metric":
+        """Дочерняя метрика для значений меток (создается один раз)"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self) -> "_Metric":
+        return type(self)(self.name, self.documentation)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        if self.labelnames:
+            for values, child in sorted(self._children.items()):
+                lines.extend(child._render_samples(self.labelnames, values))
+        else:
+            lines.extend(self._render_samples((), ()))
+        return lines
+
+    @abc.abstractmethod
+    def _render_samples(self, labelnames, labelvalues) -> List[str]:
+        """Строки значений одной (дочерней) метрики"""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def _render_samples(self, labelnames, labelvalues) -> List[str]:
+        return [f"{self.name}{_format_labels(labelnames, labelvalues)} {_format_value(self.value)}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class GaugeFunc(_Metric):
+    """Gauge, значение которого читается функцией в момент запроса /metrics"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, function: Callable[[], Dict[Tuple[str, ...], float]],
+                 labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._render_samples(self.labelnames, ()))
+        return lines
+
+    def _render_samples(self, labelnames, labelvalues) -> List[str]:
+        # Дочерних метрик нет: значения всех меток возвращает функция
+        return [f"{self.name}{_format_labels(labelnames, values)} {_format_value(value)}"
+                for values, value in sorted(self.function().items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = TIME_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Последняя корзина — +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, buckets=self.buckets)
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def _render_samples(self, labelnames, labelvalues) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            labels = _format_labels(labelnames, labelvalues, f'le="{_format_value(float(bound))}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, labelvalues)
+        lines.append(f"{self.name}_sum{labels} {_format_value(self.sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _NoopMetric:
+    """Заглушка с тем же интерфейсом, не делающая ничего"""
+
+    def labels(self, *values: str) -> "_NoopMetric":
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def dec(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+
+NOOP = _NoopMetric()
+
+
+class Registry:
+    """Набор метрик; при enabled=False фабрики возвращают заглушки"""
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._metrics: List[_Metric] = []
+
+    def _register(self, metric: _Metric):
+        if not self.enabled:
+            return NOOP
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def gauge_func(self, name: str, documentation: str, function, labelnames: Sequence[str] = ()):
+        return self._register(GaugeFunc(name, documentation, function, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = TIME_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Метрики сервера
+handler_seconds = registry.histogram(
+    "game_handler_seconds", "Время обработки входящего сообщения по типу действия", ("action",)
+)
+broadcast_seconds = registry.histogram(
+    "game_broadcast_seconds", "Время постановки рассылки в очереди всех соединений комнаты"
+)
+broadcast_fanout = registry.histogram(
+    "game_broadcast_fanout", "Число соединений, получивших рассылку", buckets=DEPTH_BUCKETS
+)
+message_size = registry.histogram(
+    "game_message_size_bytes", "Размер сериализованного сообщения в байтах по типу и кодировке",
+    ("type", "encoding"),
+    buckets=SIZE_BUCKETS
+)
+send_queue_depth = registry.histogram(
+    "game_send_queue_depth", "Глубина очереди соединения после постановки сообщения", buckets=DEPTH_BUCKETS
+)
+ws_connects = registry.counter("game_ws_connects_total", "Подключения WebSocket")
+ws_disconnects = registry.counter("game_ws_disconnects_total", "Отключения WebSocket")
+ws_connections = registry.gauge("game_ws_connections", "Открытые WebSocket-соединения")
+ws_evictions = registry.counter("game_ws_evictions_total", "Принудительные отключения по причине", ("reason",))
+room_queue_depth = registry.histogram(
+    "game_room_queue_depth", "Глубина очереди команд комнаты после постановки команды", buckets=DEPTH_BUCKETS
+)
+room_command_wait_seconds = registry.histogram(
+    "game_room_command_wait_seconds", "Время ожидания команды в очереди комнаты до начала обработки"
+)
+room_queue_rejections = registry.counter(
+    "game_room_queue_rejections_total", "Команды, отклоненные из-за переполнения очереди комнаты"
+)
+inbound_rejected = registry.counter(
+    "game_inbound_rejected_total", "Сообщения клиентов, отклоненные ограничителем частоты, по типу", ("kind",)
+)
+inbound_merged = registry.counter(
+    "game_inbound_merged_total", "Сообщения клиентов, слитые с предыдущим действием, по типу", ("kind",)
+)
+loop_lag_seconds = registry.histogram(
+    "game_event_loop_lag_seconds", "Задержка пробуждения цикла событий относительно расписания"
+)
+turn_clock_lag_seconds = registry.histogram(
+    "game_turn_clock_lag_seconds", "Задержка автоматического завершения хода относительно дедлайна"
+)
+turn_clock_expired = registry.counter("game_turn_clock_expired_total", "Истекшие дедлайны ходов")
+spectator_snapshot_seconds = registry.histogram(
+    "game_spectator_snapshot_seconds", "Время снятия снимка комнаты для зрителей"
+)
+spectator_rejections = registry.counter(
+    "game_spectator_rejections_total", "Зрители, не подключенные из-за предела числа зрителей"
+)
+bot_decision_seconds = registry.histogram(
+    "game_bot_decision_seconds", "Время выбора действия бота, включая ожидание пула процессов"
+)
+bot_rollouts = registry.counter("game_bot_rollouts_total", "Розыгрыши, выполненные поиском ботов")
+matchmaking_wait_seconds = registry.histogram(
+    "game_matchmaking_wait_seconds", "Время ожидания в очереди подбора до сборки комнаты",
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0, 60.0, 120.0, 300.0)
+)
+matchmaking_matches = registry.counter(
+    "game_matchmaking_matches_total", "Комнаты, собранные подбором, по числу игроков", ("players",)
+)
+lobby_requests = registry.counter(
+    "game_lobby_requests_total", "Запросы списка комнат: 304, страница из кэша или пересобранная", ("result",)
+)
+room_view_cache = registry.counter(
+    "game_room_view_cache_total", "Запросы полного снимка комнаты: из кэша по ревизии или пересобранные", ("result",)
+)
+replay_chunk_bytes = registry.histogram(
+    "game_replay_chunk_bytes", "Размер сжатого блока хода в повторе",
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576)
+)
+replays_finished = registry.counter("game_replays_finished_total", "Повторы завершенных партий")
+
+
+class LoopLagMonitor:
+    """Периодически засыпает и измеряет, насколько позже расписания проснулся"""
+
+    def __init__(self, interval: float = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.5"))):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            loop_lag_seconds.observe(max(0.0, loop.time() - expected))
+
+    async def start(self):
+        if registry.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
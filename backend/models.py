@@ -0,0 +1,309 @@
+"""Модели игрового состояния: игроки и комнаты
+
+На горячем пути используются компактные классы со __slots__: ресурсы, армия
+и здания хранятся списками целых фиксированной длины, индексы которых заданы
+кортежами RESOURCES, UNITS и BUILDINGS. Pydantic-модели PlayerModel и
+GameRoomModel остаются только на границе API — для проверки данных,
+пришедших извне (снимки из хранилища и журнала).
+"""
+from typing import Dict, List, Optional, Sequence
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict
+
+# Фиксированные индексы ресурсов, юнитов и зданий
+RESOURCES = ("gold", "wood", "stone", "food")
+UNITS = ("soldiers", "archers", "cavalry")
+BUILDINGS = ("barracks", "farm", "mine", "wall")
+
+RESOURCE_INDEX = {name: index for index, name in enumerate(RESOURCES)}
+UNIT_INDEX = {name: index for index, name in enumerate(UNITS)}
+BUILDING_INDEX = {name: index for index, name in enumerate(BUILDINGS)}
+
+GOLD, WOOD, STONE, FOOD = range(len(RESOURCES))
+SOLDIERS, ARCHERS, CAVALRY = range(len(UNITS))
+BARRACKS, FARM, MINE, WALL = range(len(BUILDINGS))
+
+# Начальные ресурсы
+INITIAL_RESOURCES = (1000, 500, 500, 1000)
+
+# Начальная армия
+INITIAL_ARMY = (10, 5, 3)
+
+# Максимум игроков в комнате
+MAX_PLAYERS = 4
+
+
+def resource_vector(amounts: Dict[str, int]) -> Optional[List[int]]:
+    """Переводит словарь {ресурс: количество} в вектор; None при неизвестном ресурсе"""
+    vector = [0] * len(RESOURCES)
+    for name, amount in amounts.items():
+        index = RESOURCE_INDEX.get(name)
+        if index is None:
+            return None
+        vector[index] += amount
+    return vector
+
+
+def named(names: Sequence[str], values: Sequence[int]) -> Dict[str, int]:
+    """Вектор -> словарь {имя: значение}"""
+    return dict(zip(names, values))
+
+
+# Модели данных
+class Player:
+    __slots__ = (
+        "id", "name", "resources", "army", "buildings",
+        "technologies", "territories", "victory_points", "is_ready", "income",
+    )
+
+    def __init__(
+        self,
+        id: str,
+        name: str,
+        resources: List[int],
+        army: List[int],
+        buildings: Optional[List[int]] = None,
+        technologies: Optional[List[str]] = None,
+        territories: Optional[List[str]] = None,
+        victory_points: int = 0,
+        is_ready: bool = False,
+    ):
+        self.id = id
+        self.name = name
+        self.resources = resources  # индексы RESOURCES
+        self.army = army  # индексы UNITS
+        self.buildings = buildings if buildings is not None else [0] * len(BUILDINGS)  # индексы BUILDINGS
+        self.technologies = technologies if technologies is not None else []  # Исследованные технологии
+        self.territories = territories if territories is not None else []
+        self.victory_points = victory_points  # Очки победы
+        self.is_ready = is_ready
+        # Кэш дохода за ход (turns.player_income), сбрасывается при изменении зданий и технологий
+        self.income: Optional[List[int]] = None
+
+    def to_dict(self) -> dict:
+        """Представление игрока для клиентов и хранилищ"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "resources": named(RESOURCES, self.resources),
+            "army": named(UNITS, self.army),
+            "territories": list(self.territories),
+            # Как и раньше, в словаре только построенные здания
+            "buildings": {name: count for name, count in zip(BUILDINGS, self.buildings) if count},
+            "technologies": list(self.technologies),
+            "victory_points": self.victory_points,
+            "is_ready": self.is_ready,
+        }
+
+    @classmethod
+    def from_model(cls, model: "PlayerModel") -> "Player":
+        return cls(
+            id=model.id,
+            name=model.name,
+            resources=[model.resources.get(name, 0) for name in RESOURCES],
+            army=[model.army.get(name, 0) for name in UNITS],
+            buildings=[model.buildings.get(name, 0) for name in BUILDINGS],
+            technologies=list(model.technologies),
+            territories=list(model.territories),
+            victory_points=model.victory_points,
+            is_ready=model.is_ready,
+        )
+
+
+class GameRoom:
+    __slots__ = (
+        "code", "players", "game_state", "created_at", "current_turn",
+        "turn_number", "winner", "revision", "rules_version", "turn_seconds", "turn_deadline",
+        "bot_players", "_shadow_players", "_shadow_room",
+    )
+
+    def __init__(
+        self,
+        code: str,
+        players: Dict[str, Player],
+        game_state: str,  # "waiting", "playing", "finished"
+        created_at: datetime,
+        current_turn: Optional[str] = None,
+        turn_number: int = 1,  # Номер текущего хода
+        winner: Optional[str] = None,  # ID победителя
+        revision: int = 0,  # Ревизия состояния, растет с каждым зафиксированным изменением
+        rules_version: Optional[int] = None,  # Версия правил (rules.py), закрепленная при создании
+        turn_seconds: int = 0,  # Длительность хода в секундах; 0 — ход без таймера
+        turn_deadline: Optional[float] = None,  # Время окончания текущего хода (time.time())
+        bot_players: Optional[List[str]] = None,  # Игроки, за которых ходит бот
+    ):
+        self.code = code
+        self.players = players
+        self.game_state = game_state
+        self.created_at = created_at
+        self.current_turn = current_turn
+        self.turn_number = turn_number
+        self.winner = winner
+        self.revision = revision
+        self.rules_version = rules_version
+        self.turn_seconds = turn_seconds
+        self.turn_deadline = turn_deadline
+        # Список заменяется целиком, а не меняется на месте: commit_revision
+        # сравнивает его с сохраненной ссылкой на прошлое значение
+        self.bot_players = list(bot_players or [])
+        # Последнее разосланное клиентам состояние, относительно которого строятся патчи
+        self._shadow_players: Dict[str, tuple] = {}
+        self._shadow_room: dict = {}
+
+    def commit_revision(self) -> dict:
+        """Фиксирует изменения с прошлой ревизии и возвращает патч для рассылки
+
+        Патч содержит только изменившиеся поля (абсолютные значения, а не приращения),
+        поэтому повторное применение патча к состоянию безопасно.
+        """
+        base_revision = self.revision
+        room_changes = {}
+        for field in PATCH_ROOM_FIELDS:
+            value = getattr(self, field)
+            if field not in self._shadow_room or self._shadow_room[field] != value:
+                room_changes[field] = value
+                self._shadow_room[field] = value
+
+        players_changes = {}
+        for pid, player in self.players.items():
+            current = player_patch_state(player)
+            previous = self._shadow_players.get(pid)
+            self._shadow_players[pid] = current
+            if previous is None:
+                # Новый игрок — отправляем целиком
+                players_changes[pid] = player.to_dict()
+            elif current != previous:
+                players_changes[pid] = player_patch_diff(previous, current)
+
+        removed_players = [pid for pid in self._shadow_players if pid not in self.players]
+        for pid in removed_players:
+            del self._shadow_players[pid]
+
+        if room_changes or players_changes or removed_players:
+            self.revision += 1
+
+        patch = {"base_revision": base_revision, "revision": self.revision}
+        if room_changes:
+            patch["room"] = room_changes
+        if players_changes:
+            patch["players"] = players_changes
+        if removed_players:
+            patch["removed_players"] = removed_players
+        return patch
+
+    def to_dict(self):
+        """Конвертирует комнату в словарь с правильной сериализацией datetime"""
+        return {
+            "code": self.code,
+            "players": {pid: p.to_dict() for pid, p in self.players.items()},
+            "game_state": self.game_state,
+            "created_at": self.created_at.isoformat(),
+            "current_turn": self.current_turn,
+            "turn_number": self.turn_number,
+            "winner": self.winner,
+            "revision": self.revision,
+            "rules_version": self.rules_version,
+            "turn_seconds": self.turn_seconds,
+            "turn_deadline": self.turn_deadline,
+            "bot_players": list(self.bot_players),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GameRoom":
+        """Восстанавливает комнату из словаря с проверкой через GameRoomModel"""
+        model = GameRoomModel.model_validate(data)
+        return cls(
+            code=model.code,
+            players={pid: Player.from_model(p) for pid, p in model.players.items()},
+            game_state=model.game_state,
+            created_at=model.created_at,
+            current_turn=model.current_turn,
+            turn_number=model.turn_number,
+            winner=model.winner,
+            revision=model.revision,
+            rules_version=model.rules_version,
+            turn_seconds=model.turn_seconds,
+            turn_deadline=model.turn_deadline,
+            bot_players=model.bot_players,
+        )
+
+
+# Pydantic-модели для проверки данных на границе API
+class PlayerModel(BaseModel):
+    model_config = ConfigDict()
+
+    id: str
+    name: str
+    resources: Dict[str, int]
+    army: Dict[str, int]
+    territories: List[str]
+    buildings: Dict[str, int] = {}  # building_type -> quantity
+    technologies: List[str] = []  # Исследованные технологии
+    victory_points: int = 0  # Очки победы
+    is_ready: bool = False
+
+
+class GameRoomModel(BaseModel):
+    model_config = ConfigDict()
+
+    code: str
+    players: Dict[str, PlayerModel]
+    game_state: str  # "waiting", "playing", "finished"
+    created_at: datetime
+    current_turn: Optional[str] = None
+    turn_number: int = 1  # Номер текущего хода
+    winner: Optional[str] = None  # ID победителя
+    revision: int = 0
+    rules_version: Optional[int] = None
+    turn_seconds: int = 0
+    turn_deadline: Optional[float] = None
+    bot_players: List[str] = []
+
+
+# Поля комнаты, которые попадают в патчи состояния
+PATCH_ROOM_FIELDS = ("game_state", "current_turn", "turn_number", "winner", "turn_deadline", "bot_players")
+
+# Порядок полей в снимке игрока для вычисления патча
+PATCH_PLAYER_FIELDS = ("name", "resources", "army", "buildings", "technologies", "victory_points", "is_ready")
+PATCH_VECTOR_NAMES = {"resources": RESOURCES, "army": UNITS, "buildings": BUILDINGS}
+
+def player_patch_state(player: Player) -> tuple:
+    """Снимок изменяемых полей игрока для вычисления патча"""
+    return (
+        player.name,
+        tuple(player.resources),
+        tuple(player.army),
+        tuple(player.buildings),
+        tuple(player.technologies),
+        player.victory_points,
+        player.is_ready,
+    )
+
+def player_patch_diff(previous: tuple, current: tuple) -> dict:
+    """Изменившиеся поля игрока; для векторов — только изменившиеся элементы"""
+    diff = {}
+    for field, old_value, value in zip(PATCH_PLAYER_FIELDS, previous, current):
+        if value == old_value:
+            continue
+        names = PATCH_VECTOR_NAMES.get(field)
+        if names is not None:
+            diff[field] = {names[i]: v for i, v in enumerate(value) if old_value[i] != v}
+        elif field == "technologies":
+            diff[field] = list(value)
+        else:
+            diff[field] = value
+    return diff
+
+def create_player(player_id: str, name: str) -> Player:
+    """Создает нового игрока"""
+    return Player(
+        id=player_id,
+        name=name,
+        resources=list(INITIAL_RESOURCES),
+        army=list(INITIAL_ARMY),
+        territories=[],
+        buildings=[0] * len(BUILDINGS),
+        technologies=[],
+        victory_points=0,
+        is_ready=False
+    )
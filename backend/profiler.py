@@ -0,0 +1,135 @@
+"""Выборочный профилировщик и трассировка одной комнаты для работающего сервера
+
+SamplingProfiler в фоновом потоке раз в interval секунд снимает стек потока
+цикла событий (sys._current_frames) и считает одинаковые стеки. Результат —
+collapsed stacks ("f1;f2;f3 N" по строке на стек), который напрямую
+принимают flamegraph.pl и speedscope, а также сводка по функциям.
+Профилировщик не меняет код сервера и не требует перезапуска: пока он не
+запущен, накладных расходов нет.
+
+RoomTracer записывает время обработки входящих сообщений одной комнаты.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+TRACE_MAX_RECORDS = int(os.getenv("TRACE_MAX_RECORDS", "1000"))
+
+
+class SamplingProfiler:
+    """Профиль по снимкам стека одного потока"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._labels: Dict[object, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        self.samples[";".join(stack)] += 1
+        self.sample_count += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        """Стеки в формате collapsed stacks, самые частые первыми"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def functions(self, limit: int = 50) -> List[dict]:
+        """Сводка по функциям: self — функция на вершине стека, total — где-либо в стеке"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.samples.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for function in set(frames):
+                total[function] += count
+        ranked = sorted(total, key=lambda function: (own[function], total[function]), reverse=True)
+        return [
+            {"function": function, "self": own[function], "total": total[function]}
+            for function in ranked[:limit]
+        ]
+
+
+class ProfilerService:
+    """Запускает не более одного профиля одновременно"""
+
+    def __init__(self):
+        self.running: Optional[SamplingProfiler] = None
+
+    @property
+    def busy(self) -> bool:
+        return self.running is not None
+
+    def start(self, thread_id: int, interval: float) -> SamplingProfiler:
+        profiler = SamplingProfiler(thread_id, interval)
+        self.running = profiler
+        profiler.start()
+        return profiler
+
+    def finish(self, profiler: SamplingProfiler):
+        profiler.stop()
+        self.running = None
+
+
+class RoomTracer:
+    """Время обработки сообщений одной выбранной комнаты"""
+
+    def __init__(self, max_records: int = TRACE_MAX_RECORDS):
+        # Код отслеживаемой комнаты; None — трассировка выключена
+        self.room_code: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.records: Deque[Tuple[float, str, str, float]] = deque(maxlen=max_records)
+
+    def start(self, room_code: str):
+        self.room_code = room_code
+        self.started_at = time.time()
+        self.records.clear()
+
+    def stop(self):
+        self.room_code = None
+
+    def record(self, player_id: str, message_type: str, seconds: float):
+        self.records.append((time.time(), player_id, message_type, seconds))
+
+    def report(self) -> dict:
+        return {
+            "room_code": self.room_code,
+            "started_at": self.started_at,
+            "records": [
+                {"time": at, "player_id": player_id, "type": message_type, "ms": round(seconds * 1000, 3)}
+                for at, player_id, message_type, seconds in self.records
+            ],
+        }
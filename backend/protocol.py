@@ -0,0 +1,146 @@
+"""Кодировки WebSocket-протокола: JSON и MessagePack
+
+Клиент выбирает кодировку при подключении через подпротокол WebSocket:
+если он предлагает MSGPACK_SUBPROTOCOL и на сервере установлен msgpack,
+сервер принимает его, иначе соединение работает в JSON, как раньше.
+
+В MessagePack ключи словарей из KEYS заменяются их номерами (поля сообщений,
+ресурсы, юниты, здания), остальные ключи (ID игроков) остаются строками.
+Таблица только дополняется в конце, номера существующих ключей не меняются;
+клиенты получают ее через /api/protocol.
+
+Исходящее сообщение один раз оборачивается в EncodedMessage и сериализуется
+не чаще одного раза на кодировку, сколько бы получателей у него ни было.
+"""
+import json
+from typing import Dict, Iterable, Optional, Union
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from broadcast import encode_message
+from metrics import message_size
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack необязателен
+    msgpack = None
+
+MSGPACK_SUBPROTOCOL = "game.msgpack.v1"
+
+KEYS = (
+    # Конверт и патчи
+    "type", "patch", "base_revision", "revision", "room", "players", "removed_players",
+    "player_id", "action", "success", "error", "ready", "message",
+    # Комната
+    "code", "game_state", "created_at", "current_turn", "turn_number", "winner",
+    # Игрок
+    "id", "name", "resources", "army", "territories", "buildings", "technologies",
+    "victory_points", "is_ready",
+    # Ресурсы, юниты, здания
+    "gold", "wood", "stone", "food", "soldiers", "archers", "cavalry",
+    "barracks", "farm", "mine", "wall",
+    # Бой
+    "attacker_id", "defender_id", "result", "battle_details", "attacker_power", "defender_power",
+    "attacker_roll", "defender_roll", "attacker_total", "defender_total", "loot",
+    "attacker_losses", "defender_losses",
+    # Действия, торговля, ходы
+    "target_player_id", "trade_offer", "trade_request", "next_turn", "winner_id", "winner_name",
+    "building_type", "unit_type", "quantity", "tech_type",
+    # Добавленные позже — только в конец
+    "rules_version", "turn_seconds", "turn_deadline", "bot_players",
+    "ticket_id", "room_code",
+)
+KEY_IDS = {key: index for index, key in enumerate(KEYS)}
+_CONTAINERS = (dict, list)
+
+Payload = Union[str, bytes]
+
+
+def compact(value, _get=KEY_IDS.get):
+    """Заменяет известные ключи словарей их номерами"""
+    kind = type(value)
+    if kind is dict:
+        return {
+            _get(key, key): (compact(item) if type(item) in _CONTAINERS else item)
+            for key, item in value.items()
+        }
+    if kind is list:
+        return [compact(item) if type(item) in _CONTAINERS else item for item in value]
+    return value
+
+def expand(value):
+    """Обратное преобразование: номера ключей -> строки"""
+    kind = type(value)
+    if kind is dict:
+        return {
+            (KEYS[key] if type(key) is int and 0 <= key < len(KEYS) else key):
+                (expand(item) if type(item) in _CONTAINERS else item)
+            for key, item in value.items()
+        }
+    if kind is list:
+        return [expand(item) if type(item) in _CONTAINERS else item for item in value]
+    return value
+
+def encode_msgpack(message: dict) -> bytes:
+    return msgpack.packb(compact(message), use_bin_type=True)
+
+def decode_msgpack(data: bytes) -> dict:
+    return expand(msgpack.unpackb(data, raw=False, strict_map_key=False))
+
+ENCODERS = {"json": encode_message}
+if msgpack is not None:
+    ENCODERS["msgpack"] = encode_msgpack
+
+def payload_size(payload: Payload) -> int:
+    """Размер кадра в байтах: JSON-текст уходит в UTF-8"""
+    return len(payload.encode()) if type(payload) is str else len(payload)
+
+def observe_size(message_type: str, encoding: str, payload: Payload):
+    message_size.labels(message_type, encoding).observe(payload_size(payload))
+
+def negotiate(subprotocols: Iterable[str]) -> Optional[str]:
+    """Подпротокол, который сервер примет, или None для JSON"""
+    if "msgpack" in ENCODERS and MSGPACK_SUBPROTOCOL in subprotocols:
+        return MSGPACK_SUBPROTOCOL
+    return None
+
+def encoding_for(subprotocol: Optional[str]) -> str:
+    return "msgpack" if subprotocol == MSGPACK_SUBPROTOCOL else "json"
+
+def describe() -> dict:
+    """Описание протокола для клиентов"""
+    return {
+        "encodings": list(ENCODERS),
+        "msgpack_subprotocol": MSGPACK_SUBPROTOCOL,
+        "keys": list(KEYS),
+    }
+
+
+class EncodedMessage:
+    """Сообщение, сериализуемое лениво и не более одного раза на кодировку"""
+
+    __slots__ = ("message", "_payloads")
+
+    def __init__(self, message: dict):
+        self.message = message
+        self._payloads: Dict[str, Payload] = {}
+
+    def get(self, encoding: str) -> Payload:
+        payload = self._payloads.get(encoding)
+        if payload is None:
+            payload = self._payloads[encoding] = ENCODERS[encoding](self.message)
+            observe_size(self.message["type"], encoding, payload)
+        return payload
+
+
+async def receive_message(websocket: WebSocket) -> dict:
+    """Принимает сообщение клиента: текстовый кадр — JSON, бинарный — MessagePack"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    data = message.get("bytes")
+    if data is not None:
+        if msgpack is None:
+            raise ValueError("binary frames require msgpack")
+        return decode_msgpack(data)
+    return json.loads(message["text"])
@@ -0,0 +1,225 @@
+"""Повторы завершенных партий: сжатые блоки по ходам и индекс для перемотки
+
+Пока идет партия, каждое сообщение, разосланное комнате (действия игроков
+с результатами, battle_result с battle_details, смены хода), сериализуется
+в строку JSON и копится в блоке текущего хода (room.turn_number). Блок
+начинается ключевым кадром — полным состоянием комнаты на начало хода,
+поэтому любой ход можно показать без проигрывания предыдущих.
+
+При смене хода блок сжимается (zstd, если установлен zstandard, иначе gzip)
+и дописывается в `{REPLAY_DIR}/{room_code}.chunks` в потоке записи.
+Индекс `{room_code}.index` — записи фиксированной длины (смещение, длина)
+по номеру хода: запись хода N лежит по смещению (N - 1) * INDEX_ENTRY.size,
+так что переход к ходу N — одно чтение индекса и одно чтение блока.
+После окончания партии пишется `{room_code}.meta.json`; только с ним
+повтор считается готовым.
+
+Чтение (stream) — генератор: блоки читаются и распаковываются по одному,
+повтор целиком в память не загружается. После перезапуска сервера запись
+продолжается новым блоком с ключевым кадром; действия недописанного хода
+до сбоя в повтор не попадают.
+"""
+import asyncio
+import gzip
+import json
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from metrics import replay_chunk_bytes, replays_finished
+from models import GameRoom
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard необязателен
+    zstandard = None
+
+REPLAY_CODEC = os.getenv("REPLAY_CODEC", "zstd" if zstandard is not None else "gzip")
+CHUNKS_SUFFIX = ".chunks"
+INDEX_SUFFIX = ".index"
+META_SUFFIX = ".meta.json"
+# Смещение блока в .chunks и его длина; нулевая длина — хода нет в записи
+INDEX_ENTRY = struct.Struct("<QI")
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def compress(data: bytes) -> bytes:
+    if REPLAY_CODEC == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(data: bytes) -> bytes:
+    """Кодек определяется по сигнатуре блока, а не по текущей настройке"""
+    if data.startswith(ZSTD_MAGIC):
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class ReplayChunk:
+    """Блок текущего хода: ключевой кадр и строки событий"""
+
+    __slots__ = ("turn", "lines")
+
+    def __init__(self, turn: int, state: dict):
+        self.turn = turn
+        self.lines: List[str] = [_dumps({"turn": turn, "state": state})]
+
+
+def _dumps(value: dict) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class ReplayStore:
+    """Хранилище повторов; базовая реализация ничего не записывает"""
+
+    def record(self, room: GameRoom, message: dict):
+        """Добавляет разосланное комнате сообщение в повтор идущей партии"""
+
+    def close(self, room_code: str):
+        """Дописывает накопленный блок комнаты, которая выгружается из памяти"""
+
+    async def meta(self, room_code: str) -> Optional[dict]:
+        """Описание готового повтора или None"""
+        return None
+
+    def stream(self, room_code: str, meta: dict, from_turn: int = 1,
+               to_turn: Optional[int] = None) -> Iterator[bytes]:
+        """NDJSON повтора: строка описания, затем блоки ходов from_turn..to_turn"""
+        return iter(())
+
+    async def stop(self):
+        """Вызывается при остановке приложения"""
+
+
+class FileReplayStore(ReplayStore):
+    """Повторы в файлах: сжатые блоки ходов и индекс фиксированной длины"""
+
+    def __init__(self, directory: str, snapshot: Callable[[GameRoom], dict]):
+        self.directory = directory
+        self.snapshot = snapshot
+        os.makedirs(directory, exist_ok=True)
+        self._chunks: Dict[str, ReplayChunk] = {}
+        self._events: Dict[str, int] = {}
+        # Партии закончились, но события того же обработчика еще дописываются
+        self._finishing: Set[str] = set()
+        # Один поток записи: блоки и описание комнаты пишутся строго по порядку
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="replays")
+
+    def _path(self, room_code: str, suffix: str) -> str:
+        return os.path.join(self.directory, room_code + suffix)
+
+    def record(self, room: GameRoom, message: dict):
+        chunk = self._chunks.get(room.code)
+        if chunk is None:
+            if room.game_state != "playing":
+                # Запись начинается со старта партии (или с первого события после перезапуска)
+                return
+            chunk = self._chunks[room.code] = ReplayChunk(room.turn_number, self.snapshot(room))
+        # Сериализуем сразу: патчи ссылаются на списки, которые изменятся дальше
+        chunk.lines.append(_dumps({"ts": time.time(), **message}))
+        self._events[room.code] = self._events.get(room.code, 0) + 1
+        if room.game_state == "finished":
+            if room.code not in self._finishing:
+                # game_finished рассылается следом за turn_ended в том же обработчике
+                self._finishing.add(room.code)
+                asyncio.get_running_loop().call_soon(self._finish, room)
+        elif room.turn_number != chunk.turn:
+            self._submit(room.code, self._chunks.pop(room.code))
+            self._chunks[room.code] = ReplayChunk(room.turn_number, self.snapshot(room))
+
+    def _finish(self, room: GameRoom):
+        self._finishing.discard(room.code)
+        chunk = self._chunks.pop(room.code, None)
+        if chunk is None:
+            return
+        winner = room.players.get(room.winner) if room.winner else None
+        meta = {
+            "room_code": room.code,
+            "turns": chunk.turn,
+            "events": self._events.pop(room.code, 0),
+            "winner_id": room.winner,
+            "winner_name": winner.name if winner is not None else None,
+            "players": {pid: player.name for pid, player in room.players.items()},
+            "rules_version": room.rules_version,
+            "created_at": room.created_at.isoformat(),
+            "finished_at": time.time(),
+        }
+        self._submit(room.code, chunk)
+        self._executor.submit(self._write_meta, room.code, _dumps(meta))
+        replays_finished.inc()
+
+    def close(self, room_code: str):
+        chunk = self._chunks.pop(room_code, None)
+        self._events.pop(room_code, None)
+        if chunk is not None and len(chunk.lines) > 1:
+            self._submit(room_code, chunk)
+
+    def _submit(self, room_code: str, chunk: ReplayChunk):
+        data = ("\n".join(chunk.lines) + "\n").encode()
+        self._executor.submit(self._write_chunk, room_code, chunk.turn, data)
+
+    def _write_chunk(self, room_code: str, turn: int, data: bytes):
+        """Сжимает блок, дописывает его и ставит запись индекса (в потоке записи)"""
+        try:
+            payload = compress(data)
+            with open(self._path(room_code, CHUNKS_SUFFIX), "ab") as f:
+                offset = f.tell()
+                f.write(payload)
+            index_path = self._path(room_code, INDEX_SUFFIX)
+            with open(index_path, "r+b" if os.path.exists(index_path) else "wb") as f:
+                # Пропущенные ходы остаются нулевыми записями
+                f.seek((turn - 1) * INDEX_ENTRY.size)
+                f.write(INDEX_ENTRY.pack(offset, len(payload)))
+            replay_chunk_bytes.observe(len(payload))
+        except Exception as e:
+            print(f"Replay write error for {room_code}: {e!r}")
+
+    def _write_meta(self, room_code: str, data: str):
+        path = self._path(room_code, META_SUFFIX)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+    def _read_meta(self, room_code: str) -> Optional[dict]:
+        try:
+            with open(self._path(room_code, META_SUFFIX), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    async def meta(self, room_code: str) -> Optional[dict]:
+        # В потоке записи: описание читается после уже поставленных блоков
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._read_meta, room_code)
+
+    def stream(self, room_code: str, meta: dict, from_turn: int = 1,
+               to_turn: Optional[int] = None) -> Iterator[bytes]:
+        last = meta["turns"] if to_turn is None else min(to_turn, meta["turns"])
+        yield (_dumps({"replay": meta}) + "\n").encode()
+        with open(self._path(room_code, INDEX_SUFFIX), "rb") as index, \
+                open(self._path(room_code, CHUNKS_SUFFIX), "rb") as chunks:
+            for turn in range(from_turn, last + 1):
+                index.seek((turn - 1) * INDEX_ENTRY.size)
+                entry = index.read(INDEX_ENTRY.size)
+                if len(entry) < INDEX_ENTRY.size:
+                    break
+                offset, length = INDEX_ENTRY.unpack(entry)
+                if not length:
+                    continue
+                chunks.seek(offset)
+                yield decompress(chunks.read(length))
+
+    async def stop(self):
+        for room_code in list(self._chunks):
+            self.close(room_code)
+        self._executor.shutdown(wait=True)
+
+
+def create_replay_store(snapshot: Callable[[GameRoom], dict]) -> ReplayStore:
+    """Создает хранилище повторов, если задана переменная окружения REPLAY_DIR"""
+    directory = os.getenv("REPLAY_DIR")
+    if not directory:
+        return ReplayStore()
+    return FileReplayStore(directory, snapshot)
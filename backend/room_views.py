@@ -0,0 +1,80 @@
+"""Кэш сериализованного представления комнат по ревизии
+
+Полный снимок комнаты нужен GET /api/room/{room_code}, первому room_state
+при подключении, sync_request, отстающим клиентам и зрителям. RoomView
+строит room.to_dict() один раз на ревизию комнаты; тело REST-ответа с ETag
+и сообщение room_state (EncodedMessage, по разу на кодировку) получаются
+из него лениво и тоже не пересобираются, пока ревизия не изменилась.
+
+Ревизия растет только в commit_room. Изменения, которые ждут фиксации
+(вход игрока через /api/join-room фиксируется при его подключении),
+должны сбрасывать представление явно через discard.
+"""
+import json
+from typing import Dict, Optional
+
+from http_cache import etag_for
+from metrics import room_view_cache
+from models import GameRoom
+from protocol import EncodedMessage
+
+_hits = room_view_cache.labels("hit")
+_misses = room_view_cache.labels("miss")
+
+
+class RoomView:
+    """Представление одной ревизии комнаты"""
+
+    __slots__ = ("revision", "room", "_message", "_body", "_etag")
+
+    def __init__(self, revision: int, room: dict):
+        self.revision = revision
+        self.room = room
+        self._message: Optional[EncodedMessage] = None
+        self._body: Optional[bytes] = None
+        self._etag: Optional[str] = None
+
+    @property
+    def message(self) -> EncodedMessage:
+        """Сообщение room_state с полным снимком"""
+        if self._message is None:
+            self._message = EncodedMessage({"type": "room_state", "room": self.room})
+        return self._message
+
+    @property
+    def body(self) -> bytes:
+        """JSON-тело GET /api/room/{room_code}"""
+        if self._body is None:
+            self._body = json.dumps(
+                {**self.room, "player_count": len(self.room["players"])},
+                ensure_ascii=False, separators=(",", ":"),
+            ).encode()
+        return self._body
+
+    @property
+    def etag(self) -> str:
+        if self._etag is None:
+            self._etag = etag_for(self.body)
+        return self._etag
+
+
+class RoomViewCache:
+    """Представления комнат процесса: room_code -> RoomView последней запрошенной ревизии"""
+
+    def __init__(self):
+        self._views: Dict[str, RoomView] = {}
+
+    def __len__(self) -> int:
+        return len(self._views)
+
+    def get(self, room: GameRoom) -> RoomView:
+        view = self._views.get(room.code)
+        if view is not None and view.revision == room.revision:
+            _hits.inc()
+            return view
+        _misses.inc()
+        view = self._views[room.code] = RoomView(room.revision, room.to_dict())
+        return view
+
+    def discard(self, room_code: str):
+        self._views.pop(room_code, None)
@@ -0,0 +1,200 @@
+"""Правила игры: стоимости, эффекты, доход и коэффициенты боя из rules.json
+
+Файл правил читается и проверяется один раз при импорте и превращается
+в неизменяемую таблицу Rules: векторы-кортежи по индексам RESOURCES, UNITS
+и BUILDINGS из models, поэтому обработчики ничего не собирают на каждое
+действие. Имена ресурсов, юнитов и зданий задает models; файл меняет только
+числа и набор технологий.
+
+Комната закрепляет версию правил при создании (GameRoom.rules_version).
+reload_rules перечитывает файл и атомарно подменяет текущую таблицу — ее
+получают только новые комнаты, начатые партии доигрываются по своей версии.
+Загруженные версии хранятся в памяти процесса; после перезапуска комнаты
+с неизвестной версией продолжают по текущей.
+"""
+import json
+import os
+from types import MappingProxyType
+from typing import Dict, Mapping, NamedTuple, Optional, Tuple
+
+from models import BUILDINGS, RESOURCES, UNITS
+
+RULES_PATH = os.getenv("RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json"))
+
+Vector = Tuple[int, ...]
+
+
+class RulesError(ValueError):
+    """Файл правил не прошел проверку"""
+
+
+class Rules(NamedTuple):
+    """Таблицы правил одной версии"""
+    version: int
+    base_income: Vector
+    building_costs: Tuple[Vector, ...]
+    # Мгновенная прибавка к ресурсам при постройке (None — нет эффекта)
+    building_effects: Tuple[Optional[Vector], ...]
+    # Доход за ход с одного здания: только здания, которые его дают
+    building_income: Tuple[Tuple[int, Vector], ...]
+    unit_costs: Tuple[Vector, ...]
+    unit_power: Tuple[float, ...]
+    tech_costs: Mapping[str, Vector]
+    tech_income: Mapping[str, Vector]
+    wall_bonus: float
+    roll_min: int
+    roll_max: int
+    # Коэффициенты по исходу боя, индекс — attacker_wins (False, True)
+    damage_factor: Tuple[float, float]
+    attrition: Tuple[Tuple[float, int], Tuple[float, int]]
+    loot_share: float
+
+
+def _number(value, where: str, kind=(int, float)):
+    if isinstance(value, bool) or not isinstance(value, kind) or value < 0:
+        raise RulesError(f"{where}: expected a non-negative number, got {value!r}")
+    return value
+
+def _section(data: dict, key: str, where: str = "rules") -> dict:
+    value = data.get(key)
+    if not isinstance(value, dict):
+        raise RulesError(f"{where}.{key}: expected an object")
+    return value
+
+def _vector(data: Optional[dict], where: str) -> Vector:
+    """{"gold": 100, ...} -> (100, 0, 0, 0); неуказанные ресурсы — 0"""
+    if data is None:
+        return (0,) * len(RESOURCES)
+    if not isinstance(data, dict):
+        raise RulesError(f"{where}: expected an object")
+    unknown = set(data) - set(RESOURCES)
+    if unknown:
+        raise RulesError(f"{where}: unknown resources {sorted(unknown)}")
+    return tuple(_number(data.get(name, 0), f"{where}.{name}", int) for name in RESOURCES)
+
+def _entries(data: dict, key: str, names: Tuple[str, ...]) -> Tuple[dict, ...]:
+    """Записи раздела в порядке индексов models; набор имен должен совпадать"""
+    section = _section(data, key)
+    if set(section) != set(names):
+        raise RulesError(f"rules.{key}: expected exactly {list(names)}, got {sorted(section)}")
+    return tuple(_section(section, name, f"rules.{key}") for name in names)
+
+def _by_outcome(section: dict, where: str) -> tuple:
+    """(defender_wins, attacker_wins) — кортеж индексируется attacker_wins"""
+    try:
+        return section["defender_wins"], section["attacker_wins"]
+    except KeyError as e:
+        raise RulesError(f"{where}.{e.args[0]}: missing") from None
+
+def parse_rules(data: dict) -> Rules:
+    """Проверяет разобранный JSON правил и строит неизменяемую таблицу"""
+    if not isinstance(data, dict):
+        raise RulesError("rules: expected an object")
+    version = data.get("version")
+    if isinstance(version, bool) or not isinstance(version, int) or version < 1:
+        raise RulesError(f"rules.version: expected a positive integer, got {version!r}")
+
+    buildings = _entries(data, "buildings", BUILDINGS)
+    units = _entries(data, "units", UNITS)
+    tech_section = _section(data, "technologies")
+    technologies = {name: _section(tech_section, name, "rules.technologies") for name in tech_section}
+    combat = _section(data, "combat")
+
+    building_effects = tuple(
+        _vector(entry["effect"], f"rules.buildings.{name}.effect") if entry.get("effect") else None
+        for name, entry in zip(BUILDINGS, buildings)
+    )
+    building_income = tuple(
+        (index, _vector(entry["income"], f"rules.buildings.{name}.income"))
+        for index, (name, entry) in enumerate(zip(BUILDINGS, buildings)) if entry.get("income")
+    )
+    roll_min = _number(combat.get("roll_min"), "rules.combat.roll_min", int)
+    roll_max = _number(combat.get("roll_max"), "rules.combat.roll_max", int)
+    if roll_min < 1 or roll_max < roll_min:
+        raise RulesError("rules.combat: expected 1 <= roll_min <= roll_max")
+    attrition = []
+    for where, entry in zip(("defender_wins", "attacker_wins"),
+                            _by_outcome(_section(combat, "attrition", "rules.combat"), "rules.combat.attrition")):
+        share = _number(entry.get("share"), f"rules.combat.attrition.{where}.share")
+        divisor = _number(entry.get("divisor"), f"rules.combat.attrition.{where}.divisor", int)
+        if divisor < 1:
+            raise RulesError(f"rules.combat.attrition.{where}.divisor: expected >= 1")
+        attrition.append((share, divisor))
+
+    return Rules(
+        version=version,
+        base_income=_vector(_section(data, "base_income"), "rules.base_income"),
+        building_costs=tuple(
+            _vector(entry.get("cost"), f"rules.buildings.{name}.cost") for name, entry in zip(BUILDINGS, buildings)
+        ),
+        building_effects=building_effects,
+        building_income=building_income,
+        unit_costs=tuple(_vector(entry.get("cost"), f"rules.units.{name}.cost") for name, entry in zip(UNITS, units)),
+        unit_power=tuple(_number(entry.get("power"), f"rules.units.{name}.power") for name, entry in zip(UNITS, units)),
+        tech_costs=MappingProxyType({
+            name: _vector(entry.get("cost"), f"rules.technologies.{name}.cost") for name, entry in technologies.items()
+        }),
+        tech_income=MappingProxyType({
+            name: _vector(entry["income"], f"rules.technologies.{name}.income")
+            for name, entry in technologies.items() if entry.get("income")
+        }),
+        wall_bonus=_number(combat.get("wall_bonus"), "rules.combat.wall_bonus"),
+        roll_min=roll_min,
+        roll_max=roll_max,
+        damage_factor=tuple(
+            _number(value, "rules.combat.damage_factor")
+            for value in _by_outcome(_section(combat, "damage_factor", "rules.combat"), "rules.combat.damage_factor")
+        ),
+        attrition=tuple(attrition),
+        loot_share=_number(combat.get("loot_share"), "rules.combat.loot_share"),
+    )
+
+def load_rules(path: str = RULES_PATH) -> Rules:
+    """Читает и проверяет файл правил"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise RulesError(f"cannot read {path}: {e}") from e
+    return parse_rules(data)
+
+
+# Загруженные версии: комнаты обращаются к правилам по закрепленной версии
+_versions: Dict[int, Rules] = {}
+_current = load_rules()
+_versions[_current.version] = _current
+
+def current_rules() -> Rules:
+    """Правила для новых комнат"""
+    return _current
+
+def rules_for_version(version: Optional[int]) -> Rules:
+    """Правила закрепленной версии; неизвестная версия — текущие правила"""
+    return _versions.get(version, _current)
+
+def rules_for(room) -> Rules:
+    """Правила, по которым идет партия в комнате"""
+    return _versions.get(room.rules_version, _current)
+
+def loaded_versions() -> list:
+    return sorted(_versions)
+
+def reload_rules(path: str = RULES_PATH) -> Tuple[Rules, bool]:
+    """Перечитывает файл и делает его правила текущими для новых комнат
+
+    Возвращает (правила, изменились ли они). Те же числа под новой версией
+    допустимы; другие числа под уже загруженной версией — ошибка, иначе
+    начатые партии молча сменили бы правила.
+    """
+    global _current
+    rules = load_rules(path)
+    loaded = _versions.get(rules.version)
+    if loaded is not None:
+        if loaded != rules:
+            raise RulesError(f"rules.version {rules.version} is already loaded with different values; bump the version")
+        changed = loaded is not _current
+        _current = loaded
+        return loaded, changed
+    _versions[rules.version] = rules
+    _current = rules
+    return rules, True
@@ -0,0 +1,81 @@
+"""Запуск нескольких воркеров uvicorn с шардированием комнат
+
+    python sharded.py --workers 4 --base-port 8001 --public-host 127.0.0.1
+
+Каждый воркер слушает свой порт (base-port + номер) и получает SHARD_INDEX,
+SHARD_COUNT и SHARD_URLS через переменные окружения. Журнал действий
+и база комнат у каждого воркера свои: ACTION_LOG_DIR получает подкаталог
+shard-{номер}, ROOM_STORE_PATH — суффикс .shard-{номер} перед расширением.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List
+
+
+def shard_env(index: int, workers: int, urls: List[str]) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "SHARD_INDEX": str(index),
+        "SHARD_COUNT": str(workers),
+        "SHARD_URLS": ",".join(urls),
+    })
+    # Воркеры не пишут в одни и те же файлы журнала и базы
+    if env.get("ACTION_LOG_DIR"):
+        env["ACTION_LOG_DIR"] = os.path.join(env["ACTION_LOG_DIR"], f"shard-{index}")
+    if env.get("ROOM_STORE_PATH"):
+        root, ext = os.path.splitext(env["ROOM_STORE_PATH"])
+        env["ROOM_STORE_PATH"] = f"{root}.shard-{index}{ext}"
+    return env
+
+
+def start_workers(workers: int, base_port: int, public_host: str,
+                  log_level: str = "warning") -> List[subprocess.Popen]:
+    """Запускает воркеры и возвращает их процессы"""
+    urls = [f"http://{public_host}:{base_port + i}" for i in range(workers)]
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    processes = []
+    for index in range(workers):
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app",
+             "--host", "0.0.0.0", "--port", str(base_port + index), "--log-level", log_level],
+            cwd=backend_dir,
+            env=shard_env(index, workers, urls),
+        ))
+    return processes
+
+
+def stop_workers(processes: List[subprocess.Popen]):
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Шардированный запуск сервера")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--base-port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--public-host", default="127.0.0.1", help="хост в адресах редиректов")
+    args = parser.parse_args()
+
+    processes = start_workers(args.workers, args.base_port, args.public_host, "info")
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while all(process.poll() is None for process in processes):
+            time.sleep(1)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        stop_workers(processes)
+
+
+if __name__ == "__main__":
+    main()
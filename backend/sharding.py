@@ -0,0 +1,118 @@
+"""Шардирование комнат между несколькими процессами uvicorn
+
+Код комнаты однозначно отображается на воркер (crc32(code) % SHARD_COUNT).
+Каждый воркер создает только "свои" коды, а запросы к чужим комнатам
+перенаправляет владельцу: HTTP — редиректом 307, WebSocket — закрытием
+с кодом SHARD_REDIRECT_CLOSE_CODE и адресом владельца в reason.
+
+Все соединения комнаты живут на ее воркере, поэтому рассылки между
+воркерами не нужны. Запросы без кода комнаты (/api/rooms, /api/health)
+обслуживает воркер, на который они пришли, и отвечает только о своих комнатах.
+
+Переменные окружения:
+    SHARD_COUNT       — число воркеров (1 — шардирование выключено)
+    SHARD_INDEX       — номер текущего воркера
+    SHARD_URLS        — базовые HTTP-адреса воркеров через запятую
+"""
+import os
+import zlib
+from typing import Callable, List, Optional
+from urllib.parse import parse_qsl
+
+# Код закрытия WebSocket: комната живет на другом воркере, адрес — в reason
+SHARD_REDIRECT_CLOSE_CODE = 4307
+
+
+class ShardMap:
+    """Отображение кодов комнат на воркеры"""
+
+    def __init__(self, index: int = 0, count: int = 1, urls: Optional[List[str]] = None):
+        self.index = index
+        self.count = count
+        self.urls = urls or []
+
+    @property
+    def enabled(self) -> bool:
+        return self.count > 1
+
+    def shard_for(self, room_code: str) -> int:
+        return zlib.crc32(room_code.upper().encode()) % self.count
+
+    def is_local(self, room_code: str) -> bool:
+        return not self.enabled or self.shard_for(room_code) == self.index
+
+    def owner_url(self, room_code: str) -> str:
+        return self.urls[self.shard_for(room_code)]
+
+    def owner_ws_url(self, room_code: str) -> str:
+        url = self.owner_url(room_code)
+        return "ws" + url[len("http"):] if url.startswith("http") else url
+
+    def generate_local_code(self, generate: Callable[[], str]) -> str:
+        """Генерирует код комнаты, принадлежащий текущему воркеру (в среднем SHARD_COUNT попыток)"""
+        while True:
+            code = generate()
+            if self.is_local(code):
+                return code
+
+
+# Очередь подбора живет на воркере, которому принадлежит этот ключ
+MATCHMAKING_KEY = "matchmaking"
+
+
+def room_code_from_scope(scope: dict) -> Optional[str]:
+    """Достает код комнаты из пути или query-параметра запроса"""
+    parts = scope["path"].strip("/").split("/")
+    if len(parts) >= 2 and parts[0] in ("api", "ws") and parts[1] == MATCHMAKING_KEY:
+        return MATCHMAKING_KEY
+    if len(parts) >= 3 and parts[0] == "api" and parts[1] in ("room", "replays"):
+        return parts[2]
+    if len(parts) >= 3 and parts[0] == "ws" and parts[1] != "test":
+        return parts[1]
+    query = dict(parse_qsl(scope.get("query_string", b"").decode()))
+    return query.get("room_code")
+
+
+class ShardRouterMiddleware:
+    """ASGI-middleware, перенаправляющее запросы к чужим комнатам на воркер-владелец"""
+
+    def __init__(self, app, shard_map: ShardMap):
+        self.app = app
+        self.shard_map = shard_map
+
+    async def __call__(self, scope, receive, send):
+        if not self.shard_map.enabled or scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        room_code = room_code_from_scope(scope)
+        if room_code is None or self.shard_map.is_local(room_code):
+            await self.app(scope, receive, send)
+            return
+
+        query = scope.get("query_string", b"").decode()
+        if scope["type"] == "http":
+            location = self.shard_map.owner_url(room_code) + scope["path"] + ("?" + query if query else "")
+            await send({
+                "type": "http.response.start",
+                "status": 307,
+                "headers": [(b"location", location.encode()), (b"content-length", b"0")],
+            })
+            await send({"type": "http.response.body", "body": b""})
+        else:
+            # Клиент переподключается к адресу из reason
+            await receive()
+            await send({"type": "websocket.accept"})
+            await send({
+                "type": "websocket.close",
+                "code": SHARD_REDIRECT_CLOSE_CODE,
+                "reason": self.shard_map.owner_ws_url(room_code),
+            })
+
+
+def create_shard_map() -> ShardMap:
+    count = int(os.getenv("SHARD_COUNT", "1"))
+    urls = [url.strip().rstrip("/") for url in os.getenv("SHARD_URLS", "").split(",") if url.strip()]
+    if count > 1 and len(urls) != count:
+        raise RuntimeError("SHARD_URLS must list one base URL per shard")
+    return ShardMap(index=int(os.getenv("SHARD_INDEX", "0")), count=count, urls=urls)
+
@@ -0,0 +1,174 @@
+"""Зрители: отдельный уровень рассылки только для чтения
+
+Игровая логика про зрителей почти ничего не знает: рассылка комнаты лишь
+помечает ее измененной (SpectatorHub.mark — поиск в словаре), сколько бы
+зрителей у нее ни было. Отдельная задача раз в SPECTATOR_INTERVAL_MS
+снимает полный снимок каждой измененной комнаты со зрителями (один на
+комнату, сериализуется один раз на кодировку) и кладет его в буфер
+задержки. Снимок уходит зрителям через SPECTATOR_DELAY_MS, чтобы
+трансляцию нельзя было использовать для подсказок игрокам. Из нескольких
+созревших снимков отправляется только последний, а у медленного зрителя
+неотправленный снимок заменяется свежим (coalesce_key).
+
+Рассылка идет порциями по SPECTATOR_FANOUT_CHUNK соединений с уступкой
+циклу событий между порциями, так что тысячи зрителей не задерживают
+обработку сообщений игроков. Число зрителей процесса ограничено
+SPECTATOR_MAX_CONNECTIONS.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from connection import Connection
+from metrics import spectator_rejections, spectator_snapshot_seconds
+from protocol import EncodedMessage
+
+SPECTATOR_INTERVAL = float(os.getenv("SPECTATOR_INTERVAL_MS", "1000")) / 1000
+SPECTATOR_DELAY = float(os.getenv("SPECTATOR_DELAY_MS", "5000")) / 1000
+SPECTATOR_MAX_CONNECTIONS = int(os.getenv("SPECTATOR_MAX_CONNECTIONS", "10000"))
+SPECTATOR_FANOUT_CHUNK = int(os.getenv("SPECTATOR_FANOUT_CHUNK", "500"))
+
+
+class SpectatorCapacityError(Exception):
+    """Достигнут предел числа зрителей процесса"""
+
+
+class SpectatorRoom:
+    """Зрители одной комнаты и ее снимки, ожидающие отправки"""
+
+    __slots__ = ("connections", "dirty", "pending", "latest")
+
+    def __init__(self):
+        # Упорядоченное множество: отключение зрителя — O(1)
+        self.connections: Dict[Connection, None] = {}
+        # Комната изменилась с прошлого снимка
+        self.dirty = True
+        # (момент отправки, снимок) в порядке снятия
+        self.pending: Deque[Tuple[float, EncodedMessage]] = deque()
+        # Последний отправленный снимок — его сразу получает новый зритель
+        self.latest: Optional[EncodedMessage] = None
+
+
+class SpectatorHub:
+    """Зрители всех комнат процесса и задача, рассылающая им снимки"""
+
+    def __init__(
+        self,
+        snapshot: Callable[[str], Optional[dict]],
+        interval: float = SPECTATOR_INTERVAL,
+        delay: float = SPECTATOR_DELAY,
+        max_connections: int = SPECTATOR_MAX_CONNECTIONS,
+        chunk: int = SPECTATOR_FANOUT_CHUNK,
+    ):
+        # snapshot(room_code) -> словарь комнаты или None, если комнаты больше нет
+        self.snapshot = snapshot
+        self.interval = interval
+        self.delay = delay
+        self.max_connections = max_connections
+        self.chunk = chunk
+        self._rooms: Dict[str, SpectatorRoom] = {}
+        self._count = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def rooms(self) -> int:
+        return len(self._rooms)
+
+    def add(self, room_code: str, connection: Connection):
+        """Подписывает зрителя на комнату"""
+        if self._count >= self.max_connections:
+            spectator_rejections.inc()
+            raise SpectatorCapacityError(room_code)
+        room = self._rooms.get(room_code)
+        if room is None:
+            room = self._rooms[room_code] = SpectatorRoom()
+        room.connections[connection] = None
+        self._count += 1
+        if room.latest is not None:
+            connection.send_encoded(room.latest, coalesce_key="spectator_state")
+
+    def remove(self, room_code: str, connection: Connection):
+        room = self._rooms.get(room_code)
+        if room is None or room.connections.pop(connection, False) is False:
+            return
+        self._count -= 1
+        if not room.connections:
+            del self._rooms[room_code]
+
+    def mark(self, room_code: str):
+        """Отмечает изменение комнаты (вызывается из рассылки игрокам)"""
+        room = self._rooms.get(room_code)
+        if room is not None:
+            room.dirty = True
+
+    def close_room(self, room_code: str, reason: str):
+        """Отключает всех зрителей комнаты"""
+        room = self._rooms.pop(room_code, None)
+        if room is None:
+            return
+        self._count -= len(room.connections)
+        for connection in room.connections:
+            connection.evict(reason, code=1001)
+
+    def _capture(self, now: float):
+        """Снимает снимки измененных комнат в буфер задержки"""
+        for room_code, room in list(self._rooms.items()):
+            if not room.dirty:
+                continue
+            room.dirty = False
+            started = time.perf_counter()
+            data = self.snapshot(room_code)
+            if data is None:
+                self.close_room(room_code, "Room closed")
+                continue
+            room.pending.append((now + self.delay, EncodedMessage({
+                "type": "spectator_state",
+                "delay_ms": round(self.delay * 1000),
+                "room": data,
+            })))
+            spectator_snapshot_seconds.observe(time.perf_counter() - started)
+
+    async def _release(self, now: float):
+        """Рассылает созревшие снимки зрителям порциями"""
+        sent = 0
+        for room_code, room in list(self._rooms.items()):
+            message = None
+            while room.pending and room.pending[0][0] <= now:
+                message = room.pending.popleft()[1]
+            if message is None:
+                continue
+            room.latest = message
+            for connection in list(room.connections):
+                if not connection.send_encoded(message, coalesce_key="spectator_state"):
+                    self.remove(room_code, connection)
+                sent += 1
+                if sent % self.chunk == 0:
+                    await asyncio.sleep(0)
+
+    async def tick(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        self._capture(now)
+        await self._release(now)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.tick()
+            except Exception as e:
+                print(f"Spectator fan-out error: {e!r}")
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,318 @@
+"""Хранилища игровых комнат
+
+InMemoryRoomStore — прежнее поведение: комнаты живут только в памяти процесса.
+SQLiteRoomStore — комнаты дополнительно сохраняются в SQLite с отложенной
+записью: измененные комнаты копятся в наборе "грязных" и сбрасываются на диск
+одной транзакцией раз в ROOM_STORE_FLUSH_MS миллисекунд или после
+ROOM_STORE_FLUSH_EVERY изменений. Чтения на горячем пути всегда идут из памяти;
+комнаты с диска подгружаются лениво при первом обращении.
+
+Точки входа (HTTP-запросы, подключения) подгружают комнату через await load():
+чтение SQLite идет в потоке хранилища. Обращение по ключу к выгруженной
+комнате (room_code in store / store[room_code]) читает SQLite синхронно,
+прямо в цикле событий, — это запасной путь для комнаты, выгруженной между
+проверкой и обработкой.
+"""
+import abc
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from broadcast import encode_message
+from models import GameRoom
+
+
+class RoomStore(abc.ABC):
+    """Интерфейс хранилища комнат (словарь room_code -> GameRoom)"""
+
+    @abc.abstractmethod
+    def __contains__(self, room_code: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def __getitem__(self, room_code: str) -> GameRoom:
+        ...
+
+    @abc.abstractmethod
+    def __setitem__(self, room_code: str, room: GameRoom):
+        ...
+
+    @abc.abstractmethod
+    def __delitem__(self, room_code: str):
+        ...
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Число комнат в памяти"""
+
+    def get(self, room_code: str, default: Optional[GameRoom] = None) -> Optional[GameRoom]:
+        return self[room_code] if room_code in self else default
+
+    async def load(self, room_code: str) -> Optional[GameRoom]:
+        """Комната, при необходимости подгруженная без блокировки цикла событий; None, если ее нет"""
+        return self.get(room_code)
+
+    def in_memory(self, room_code: str) -> Optional[GameRoom]:
+        """Комната, если она сейчас в памяти; с диска не подгружается"""
+        return self.get(room_code)
+
+    @abc.abstractmethod
+    def loaded_rooms(self) -> Iterator[GameRoom]:
+        """Комнаты, уже находящиеся в памяти"""
+
+    def mark_dirty(self, room_code: str):
+        """Отмечает, что состояние комнаты изменилось и его нужно сохранить"""
+
+    def evict(self, room_code: str):
+        """Выгружает комнату из памяти; без постоянного хранилища она удаляется
+
+        Уже выгруженная или удаленная комната пропускается.
+        """
+        if room_code in self:
+            del self[room_code]
+
+    async def start(self):
+        """Вызывается при старте приложения"""
+
+    async def stop(self):
+        """Вызывается при остановке приложения"""
+
+
+class InMemoryRoomStore(RoomStore):
+    """Комнаты только в памяти процесса"""
+
+    def __init__(self):
+        self._rooms: Dict[str, GameRoom] = {}
+
+    def __contains__(self, room_code: str) -> bool:
+        return room_code in self._rooms
+
+    def __getitem__(self, room_code: str) -> GameRoom:
+        return self._rooms[room_code]
+
+    def __setitem__(self, room_code: str, room: GameRoom):
+        self._rooms[room_code] = room
+
+    def __delitem__(self, room_code: str):
+        del self._rooms[room_code]
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def in_memory(self, room_code: str) -> Optional[GameRoom]:
+        return self._rooms.get(room_code)
+
+    def loaded_rooms(self) -> Iterator[GameRoom]:
+        return iter(list(self._rooms.values()))
+
+
+class SQLiteRoomStore(InMemoryRoomStore):
+    """Комнаты в памяти с отложенной записью снимков в SQLite"""
+
+    def __init__(self, path: str, flush_interval_ms: int = 500, flush_every: int = 100,
+                 on_load: Optional[Callable[[GameRoom], None]] = None):
+        super().__init__()
+        self.path = path
+        # Вызывается для каждой комнаты, подгруженной с диска
+        self.on_load = on_load
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_every = flush_every
+        # Коды всех комнат, известных хранилищу (в памяти и на диске)
+        self._known: Set[str] = set()
+        self._dirty: Set[str] = set()
+        self._deleted: Set[str] = set()
+        # Снимки выгруженных из памяти комнат, еще не записанные на диск
+        self._evicted_rows: Dict[str, Tuple[str, str, str, float]] = {}
+        # Те же снимки, пока их пишет поток хранилища
+        self._writing_rows: Dict[str, Tuple[str, str, str, float]] = {}
+        self._mutations = 0
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        # Все записи идут через один поток, чтобы не блокировать цикл событий
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="room-store")
+        self._write_conn: Optional[sqlite3.Connection] = None
+        self._read_conn: Optional[sqlite3.Connection] = None
+
+    def __contains__(self, room_code: str) -> bool:
+        return room_code in self._known
+
+    def __getitem__(self, room_code: str) -> GameRoom:
+        room = self._rooms.get(room_code)
+        if room is None:
+            if room_code not in self._known:
+                raise KeyError(room_code)
+            room = self._loaded(room_code, self._read_data(room_code))
+        return room
+
+    def __setitem__(self, room_code: str, room: GameRoom):
+        self._rooms[room_code] = room
+        self._known.add(room_code)
+        self._deleted.discard(room_code)
+        self.mark_dirty(room_code)
+
+    def __delitem__(self, room_code: str):
+        if room_code not in self._known:
+            raise KeyError(room_code)
+        self._rooms.pop(room_code, None)
+        self._known.discard(room_code)
+        self._dirty.discard(room_code)
+        self._evicted_rows.pop(room_code, None)
+        self._deleted.add(room_code)
+        self._request_flush()
+
+    def __len__(self) -> int:
+        # Комнаты на диске не в счет: это число активных комнат процесса
+        return len(self._rooms)
+
+    async def load(self, room_code: str) -> Optional[GameRoom]:
+        room = self._rooms.get(room_code)
+        if room is not None or room_code not in self._known:
+            return room
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(self._executor, self._read_data, room_code)
+        # Пока шло чтение, комнату могли подгрузить или удалить
+        if room_code not in self._known:
+            return None
+        room = self._rooms.get(room_code)
+        if room is None:
+            try:
+                room = self._loaded(room_code, data)
+            except KeyError:
+                return None
+        return room
+
+    def evict(self, room_code: str):
+        """Выгружает комнату из памяти, оставляя ее на диске для ленивой подгрузки"""
+        room = self._rooms.pop(room_code, None)
+        if room is not None and room_code in self._dirty:
+            self._dirty.discard(room_code)
+            self._evicted_rows[room_code] = (room_code, room.game_state, encode_message(room.to_dict()), time.time())
+            self._request_flush()
+
+    def mark_dirty(self, room_code: str):
+        self._dirty.add(room_code)
+        self._mutations += 1
+        if self._mutations >= self.flush_every:
+            self._request_flush()
+
+    def _request_flush(self):
+        if self._flush_requested is not None:
+            self._flush_requested.set()
+
+    def _read_data(self, room_code: str) -> Optional[str]:
+        """Снимок одной комнаты с диска (одна строка по первичному ключу)"""
+        evicted = self._evicted_rows.get(room_code) or self._writing_rows.get(room_code)
+        if evicted is not None:
+            # Снимок выгруженной комнаты еще не записан — на диске он устарел
+            return evicted[2]
+        row = self._read_conn.execute(
+            "SELECT data FROM rooms WHERE code = ?", (room_code,)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def _loaded(self, room_code: str, data: Optional[str]) -> GameRoom:
+        """Кладет подгруженную комнату в память"""
+        if data is None:
+            self._known.discard(room_code)
+            raise KeyError(room_code)
+        room = self._rooms[room_code] = GameRoom.from_dict(json.loads(data))
+        if self.on_load is not None:
+            self.on_load(room)
+        return room
+
+    def _open(self) -> List[str]:
+        """Открывает базу и читает индекс кодов комнат (выполняется в потоке хранилища)"""
+        self._write_conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._write_conn.execute("PRAGMA journal_mode=WAL")
+        self._write_conn.execute("PRAGMA synchronous=NORMAL")
+        self._write_conn.execute(
+            "CREATE TABLE IF NOT EXISTS rooms ("
+            "code TEXT PRIMARY KEY, game_state TEXT NOT NULL, "
+            "data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._write_conn.commit()
+        self._read_conn = sqlite3.connect(self.path, check_same_thread=False)
+        return [row[0] for row in self._write_conn.execute("SELECT code FROM rooms")]
+
+    def _write_batch(self, rows: List[Tuple[str, str, str, float]], deleted: List[str]):
+        """Записывает пачку снимков одной транзакцией (выполняется в потоке хранилища)"""
+        with self._write_conn:
+            if rows:
+                self._write_conn.executemany(
+                    "INSERT OR REPLACE INTO rooms (code, game_state, data, updated_at) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+            if deleted:
+                self._write_conn.executemany(
+                    "DELETE FROM rooms WHERE code = ?", [(code,) for code in deleted]
+                )
+
+    async def flush(self):
+        """Сбрасывает все грязные комнаты на диск одной транзакцией"""
+        if not self._dirty and not self._deleted and not self._evicted_rows:
+            return
+        dirty, self._dirty = self._dirty, set()
+        evicted_rows, self._evicted_rows = self._evicted_rows, {}
+        deleted, self._deleted = list(self._deleted), set()
+        self._mutations = 0
+        # Сериализуем в цикле событий, чтобы снимок был согласованным
+        now = time.time()
+        rows = list(evicted_rows.values())
+        for room_code in dirty:
+            room = self._rooms.get(room_code)
+            if room is not None:
+                rows.append((room_code, room.game_state, encode_message(room.to_dict()), now))
+        loop = asyncio.get_running_loop()
+        self._writing_rows = evicted_rows
+        try:
+            await loop.run_in_executor(self._executor, self._write_batch, rows, deleted)
+        finally:
+            self._writing_rows = {}
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Room store flush error: {e}")
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        codes = await loop.run_in_executor(self._executor, self._open)
+        self._known.update(codes)
+        self._flush_requested = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        self._executor.shutdown(wait=True)
+
+
+def create_room_store(on_load: Optional[Callable[[GameRoom], None]] = None) -> RoomStore:
+    """Создает хранилище по переменной окружения ROOM_STORE ("memory" или "sqlite")"""
+    kind = os.getenv("ROOM_STORE", "memory").lower()
+    if kind == "sqlite":
+        return SQLiteRoomStore(
+            os.getenv("ROOM_STORE_PATH", "rooms.db"),
+            flush_interval_ms=int(os.getenv("ROOM_STORE_FLUSH_MS", "500")),
+            flush_every=int(os.getenv("ROOM_STORE_FLUSH_EVERY", "100")),
+            on_load=on_load,
+        )
+    return InMemoryRoomStore()
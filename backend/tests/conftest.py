@@ -0,0 +1,40 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# Переменные окружения, которые main читает при импорте
+APP_ENV = ("ACTION_LOG_DIR", "ACTION_LOG_SNAPSHOT_EVERY", "REPLAY_DIR", "ROOM_STORE", "ROOM_STORE_PATH",
+           "SHARD_COUNT", "SHARD_INDEX", "SHARD_URLS")
+
+
+@pytest.fixture
+def load_app(monkeypatch):
+    """Заново импортирует main с заданным окружением, как при перезапуске сервера"""
+    import bots
+    for name in APP_ENV:
+        monkeypatch.delenv(name, raising=False)
+    # Боты не подменяют отключившихся игроков: комнату меняют только действия теста
+    monkeypatch.setattr(bots, "BOT_TAKEOVER", False)
+
+    def load(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        import main
+        return importlib.reload(main)
+
+    return load
+
+
+def receive_until(ws, until: str) -> list:
+    """Сообщения сокета (с раскрытыми batch) до первого сообщения типа until"""
+    messages = []
+    while True:
+        message = ws.receive_json()
+        batch = message["messages"] if message.get("type") == "batch" else [message]
+        messages.extend(batch)
+        if any(m["type"] == until for m in batch):
+            return messages
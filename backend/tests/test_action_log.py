@@ -0,0 +1,74 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import receive_until
+
+
+def room_states(main) -> dict:
+    # Ревизия после восстановления начинается заново, поэтому не сравнивается
+    return {room.code: {k: v for k, v in room.to_dict().items() if k != "revision"}
+            for room in main.game_rooms.loaded_rooms()}
+
+
+def play_game(client: TestClient) -> str:
+    created = client.post("/api/create-room", params={"player_name": "A"}).json()
+    code, a = created["room_code"], created["player_id"]
+    b = client.post("/api/join-room", params={"room_code": code, "player_name": "B"}).json()["player_id"]
+    with client.websocket_connect(f"/ws/{code}/{a}") as wa, client.websocket_connect(f"/ws/{code}/{b}") as wb:
+        receive_until(wa, "room_state")
+        receive_until(wb, "room_state")
+        wa.send_json({"type": "player_ready", "ready": True})
+        wb.send_json({"type": "player_ready", "ready": True})
+        receive_until(wa, "game_start")
+        actions = [
+            ({"type": "build", "building_type": "farm"}, "action_result"),
+            ({"type": "attack", "target_player_id": b}, "battle_result"),
+            ({"type": "research", "tech_type": "trade_routes"}, "action_result"),
+            ({"type": "trade", "target_player_id": b, "trade_offer": {"gold": 10},
+              "trade_request": {"wood": 5}}, "trade_completed"),
+        ]
+        for action, reply in actions:
+            wa.send_json({"type": "game_action", "action": action})
+            receive_until(wa, reply)
+            receive_until(wb, reply)
+        wa.send_json({"type": "end_turn"})
+        receive_until(wa, "turn_ended")
+        receive_until(wb, "turn_ended")
+        wb.send_json({"type": "game_action", "action": {"type": "build", "building_type": "farm"}})
+        receive_until(wa, "action_result")
+        receive_until(wb, "action_result")
+    return code
+
+
+# Снимок на каждом шаге от 1 до 6 действий попадает в разные места партии,
+# в том числе сразу после действий, которые журналируются до конца обработчика
+@pytest.mark.parametrize("snapshot_every", range(1, 7))
+def test_restart_restores_room(load_app, tmp_path, snapshot_every):
+    env = {"ACTION_LOG_DIR": tmp_path, "ACTION_LOG_SNAPSHOT_EVERY": snapshot_every}
+    main = load_app(**env)
+    with TestClient(main.app) as client:
+        code = play_game(client)
+        before = room_states(main)
+    assert before[code]["game_state"] == "playing"
+
+    main = load_app(**env)
+    with TestClient(main.app):
+        assert room_states(main) == before
+
+
+def test_room_reloaded_from_store_is_snapshotted(load_app, tmp_path):
+    env = {"ACTION_LOG_DIR": tmp_path / "log", "ROOM_STORE": "sqlite", "ROOM_STORE_PATH": tmp_path / "rooms.db"}
+    main = load_app(**env)
+    with TestClient(main.app) as client:
+        created = client.post("/api/create-room", params={"player_name": "A"}).json()
+        code = created["room_code"]
+        # Выселение удаляет журнал комнаты; подгрузка из хранилища начинает новый со снимка
+        main.evict_room(code, "idle")
+        assert client.get(f"/api/room/{code}").status_code == 200
+        client.post("/api/join-room", params={"room_code": code, "player_name": "B"})
+        before = room_states(main)
+
+    # Без хранилища комната восстанавливается только из журнала
+    main = load_app(ACTION_LOG_DIR=env["ACTION_LOG_DIR"], ROOM_STORE="memory")
+    with TestClient(main.app):
+        assert room_states(main) == before
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from actors import RoomActors, RoomBusyError, RoomClosedError
+
+
+def test_commands_of_one_room_run_in_order():
+    async def scenario():
+        actors = RoomActors()
+        log = []
+
+        async def command(name):
+            log.append(f"{name} start")
+            await asyncio.sleep(0)
+            log.append(f"{name} end")
+
+        actors.tell("ROOM", command, "a")
+        await actors.ask("ROOM", command, "b")
+        return log
+
+    assert asyncio.run(scenario()) == ["a start", "a end", "b start", "b end"]
+
+
+def test_queue_is_bounded():
+    async def scenario():
+        actors = RoomActors(max_queue=1)
+        actors.tell("ROOM", lambda: None)
+        with pytest.raises(RoomBusyError):
+            actors.tell("ROOM", lambda: None)
+        # Служебные команды ставятся и в переполненную очередь
+        actors.tell("ROOM", lambda: None, bounded=False)
+        await actors.stop()
+
+    asyncio.run(scenario())
+
+
+def test_discard_fails_pending_asks():
+    async def scenario():
+        actors = RoomActors()
+        release = asyncio.Event()
+        actors.tell("ROOM", release.wait)
+        pending = asyncio.ensure_future(actors.ask("ROOM", lambda: "never"))
+        await asyncio.sleep(0)
+        actors.discard("ROOM")
+        release.set()
+        with pytest.raises(RoomClosedError):
+            await pending
+
+    asyncio.run(scenario())
+
+
+def test_new_actor_waits_for_discarded_one():
+    async def scenario():
+        actors = RoomActors()
+        release = asyncio.Event()
+        log = []
+
+        async def slow():
+            log.append("old start")
+            await release.wait()
+            log.append("old end")
+
+        actors.tell("ROOM", slow)
+        await asyncio.sleep(0)
+        actors.discard("ROOM")
+        done = asyncio.ensure_future(actors.ask("ROOM", log.append, "new"))
+        await asyncio.sleep(0.01)
+        assert log == ["old start"]
+        release.set()
+        await done
+        return log
+
+    assert asyncio.run(scenario()) == ["old start", "old end", "new"]
+
+
+def test_after_command_hook():
+    async def scenario():
+        seen = []
+        actors = RoomActors(after_command=seen.append)
+        await actors.ask("ROOM", lambda: None)
+        actors.tell("ROOM", lambda: 1 / 0)
+        await actors.ask("ROOM", lambda: None)
+        return seen
+
+    assert asyncio.run(scenario()) == ["ROOM", "ROOM", "ROOM"]
+
+
+def test_join_command_for_evicted_room_is_404(load_app):
+    from fastapi import HTTPException
+    from fastapi.testclient import TestClient
+
+    main = load_app()
+    with TestClient(main.app) as client:
+        code = client.post("/api/create-room", params={"player_name": "A"}).json()["room_code"]
+        main.evict_room(code, "idle")
+        # Команда входа, поставленная до выселения, выполняется уже без комнаты
+        with pytest.raises(HTTPException) as error:
+            main.add_player_to_room(code, "B")
+        assert error.value.status_code == 404
+        assert client.post("/api/join-room", params={"room_code": code, "player_name": "B"}).status_code == 404
+
+
+def test_disconnect_after_eviction_does_not_resurrect_room(load_app):
+    from fastapi.testclient import TestClient
+
+    from conftest import receive_until
+
+    main = load_app()
+    with TestClient(main.app) as client:
+        created = client.post("/api/create-room", params={"player_name": "A"}).json()
+        code = created["room_code"]
+        with client.websocket_connect(f"/ws/{code}/{created['player_id']}") as ws:
+            receive_until(ws, "room_state")
+
+            async def evict():
+                main.lifecycle._evict(code, "capacity")
+
+            client.portal.call(evict)
+        # detach_connection выполняет уже новый актор комнаты; дождемся его
+        client.portal.call(main.actors.ask, code, lambda: None)
+        assert code not in main.lifecycle._state
+        assert len(main.lobby) == 0
+        assert client.get("/api/rooms").json()["rooms"] == []
+        # Повторное выселение уже выселенной комнаты не падает
+        main.evict_room(code, "idle")
+        assert main.lifecycle.sweep() == 0
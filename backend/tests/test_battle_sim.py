@@ -0,0 +1,60 @@
+import pytest
+
+import battle_sim
+from battle_sim import exact_odds, predicted_odds, quantize, resolve_batch, simulate_battles
+from combat import resolve_battle
+from models import UNITS
+from rules import current_rules
+
+np = pytest.importorskip("numpy")
+
+ARMIES = [(10, 5, 3), (1, 0, 0), (0, 2, 7), (40, 0, 12), (3, 3, 3)]
+
+
+def losses(outcome: dict, side: str) -> list:
+    return [outcome[side].get(unit, 0) for unit in UNITS]
+
+
+@pytest.mark.parametrize("attacker", ARMIES)
+@pytest.mark.parametrize("defender", ARMIES)
+@pytest.mark.parametrize("walls", [0, 2])
+def test_resolve_batch_matches_resolve_battle(attacker, defender, walls):
+    rules = current_rules()
+    rolls = np.arange(rules.roll_min, rules.roll_max + 1)
+    attacker_rolls, defender_rolls = (grid.ravel() for grid in np.meshgrid(rolls, rolls))
+    wins, attacker_losses, defender_losses = resolve_batch(
+        attacker, defender, walls, attacker_rolls, defender_rolls, rules
+    )
+    for index in range(len(attacker_rolls)):
+        outcome = resolve_battle(attacker, defender, walls, int(attacker_rolls[index]),
+                                 int(defender_rolls[index]), rules)
+        assert bool(wins[index]) == outcome["attacker_wins"]
+        assert attacker_losses[index].tolist() == losses(outcome, "attacker_losses")
+        assert defender_losses[index].tolist() == losses(outcome, "defender_losses")
+
+
+def test_exact_odds_matches_pure_python(monkeypatch):
+    vectorized = exact_odds((10, 5, 3), (12, 4, 1), 1)
+    monkeypatch.setattr(battle_sim, "np", None)
+    pure = exact_odds((10, 5, 3), (12, 4, 1), 1)
+    assert pure["attacker_win_probability"] == vectorized["attacker_win_probability"]
+    for side in ("expected_attacker_losses", "expected_defender_losses"):
+        assert pure[side] == pytest.approx(vectorized[side])
+
+
+def test_simulation_converges_to_exact_odds():
+    exact = exact_odds((10, 5, 3), (10, 5, 3), 0)
+    simulated = simulate_battles((10, 5, 3), (10, 5, 3), 0, battles=200_000, seed=1)
+    assert simulated["attacker_win_probability"] == pytest.approx(exact["attacker_win_probability"], abs=0.01)
+
+
+def test_quantize():
+    assert [quantize(n) for n in (0, 7, 15)] == [0, 7, 15]
+    assert quantize(100) == 104 and quantize(1000) == 1024
+    assert all(abs(quantize(n) - n) <= n / 16 for n in range(16, 5000))
+
+
+def test_predicted_odds_is_cached_per_quantized_army():
+    rules = current_rules()
+    first = predicted_odds([101, 0, 0], [10, 0, 0], 0, rules)
+    assert predicted_odds([103, 0, 0], [10, 0, 0], 0, rules) is first
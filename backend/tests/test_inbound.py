@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from inbound import ActionCoalescer, InboundLimiter, TokenBucket, message_kind, parse_rate_limits
+
+
+def train(quantity=1, unit_type="soldiers") -> dict:
+    return {"type": "game_action", "action": {"type": "train_army", "unit_type": unit_type, "quantity": quantity}}
+
+
+def test_parse_rate_limits_overrides_defaults():
+    limits = parse_rate_limits("train_army=5:10, attack=2")
+    assert limits["train_army"] == (5.0, 10.0)
+    assert limits["attack"] == (2.0, 2.0)
+    assert limits["build"] == parse_rate_limits("")["build"]
+
+
+def test_message_kind():
+    assert message_kind(train()) == "train_army"
+    assert message_kind({"type": "end_turn"}) == "end_turn"
+    assert message_kind({"type": "game_action", "action": {"type": "teleport"}}) == "other"
+    assert message_kind({"type": "hello"}) == "other"
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=2, capacity=2)
+    now = bucket.updated
+    assert bucket.take(now) and bucket.take(now)
+    assert not bucket.take(now)
+    assert bucket.take(now + 0.5)
+    assert not bucket.take(now + 0.5)
+
+
+def test_limiter_buckets_are_per_kind():
+    limiter = InboundLimiter({"attack": (0.001, 1), "other": (0.001, 1)})
+    assert limiter.allow("attack")
+    assert not limiter.allow("attack")
+    assert limiter.allow("build")  # неизвестный тип берет бюджет other
+
+
+async def collect(coalescer: ActionCoalescer, messages):
+    for message in messages:
+        if not coalescer.merge(message):
+            coalescer.push(message)
+    coalescer.flush()
+
+
+def test_coalescer_merges_same_unit_type():
+    submitted = []
+    coalescer = ActionCoalescer(submitted.append, window=10)
+    asyncio.run(collect(coalescer, [train(1), train(2), train(3), train(1, "archers")]))
+    assert submitted == [
+        {"type": "game_action", "action": {"type": "train_army", "unit_type": "soldiers",
+                                           "merged_quantities": [1, 2, 3]}},
+        train(1, "archers"),
+    ]
+
+
+def test_coalescer_keeps_order_around_other_messages():
+    submitted = []
+    coalescer = ActionCoalescer(submitted.append, window=10)
+    asyncio.run(collect(coalescer, [train(1), {"type": "end_turn"}, train(2)]))
+    assert submitted == [train(1), {"type": "end_turn"}, train(2)]
+
+
+@pytest.mark.parametrize("max_merged", [2, 5])
+def test_coalescer_caps_merged_quantities(max_merged):
+    submitted = []
+    coalescer = ActionCoalescer(submitted.append, window=10, max_merged=max_merged)
+    asyncio.run(collect(coalescer, [train(1) for _ in range(2 * max_merged + 1)]))
+    lengths = [len(message["action"].get("merged_quantities", [1])) for message in submitted]
+    assert lengths == [max_merged, max_merged, 1]
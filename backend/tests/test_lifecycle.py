@@ -0,0 +1,45 @@
+from lifecycle import RoomLifecycleManager
+
+
+def make_manager(connected: set, max_rooms: int = 2):
+    evicted = []
+    manager = RoomLifecycleManager(
+        on_evict=lambda room_code, reason: evicted.append((room_code, reason)),
+        has_connections=lambda room_code: room_code in connected,
+        ttls={"waiting": 60, "playing": 60, "finished": 10},
+        max_rooms=max_rooms,
+    )
+    return manager, evicted
+
+
+def test_capacity_evicts_oldest_room_without_players():
+    connected = {"A"}
+    manager, evicted = make_manager(connected)
+    manager.touch("A", "playing")
+    manager.touch("B", "waiting")
+    manager.touch("C", "waiting")
+    assert evicted == [("B", "capacity")]
+    assert len(manager) == 2 and manager.evictions["capacity"] == 1
+
+
+def test_capacity_keeps_new_room_and_falls_back_to_connected():
+    connected = {"A", "B"}
+    manager, evicted = make_manager(connected)
+    manager.touch("A", "playing")
+    manager.touch("B", "playing")
+    # Комнат без игроков, кроме новой, нет: вытесняется самая старая с игроками
+    manager.touch("C", "waiting")
+    assert evicted == [("A", "capacity")]
+    assert len(manager) == 2
+
+
+def test_sweep_skips_connected_rooms():
+    connected = {"A"}
+    manager, evicted = make_manager(connected, max_rooms=10)
+    manager.touch("A", "waiting")
+    manager.touch("B", "waiting")
+    manager.touch("F", "finished")
+    evicted_count = manager.sweep(now=manager._queues["waiting"]["B"] + 61)
+    assert evicted_count == 2
+    assert sorted(evicted) == [("B", "idle"), ("F", "finished")]
+    assert len(manager) == 1
@@ -0,0 +1,109 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from lobby import LobbyIndex, format_cursor, parse_cursor
+from models import GameRoom, create_player
+
+BASE = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def make_room(index: int, players: int = 1, game_state: str = "waiting") -> GameRoom:
+    members = {f"p{index}-{n}": create_player(f"p{index}-{n}", f"Игрок {index}-{n}") for n in range(players)}
+    return GameRoom(code=f"R{index:03d}", players=members, game_state=game_state,
+                    created_at=BASE + timedelta(seconds=index))
+
+
+def codes(page) -> list:
+    return [room["code"] for room in json.loads(page.body)["rooms"]]
+
+
+def test_cursor_pages_cover_all_rooms_once():
+    lobby = LobbyIndex()
+    for index in range(7):
+        lobby.update(make_room(index, players=1 + index % 3))
+    seen, cursor = [], None
+    while True:
+        page, _ = lobby.page(cursor=cursor, limit=3)
+        body = json.loads(page.body)
+        assert body["total"] == 7
+        seen.extend(codes(page))
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [f"R{index:03d}" for index in range(7)]
+
+
+def test_filters_by_state_free_seats_and_created_after():
+    lobby = LobbyIndex()
+    lobby.update(make_room(0, players=1))
+    lobby.update(make_room(1, players=3))
+    lobby.update(make_room(2, players=2, game_state="playing"))
+    assert codes(lobby.page(min_free_seats=2)[0]) == ["R000"]
+    assert codes(lobby.page(game_state="playing")[0]) == ["R002"]
+    after = (BASE + timedelta(seconds=0)).timestamp()
+    assert codes(lobby.page(created_after=after)[0]) == ["R001"]
+
+
+def test_update_moves_room_between_indexes():
+    lobby = LobbyIndex()
+    room = make_room(0)
+    lobby.update(room)
+    assert not lobby.update(room)
+    room.players["extra"] = create_player("extra", "Гость")
+    assert lobby.update(room)
+    entry = json.loads(lobby.page()[0].body)["rooms"][0]
+    assert entry["player_count"] == 2 and entry["free_seats"] == 2
+    room.game_state = "playing"
+    lobby.update(room)
+    assert codes(lobby.page()[0]) == []
+    assert json.loads(lobby.page(game_state="playing")[0].body)["rooms"][0]["free_seats"] == 0
+    lobby.remove(room.code)
+    lobby.remove(room.code)
+    assert len(lobby) == 0 and lobby._index == {}
+
+
+def test_page_cache_and_stable_etag():
+    lobby = LobbyIndex()
+    lobby.update(make_room(0))
+    lobby.update(make_room(1, game_state="playing"))
+    first, cached = lobby.page()
+    assert not cached
+    again, cached = lobby.page()
+    assert cached and again is first
+    # Изменилась комната в другом состоянии: страница пересобрана, тело и ETag те же
+    lobby.remove("R001")
+    rebuilt, cached = lobby.page()
+    assert not cached and rebuilt.etag == first.etag
+    lobby.update(make_room(2))
+    assert lobby.page()[0].etag != first.etag
+
+
+def test_page_cache_is_bounded():
+    lobby = LobbyIndex(cache_size=2)
+    lobby.update(make_room(0))
+    for limit in (1, 2, 3):
+        lobby.page(limit=limit)
+    assert len(lobby._pages) == 2
+    assert not lobby.page(limit=1)[1]
+
+
+def test_cursor_round_trip_and_errors():
+    key = (BASE.timestamp(), "R001")
+    assert parse_cursor(format_cursor(key)) == key
+    for cursor in ("", "abc", "1.5", "1.5:", "nan:R001", "inf:R001"):
+        with pytest.raises(ValueError):
+            parse_cursor(cursor)
+
+
+def test_rooms_endpoint(load_app):
+    from fastapi.testclient import TestClient
+
+    main = load_app()
+    with TestClient(main.app) as client:
+        code = client.post("/api/create-room", params={"player_name": "Хост"}).json()["room_code"]
+        response = client.get("/api/rooms", params={"min_free_seats": 3})
+        assert [room["code"] for room in response.json()["rooms"]] == [code]
+        assert client.get("/api/rooms", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+        assert client.get("/api/rooms", params={"cursor": "garbage"}).status_code == 400
@@ -0,0 +1,122 @@
+import pytest
+
+import matchmaking
+from matchmaking import Matchmaker
+
+
+def make_matchmaker(**options):
+    groups = []
+    settings = dict(band=100, min_players=2, max_players=4, widen_seconds=5, max_widen=3, fill_seconds=15)
+    settings.update(options)
+    matchmaker = Matchmaker(lambda group: groups.append([ticket.name for ticket in group]), **settings)
+    return matchmaker, groups
+
+
+def test_full_band_matches_on_enqueue():
+    matchmaker, groups = make_matchmaker()
+    tickets = [matchmaker.enqueue(f"p{index}", 1000 + index * 10, now=0) for index in range(4)]
+    assert groups == [["p3", "p0", "p1", "p2"]]
+    assert len(matchmaker) == 0
+    assert all(matchmaker.get(ticket.id).to_dict()["status"] == "matched" for ticket in tickets)
+
+
+def test_distant_bands_match_after_window_widens():
+    matchmaker, groups = make_matchmaker(max_players=2)
+    matchmaker.enqueue("low", 1000, now=0)
+    matchmaker.enqueue("high", 1250, now=0)
+    # Разница две корзины: окно в одну корзину еще мало
+    assert matchmaker.sweep(now=5) == 0
+    assert matchmaker.sweep(now=10) == 1
+    assert groups == [["low", "high"]]
+
+
+def test_new_ticket_finds_old_ticket_with_wide_window():
+    matchmaker, groups = make_matchmaker(max_players=2)
+    matchmaker.enqueue("old", 1000, now=0)
+    matchmaker.sweep(now=10)
+    matchmaker.enqueue("new", 1200, now=10)
+    assert groups == [["new", "old"]]
+
+
+def test_partial_room_only_after_fill_timeout():
+    matchmaker, groups = make_matchmaker()
+    matchmaker.enqueue("a", 1000, now=0)
+    matchmaker.enqueue("b", 1010, now=1)
+    assert matchmaker.sweep(now=14) == 0
+    assert matchmaker.sweep(now=15) == 1
+    assert groups == [["a", "b"]]
+
+
+def test_window_is_capped():
+    matchmaker, groups = make_matchmaker(max_players=2, max_widen=3)
+    matchmaker.enqueue("low", 1000, now=0)
+    matchmaker.enqueue("high", 1400, now=0)
+    # Разница четыре корзины, окно не шире трех: заявки не встретятся никогда
+    assert matchmaker.sweep(now=1000) == 0
+    assert groups == []
+
+
+def test_candidates_prefer_nearest_bands():
+    matchmaker, groups = make_matchmaker(max_players=3, max_widen=5)
+    for name, rating in (("far", 1500), ("near", 1100), ("mid", 1300)):
+        matchmaker.enqueue(name, rating, now=0)
+    ticket = matchmaker.enqueue("me", 1000, now=0)
+    assert groups == []
+    group = matchmaker._candidates(ticket, now=100)
+    assert [member.name for member in group] == ["me", "near", "mid"]
+
+
+def test_cancel_and_result_expiry(monkeypatch):
+    matchmaker, groups = make_matchmaker(max_players=2)
+    ticket = matchmaker.enqueue("alone", 1000, now=0)
+    assert matchmaker.cancel(ticket.id)
+    assert not matchmaker.cancel(ticket.id)
+    assert matchmaker.get(ticket.id) is None
+    # Корзина без заявок удалена: новая заявка не находит отмененную
+    other = matchmaker.enqueue("other", 1000, now=0)
+    assert matchmaker._band_ids == [10] and groups == []
+
+    partner = matchmaker.enqueue("partner", 1000, now=1)
+    assert groups == [["partner", "other"]]
+    monkeypatch.setattr(matchmaking, "MATCH_RESULT_TTL", 60)
+    matchmaker.sweep(now=30)
+    assert matchmaker.get(other.id) is not None
+    matchmaker.sweep(now=62)
+    assert matchmaker.get(other.id) is None and matchmaker.get(partner.id) is None
+
+
+def test_stale_tickets_are_dropped(monkeypatch):
+    monkeypatch.setattr(matchmaking, "MATCH_TICKET_TTL", 300)
+    expired = []
+    matchmaker, _ = make_matchmaker(on_expire=expired.append)
+    ticket = matchmaker.enqueue("stale", 1000, now=0)
+    matchmaker.sweep(now=301)
+    assert matchmaker.get(ticket.id) is None and len(matchmaker) == 0
+    assert expired == [ticket]
+
+
+def test_socket_is_told_about_timeout_and_cancel(load_app, monkeypatch):
+    from fastapi.testclient import TestClient
+    from starlette.websockets import WebSocketDisconnect
+
+    main = load_app()
+    with TestClient(main.app) as client:
+        expiring = client.post("/api/matchmaking", params={"player_name": "A", "rating": 100}).json()["ticket_id"]
+        cancelled = client.post("/api/matchmaking", params={"player_name": "B", "rating": 9000}).json()["ticket_id"]
+        with client.websocket_connect(f"/ws/matchmaking/{cancelled}") as ws:
+            assert client.delete(f"/api/matchmaking/{cancelled}").status_code == 200
+            assert ws.receive_json() == {"type": "matchmaking_cancelled", "ticket_id": cancelled}
+            with pytest.raises(WebSocketDisconnect):
+                ws.receive_json()
+        with client.websocket_connect(f"/ws/matchmaking/{expiring}") as ws:
+            monkeypatch.setattr(matchmaking, "MATCH_TICKET_TTL", -1)
+
+            async def sweep():
+                main.matchmaker.sweep()
+
+            client.portal.call(sweep)
+            assert ws.receive_json() == {"type": "matchmaking_timeout", "ticket_id": expiring}
+            with pytest.raises(WebSocketDisconnect) as closed:
+                ws.receive_json()
+            assert closed.value.code == 1000
+        assert client.get(f"/api/matchmaking/{expiring}").status_code == 404
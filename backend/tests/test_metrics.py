@@ -0,0 +1,30 @@
+import pytest
+
+from metrics import NOOP, Registry, _Metric
+
+
+def test_metric_base_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric("game_x", "x")
+
+
+def test_render():
+    registry = Registry(enabled=True)
+    requests = registry.counter("game_requests_total", "Запросы", ("kind",))
+    requests.labels("a").inc()
+    requests.labels("a").inc(2)
+    sizes = registry.histogram("game_size", "Размер", buckets=(1, 10))
+    sizes.observe(5)
+    registry.gauge_func("game_rooms", "Комнаты", lambda: {("waiting",): 2}, ("state",))
+    lines = registry.render().splitlines()
+    assert 'game_requests_total{kind="a"} 3' in lines
+    assert 'game_size_bucket{le="1.0"} 0' in lines
+    assert 'game_size_bucket{le="10.0"} 1' in lines
+    assert 'game_size_count 1' in lines
+    assert 'game_rooms{state="waiting"} 2' in lines
+
+
+def test_disabled_registry_returns_noop():
+    registry = Registry(enabled=False)
+    assert registry.counter("game_x_total", "x") is NOOP
+    assert registry.render() == "\n"
@@ -0,0 +1,86 @@
+import copy
+import json
+import random
+from datetime import datetime
+
+from models import (
+    BUILDINGS, GOLD, RESOURCES, UNITS, GameRoom, create_player, named, resource_vector,
+)
+
+
+def make_room() -> GameRoom:
+    players = {pid: create_player(pid, pid.upper()) for pid in ("a", "b")}
+    return GameRoom(code="ROOM0001", players=players, game_state="waiting", created_at=datetime(2024, 1, 1))
+
+
+def apply_patch(state: dict, patch: dict) -> dict:
+    """Применяет патч так же, как клиент: абсолютные значения поверх снимка"""
+    assert patch["base_revision"] == state["revision"]
+    state["revision"] = patch["revision"]
+    state.update(patch.get("room", {}))
+    for pid, changes in patch.get("players", {}).items():
+        player = state["players"].setdefault(pid, {})
+        for field, value in changes.items():
+            if isinstance(value, dict) and isinstance(player.get(field), dict):
+                player[field].update(value)
+            else:
+                player[field] = value
+    for pid in patch.get("removed_players", []):
+        del state["players"][pid]
+    return state
+
+
+def test_resource_vector():
+    assert resource_vector({"gold": 5, "food": 2}) == [5, 0, 0, 2]
+    assert resource_vector({"mana": 1}) is None
+    assert named(RESOURCES, [1, 2, 3, 4]) == {"gold": 1, "wood": 2, "stone": 3, "food": 4}
+
+
+def test_unchanged_room_keeps_revision():
+    room = make_room()
+    room.commit_revision()
+    revision = room.revision
+    assert room.commit_revision() == {"base_revision": revision, "revision": revision}
+
+
+def test_patch_contains_only_changed_elements():
+    room = make_room()
+    room.commit_revision()
+    room.players["a"].resources[GOLD] -= 100
+    room.turn_number = 2
+    patch = room.commit_revision()
+    assert patch["room"] == {"turn_number": 2}
+    assert patch["players"] == {"a": {"resources": {"gold": 900}}}
+
+
+def test_patches_reproduce_state():
+    rng = random.Random(1)
+    room = make_room()
+    state = apply_patch({**room.to_dict(), "revision": 0, "players": {}}, room.commit_revision())
+    for step in range(200):
+        player = room.players[rng.choice(list(room.players))]
+        choice = rng.randrange(6)
+        if choice == 0:
+            player.resources[rng.randrange(len(RESOURCES))] += rng.randint(-50, 50)
+        elif choice == 1:
+            player.army[rng.randrange(len(UNITS))] += rng.randint(0, 3)
+        elif choice == 2:
+            player.buildings[rng.randrange(len(BUILDINGS))] += 1
+        elif choice == 3:
+            room.turn_number += 1
+            room.current_turn = player.id
+        elif choice == 4 and len(room.players) < 4:
+            room.players[f"p{step}"] = create_player(f"p{step}", "new")
+        elif choice == 5 and len(room.players) > 2:
+            del room.players[next(iter(room.players))]
+        # Патч уходит клиентам JSON-ом и не должен ссылаться на живые списки
+        state = apply_patch(state, json.loads(json.dumps(room.commit_revision())))
+        assert state == room.to_dict()
+
+
+def test_round_trip_through_dict():
+    room = make_room()
+    room.players["a"].technologies.append("trade_routes")
+    room.bot_players = ["b"]
+    restored = GameRoom.from_dict(copy.deepcopy(room.to_dict()))
+    assert restored.to_dict() == room.to_dict()
@@ -0,0 +1,27 @@
+import protocol
+from protocol import EncodedMessage, decode_msgpack, encode_msgpack, payload_size
+
+MESSAGE = {"type": "player_joined", "player_id": "p1", "room": {"players": {"p1": {"name": "Игрок", "gold": 5}}}}
+
+
+def test_msgpack_round_trip():
+    assert decode_msgpack(encode_msgpack(MESSAGE)) == MESSAGE
+    assert "msgpack" in protocol.ENCODERS
+
+
+def test_payload_size_counts_utf8_bytes():
+    assert payload_size("Игрок") == 10
+    assert payload_size(b"\x01\x02") == 2
+
+
+def test_encoded_message_observes_each_encoding_once(monkeypatch):
+    observed = []
+    monkeypatch.setattr(protocol, "observe_size",
+                        lambda message_type, encoding, payload: observed.append((message_type, encoding, payload)))
+    encoded = EncodedMessage(MESSAGE)
+    for _ in range(3):
+        encoded.get("json")
+        encoded.get("msgpack")
+    assert [(t, e) for t, e, _ in observed] == [("player_joined", "json"), ("player_joined", "msgpack")]
+    json_size, msgpack_size = (payload_size(payload) for _, _, payload in observed)
+    assert msgpack_size < json_size
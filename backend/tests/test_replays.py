@@ -0,0 +1,112 @@
+import asyncio
+import gzip
+import json
+import os
+from datetime import datetime
+
+import replays
+from models import GOLD, GameRoom, create_player
+from replays import FileReplayStore, ReplayStore, create_replay_store
+
+
+def make_room() -> GameRoom:
+    players = {pid: create_player(pid, name) for pid, name in (("a", "Анна"), ("b", "Борис"))}
+    return GameRoom(code="REPLAY01", players=players, game_state="waiting", created_at=datetime(2024, 1, 1),
+                    current_turn="a")
+
+
+def play(store: FileReplayStore, room: GameRoom, turns: int, finish: bool = True):
+    """Партия на turns ходов: по действию каждого игрока и смене хода"""
+    store.record(room, {"type": "player_ready", "player_id": "a"})
+    room.game_state = "playing"
+    store.record(room, {"type": "game_start"})
+    for turn in range(1, turns + 1):
+        for player_id, other in (("a", "b"), ("b", "a")):
+            room.players[player_id].resources[GOLD] += 10
+            store.record(room, {"type": "action_result", "player_id": player_id, "turn": turn})
+            room.current_turn = other
+            if player_id == "b":
+                room.turn_number += 1
+                if finish and turn == turns:
+                    room.game_state = "finished"
+                    room.winner = "b"
+            store.record(room, {"type": "turn_ended", "next_turn": other, "turn_number": room.turn_number})
+
+
+def read(store: FileReplayStore, room_code: str, meta: dict, *args) -> list:
+    return [json.loads(line) for part in store.stream(room_code, meta, *args) for line in part.splitlines()]
+
+
+def test_finished_game_replay(tmp_path):
+    async def scenario():
+        store = FileReplayStore(str(tmp_path), lambda room: room.to_dict())
+        room = make_room()
+        play(store, room, turns=3)
+        await asyncio.sleep(0)  # _finish ставится через call_soon
+        meta = await store.meta(room.code)
+        lines = read(store, room.code, meta)
+        seek = read(store, room.code, meta, 2, 2)
+        await store.stop()
+        return meta, lines, seek
+
+    meta, lines, seek = asyncio.run(scenario())
+    assert meta["turns"] == 3 and meta["events"] == 13
+    assert meta["winner_id"] == "b" and meta["winner_name"] == "Борис"
+    assert meta["players"] == {"a": "Анна", "b": "Борис"}
+    # Событие до старта партии в повтор не попадает
+    assert lines[0] == {"replay": meta}
+    assert [line["turn"] for line in lines if "state" in line] == [1, 2, 3]
+    # Последний turn_ended партии дописан в блок последнего хода
+    assert lines[-1]["type"] == "turn_ended" and lines[-1]["turn_number"] == 4
+    assert [line["type"] for line in lines if "type" in line][0] == "game_start"
+    # Ключевой кадр хода 2 — состояние после двух действий первого хода
+    assert seek[0] == {"replay": meta}
+    assert seek[1]["turn"] == 2
+    assert seek[1]["state"]["players"]["a"]["resources"]["gold"] == make_room().players["a"].resources[GOLD] + 10
+    assert [line["turn"] for line in seek[2:] if line.get("type") == "action_result"] == [2, 2]
+    assert all(line.get("turn") == 2 for line in seek[1:] if "state" in line)
+
+
+def test_chunks_are_compressed_and_indexed(tmp_path, monkeypatch):
+    monkeypatch.setattr(replays, "REPLAY_CODEC", "gzip")
+
+    async def scenario():
+        store = FileReplayStore(str(tmp_path), lambda room: room.to_dict())
+        play(store, make_room(), turns=2)
+        await asyncio.sleep(0)
+        await store.stop()
+
+    asyncio.run(scenario())
+    with open(tmp_path / "REPLAY01.index", "rb") as f:
+        entries = [replays.INDEX_ENTRY.unpack(f.read(replays.INDEX_ENTRY.size))
+                   for _ in range(os.path.getsize(tmp_path / "REPLAY01.index") // replays.INDEX_ENTRY.size)]
+    assert len(entries) == 2
+    with open(tmp_path / "REPLAY01.chunks", "rb") as f:
+        data = f.read()
+    assert entries[0][0] == 0 and sum(length for _, length in entries) == len(data)
+    for offset, length in entries:
+        chunk = data[offset:offset + length]
+        assert chunk.startswith(b"\x1f\x8b")
+        assert replays.decompress(chunk) == gzip.decompress(chunk)
+
+
+def test_unfinished_game_has_no_meta(tmp_path):
+    async def scenario():
+        store = FileReplayStore(str(tmp_path), lambda room: room.to_dict())
+        room = make_room()
+        play(store, room, turns=2, finish=False)
+        store.close(room.code)
+        meta = await store.meta(room.code)
+        await store.stop()
+        return meta
+
+    assert asyncio.run(scenario()) is None
+    # Блоки недоигранной партии записаны, но без описания повтор не отдается
+    assert os.path.getsize(tmp_path / "REPLAY01.chunks") > 0
+
+
+def test_replay_store_disabled_without_directory(monkeypatch):
+    monkeypatch.delenv("REPLAY_DIR", raising=False)
+    store = create_replay_store(lambda room: room.to_dict())
+    assert type(store) is ReplayStore
+    assert asyncio.run(store.meta("ANY")) is None
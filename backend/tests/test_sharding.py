@@ -0,0 +1,32 @@
+from fastapi.testclient import TestClient
+
+from sharded import shard_env
+from sharding import ShardMap
+
+URLS = ["http://127.0.0.1:8001", "http://127.0.0.1:8002"]
+
+
+def test_workers_get_own_log_and_store(monkeypatch):
+    monkeypatch.setenv("ACTION_LOG_DIR", "/data/log")
+    monkeypatch.setenv("ROOM_STORE_PATH", "/data/rooms.db")
+    first, second = shard_env(0, 2, URLS), shard_env(1, 2, URLS)
+    assert first["ACTION_LOG_DIR"] == "/data/log/shard-0" and second["ACTION_LOG_DIR"] == "/data/log/shard-1"
+    assert first["ROOM_STORE_PATH"] == "/data/rooms.shard-0.db"
+    assert second["ROOM_STORE_PATH"] == "/data/rooms.shard-1.db"
+
+
+def test_restart_restores_only_local_rooms(load_app, tmp_path):
+    main = load_app(ACTION_LOG_DIR=tmp_path)
+    with TestClient(main.app) as client:
+        codes = {client.post("/api/create-room", params={"player_name": "A"}).json()["room_code"]
+                 for _ in range(16)}
+
+    shards = ShardMap(index=0, count=2, urls=URLS)
+    local = {code for code in codes if shards.is_local(code)}
+    assert local and local != codes
+    main = load_app(SHARD_COUNT=2, SHARD_INDEX=0, SHARD_URLS=",".join(URLS))
+    with TestClient(main.app):
+        assert {room.code for room in main.game_rooms.loaded_rooms()} == local
+        assert len(main.lobby) == len(local)
+    # Журналы чужих комнат остались на месте
+    assert all((tmp_path / f"{code}.log").exists() for code in codes - local)
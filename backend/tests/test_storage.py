@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from models import GameRoom, create_player
+from storage import InMemoryRoomStore, RoomStore, SQLiteRoomStore
+
+
+def make_room(code: str) -> GameRoom:
+    return GameRoom(code=code, players={"p1": create_player("p1", "A")}, game_state="waiting",
+                    created_at=datetime.now())
+
+
+def test_room_store_is_abstract():
+    with pytest.raises(TypeError):
+        RoomStore()
+
+
+def test_in_memory_load():
+    store = InMemoryRoomStore()
+    store["ROOM0001"] = make_room("ROOM0001")
+    assert asyncio.run(store.load("ROOM0001")) is store["ROOM0001"]
+    assert asyncio.run(store.load("MISSING1")) is None
+
+
+def test_sqlite_evict_and_load(tmp_path):
+    async def scenario():
+        store = SQLiteRoomStore(str(tmp_path / "rooms.db"), flush_interval_ms=60_000)
+        await store.start()
+        room = make_room("ROOM0001")
+        store["ROOM0001"] = room
+        room.turn_number = 7
+        store.mark_dirty("ROOM0001")
+        store.evict("ROOM0001")
+        # Снимок выгруженной комнаты еще не записан, но подгрузка его видит
+        assert len(store) == 0 and "ROOM0001" in store
+        loaded = await store.load("ROOM0001")
+        assert loaded.turn_number == 7 and len(store) == 1
+        assert await store.load("MISSING1") is None
+
+        await store.flush()
+        store.evict("ROOM0001")
+        assert (await store.load("ROOM0001")).turn_number == 7
+        await store.stop()
+
+        reopened = SQLiteRoomStore(str(tmp_path / "rooms.db"))
+        await reopened.start()
+        assert len(reopened) == 0
+        assert reopened["ROOM0001"].code == "ROOM0001"
+        await reopened.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,97 @@
+import math
+import time
+
+from turn_clock import TurnClock
+
+
+def make_clock(slots: int = 8, tick: float = 1.0):
+    expired = []
+    clock = TurnClock(lambda room_code, deadline: expired.append(room_code), tick=tick, slots=slots)
+    # Начало тика: дедлайн срабатывает, когда начался тик, в который он попадает
+    return clock, expired, math.floor(time.time() / tick) * tick
+
+
+def test_fires_at_deadline_not_before():
+    clock, expired, now = make_clock()
+    clock.schedule("ROOM", now + 3)
+    assert clock.advance(now + 2.9) == 0
+    assert clock.advance(now + 3.5) == 1
+    assert expired == ["ROOM"] and "ROOM" not in clock
+
+
+def test_cancel_and_reschedule():
+    clock, expired, now = make_clock()
+    clock.schedule("A", now + 2)
+    clock.schedule("B", now + 2)
+    clock.cancel("A")
+    clock.schedule("B", now + 5)
+    clock.advance(now + 3)
+    assert expired == [] and len(clock) == 1
+    clock.advance(now + 6)
+    assert expired == ["B"]
+
+
+def test_deadline_beyond_one_revolution():
+    clock, expired, now = make_clock(slots=8, tick=1.0)
+    clock.schedule("FAR", now + 20)
+    for step in range(1, 20):
+        clock.advance(now + step)
+    assert expired == []
+    clock.advance(now + 21)
+    assert expired == ["FAR"]
+
+
+def test_long_pause_fires_everything_once():
+    clock, expired, now = make_clock(slots=8, tick=1.0)
+    for index in range(30):
+        clock.schedule(f"R{index}", now + 1 + index)
+    assert clock.advance(now + 100) == 30
+    assert sorted(expired) == sorted(f"R{index}" for index in range(30))
+    assert len(clock) == 0
+
+
+def test_past_deadline_fires_on_next_tick():
+    clock, expired, now = make_clock()
+    clock.advance(now + 5)
+    clock.schedule("LATE", now + 1)
+    clock.advance(now + 6)
+    assert expired == ["LATE"]
+
+
+def test_callback_error_does_not_stop_other_rooms():
+    fired = []
+
+    def on_expire(room_code, deadline):
+        if room_code == "BAD":
+            raise RuntimeError("boom")
+        fired.append(room_code)
+
+    now = math.floor(time.time())
+    clock = TurnClock(on_expire, tick=1.0, slots=8)
+    clock.schedule("BAD", now + 1)
+    clock.schedule("GOOD", now + 1)
+    assert clock.advance(now + 2) == 2
+    assert fired == ["GOOD"]
+
+
+def test_expired_turn_passes_to_next_player(load_app):
+    from fastapi.testclient import TestClient
+
+    from conftest import receive_until
+
+    main = load_app()
+    with TestClient(main.app) as client:
+        created = client.post("/api/create-room", params={"player_name": "A", "turn_seconds": 1}).json()
+        code, a = created["room_code"], created["player_id"]
+        b = client.post("/api/join-room", params={"room_code": code, "player_name": "B"}).json()["player_id"]
+        with client.websocket_connect(f"/ws/{code}/{a}") as wa, client.websocket_connect(f"/ws/{code}/{b}") as wb:
+            receive_until(wa, "room_state")
+            receive_until(wb, "room_state")
+            wa.send_json({"type": "player_ready", "ready": True})
+            wb.send_json({"type": "player_ready", "ready": True})
+            receive_until(wa, "game_start")
+            started = time.time()
+            # Никто не ходит: ход завершают часы
+            turn_ended = [m for m in receive_until(wa, "turn_ended") if m["type"] == "turn_ended"][0]
+            assert turn_ended["next_turn"] == b
+            assert 0.5 < time.time() - started < 3
@@ -0,0 +1,114 @@
+"""Часы ходов: дедлайны ходов всех комнат в одном колесе таймеров
+
+Вместо отдельной задачи asyncio.sleep на каждую комнату все дедлайны лежат
+в хешированном колесе: SLOTS ячеек по TICK секунд, комната попадает в ячейку
+своего тика дедлайна по модулю числа ячеек. Одна задача просыпается раз
+в тик и просматривает только ячейки прошедших тиков; дедлайн дальше одного
+оборота колеса (SLOTS * TICK секунд) просто остается в ячейке до нужного
+оборота. Постановка и отмена — O(1) через индекс room_code -> ячейка.
+
+Дедлайны — время по часам системы (time.time()), поэтому они хранятся
+в комнате (GameRoom.turn_deadline) и переживают сохранение и восстановление:
+после загрузки комнату достаточно снова поставить в колесо.
+
+Колесо только сообщает об истечении (on_expire); сам ход завершает
+обработчик комнаты в ее очереди команд.
+"""
+import asyncio
+import math
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+from metrics import turn_clock_expired, turn_clock_lag_seconds
+
+# Длительность хода новой комнаты по умолчанию (секунды); 0 — ход без таймера
+TURN_SECONDS = int(os.getenv("TURN_SECONDS", "0"))
+TURN_SECONDS_MAX = int(os.getenv("TURN_SECONDS_MAX", "3600"))
+# Шаг колеса (точность срабатывания) и число ячеек
+TURN_CLOCK_TICK = float(os.getenv("TURN_CLOCK_TICK_MS", "250")) / 1000
+TURN_CLOCK_SLOTS = int(os.getenv("TURN_CLOCK_SLOTS", "512"))
+
+
+class TurnClock:
+    """Колесо таймеров с дедлайнами ходов всех комнат процесса"""
+
+    def __init__(
+        self,
+        on_expire: Callable[[str, float], None],
+        tick: float = TURN_CLOCK_TICK,
+        slots: int = TURN_CLOCK_SLOTS,
+    ):
+        self.on_expire = on_expire
+        self.tick = tick
+        # Ячейка: room_code -> дедлайн
+        self._slots: List[Dict[str, float]] = [{} for _ in range(slots)]
+        self._slot_of: Dict[str, int] = {}
+        # Номер следующего непросмотренного тика
+        self._next_tick = self._tick_of(time.time())
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def __contains__(self, room_code: str) -> bool:
+        return room_code in self._slot_of
+
+    def _tick_of(self, moment: float) -> int:
+        return math.floor(moment / self.tick)
+
+    def schedule(self, room_code: str, deadline: float):
+        """Ставит (или переносит) дедлайн хода комнаты"""
+        self.cancel(room_code)
+        # Ячейка первого тика, к началу которого дедлайн уже наступил;
+        # прошедший дедлайн сработает на ближайшем тике
+        index = max(math.ceil(deadline / self.tick), self._next_tick) % len(self._slots)
+        self._slots[index][room_code] = deadline
+        self._slot_of[room_code] = index
+
+    def cancel(self, room_code: str):
+        """Снимает дедлайн комнаты, если он был"""
+        index = self._slot_of.pop(room_code, None)
+        if index is not None:
+            del self._slots[index][room_code]
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """Просматривает ячейки тиков до now и сообщает об истекших дедлайнах"""
+        now = time.time() if now is None else now
+        current = self._tick_of(now)
+        expired = []
+        # После долгой паузы достаточно одного оборота: каждая ячейка просмотрена
+        for tick in range(max(self._next_tick, current - len(self._slots) + 1), current + 1):
+            slot = self._slots[tick % len(self._slots)]
+            due = [(room_code, deadline) for room_code, deadline in slot.items() if deadline <= now]
+            for room_code, deadline in due:
+                del slot[room_code]
+                del self._slot_of[room_code]
+            expired.extend(due)
+        self._next_tick = max(self._next_tick, current + 1)
+        for room_code, deadline in expired:
+            turn_clock_lag_seconds.observe(now - deadline)
+            turn_clock_expired.inc()
+            try:
+                self.on_expire(room_code, deadline)
+            except Exception as e:
+                print(f"Turn clock error for room {room_code}: {e!r}")
+        return len(expired)
+
+    async def _run(self):
+        while True:
+            # Просыпаемся к началу следующего тика, а не через tick от прошлого
+            # пробуждения, иначе задержка срабатывания доходит до двух тиков
+            await asyncio.sleep(max(0.0, self._next_tick * self.tick - time.time()))
+            self.advance()
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,58 @@
+"""Начисление ресурсов за ход
+
+Доход игрока за ход зависит только от его зданий, технологий и правил
+комнаты (rules.py), поэтому он вычисляется один раз и кэшируется
+в Player.income; обработчики сбрасывают кэш (invalidate_income), когда
+здания или технологии меняются.
+
+apply_income начисляет доход игрокам одной комнаты при смене хода (в очереди
+команд комнаты). Начисление сводится к сложению двух векторов из четырех
+чисел на игрока без обращений к словарям и проверок строк. Сборка ресурсов
+в матрицу NumPy и обратная раскладка по спискам игроков оказались медленнее
+этого цикла (см. benchmarks/bench_turns.py).
+"""
+from typing import Iterable, List
+
+from models import Player
+from rules import Rules
+
+
+def compute_income(player: Player, rules: Rules) -> List[int]:
+    """Доход игрока за ход с учетом зданий и технологий"""
+    income = list(rules.base_income)
+    for building_index, bonus in rules.building_income:
+        count = player.buildings[building_index]
+        if count:
+            for index, amount in enumerate(bonus):
+                income[index] += amount * count
+    for tech in player.technologies:
+        bonus = rules.tech_income.get(tech)
+        if bonus is not None:
+            for index, amount in enumerate(bonus):
+                income[index] += amount
+    return income
+
+
+def player_income(player: Player, rules: Rules) -> List[int]:
+    """Кэшированный доход игрока (правила комнаты за партию не меняются)"""
+    income = player.income
+    if income is None:
+        income = player.income = compute_income(player, rules)
+    return income
+
+
+def invalidate_income(player: Player):
+    """Сбрасывает кэш дохода после изменения зданий или технологий"""
+    player.income = None
+
+
+def apply_income(players: Iterable[Player], rules: Rules):
+    """Начисляет доход за ход игрокам одной комнаты"""
+    for player in players:
+        resources = player.resources
+        income = player_income(player, rules)
+        resources[0] += income[0]
+        resources[1] += income[1]
+        resources[2] += income[2]
+        resources[3] += income[3]
+
@@ -2,6 +2,9 @@ import React, { useState, useEffect, useRef } from 'react'
 import './GameRoom.css'
 import { API_URL, WS_URL } from '../config'
 
+// Код закрытия: комната живет на другом воркере, его адрес — в reason
+const SHARD_REDIRECT_CLOSE_CODE = 4307
+
 function GameRoom({ roomCode, playerId, playerName, onGameStart, onBackToLobby }) {
   const [room, setRoom] = useState(null)
   const [players, setPlayers] = useState({})
@@ -19,11 +22,12 @@ function GameRoom({ roomCode, playerId, playerName, onGameStart, onBackToLobby }
   const [tradeOffer, setTradeOffer] = useState({ gold: 0, wood: 0, stone: 0, food: 0 })
   const [tradeRequest, setTradeRequest] = useState({ gold: 0, wood: 0, stone: 0, food: 0 })
   const wsRef = useRef(null)
+  const roomRef = useRef(null) // Последнее известное состояние комнаты (с ревизией)
 
   useEffect(() => {
     // Подключение к WebSocket
-    try {
-      const ws = new WebSocket(`${WS_URL}/ws/${roomCode}/${playerId}`)
+    const connect = (baseUrl) => {
+      const ws = new WebSocket(`${baseUrl}/ws/${roomCode}/${playerId}`)
       wsRef.current = ws
 
       ws.onopen = () => {
@@ -34,7 +38,12 @@ function GameRoom({ roomCode, playerId, playerName, onGameStart, onBackToLobby }
       ws.onmessage = (event) => {
         try {
           const message = JSON.parse(event.data)
-          handleWebSocketMessage(message)
+          if (message.type === 'batch') {
+            // Все сообщения одного события сервера приходят одним кадром — по порядку
+            message.messages.forEach(handleWebSocketMessage)
+          } else {
+            handleWebSocketMessage(message)
+          }
         } catch (err) {
           console.error('Error parsing WebSocket message:', err)
         }
@@ -47,13 +56,24 @@ function GameRoom({ roomCode, playerId, playerName, onGameStart, onBackToLobby }
 
       ws.onclose = (event) => {
         console.log('WebSocket disconnected', event.code, event.reason)
+        if (event.code === SHARD_REDIRECT_CLOSE_CODE && event.reason) {
+          // Комната обслуживается другим воркером — переподключаемся к нему
+          connect(event.reason)
+          return
+        }
         if (event.code !== 1000) {
           addLogMessage('Соединение с сервером потеряно. Попробуйте перезагрузить страницу.', 'warning')
         }
       }
+    }
+
+    try {
+      connect(WS_URL)
 
       return () => {
-        if (ws.readyState === WebSocket.OPEN || ws.readyState === WebSocket.CONNECTING) {
+        const ws = wsRef.current
+        if (ws && (ws.readyState === WebSocket.OPEN || ws.readyState === WebSocket.CONNECTING)) {
+          ws.onclose = null
           ws.close()
         }
       }
@@ -68,21 +88,60 @@ function GameRoom({ roomCode, playerId, playerName, onGameStart, onBackToLobby }
     setGameLog(prev => [{ message, type, timestamp }, ...prev].slice(0, 50)) // Новые сверху, храним последние 50
   }
 
+  const applyPatch = (roomData, patch) => {
+    const nextPlayers = { ...roomData.players }
+    Object.entries(patch.players || {}).forEach(([pid, changes]) => {
+      const prev = nextPlayers[pid] || {}
+      const merged = { ...prev }
+      Object.entries(changes).forEach(([field, value]) => {
+        // Словари (ресурсы, армия, здания) приходят частично — сливаем по ключам
+        merged[field] = value && typeof value === 'object' && !Array.isArray(value)
+          ? { ...(prev[field] || {}), ...value }
+          : value
+      })
+      nextPlayers[pid] = merged
+    })
+    ;(patch.removed_players || []).forEach(pid => { delete nextPlayers[pid] })
+    return { ...roomData, ...(patch.room || {}), players: nextPlayers, revision: patch.revision }
+  }
+
+  const applyRoomUpdate = (message) => {
+    if (message.room) {
+      updateRoomState(message.room)
+      return message.room
+    }
+    const current = roomRef.current
+    if (!message.patch || !current) {
+      return current
+    }
+    if (message.patch.base_revision !== current.revision) {
+      // Пропущена ревизия — запрашиваем полный снимок
+      if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+        wsRef.current.send(JSON.stringify({
+          type: 'sync_request',
+          revision: current.revision
+        }))
+      }
+      return current
+    }
+    const nextRoom = applyPatch(current, message.patch)
+    updateRoomState(nextRoom)
+    return nextRoom
+  }
+
   const handleWebSocketMessage = (message) => {
+    const currentRoom = applyRoomUpdate(message) || { players: {} }
     switch (message.type) {
       case 'room_state':
-        updateRoomState(message.room)
         break
       case 'player_joined':
-        updateRoomState(message.room)
-        const joinedPlayer = message.room.players[message.player_id]
+        const joinedPlayer = currentRoom.players[message.player_id]
         if (joinedPlayer) {
           addLogMessage(`${joinedPlayer.name} присоединился к игре`, 'info')
         }
         break
       case 'player_ready_update':
-        updateRoomState(message.room)
-        const readyPlayer = message.room.players[message.player_id]
+        const readyPlayer = currentRoom.players[message.player_id]
         if (readyPlayer) {
           addLogMessage(
             `${readyPlayer.name} ${message.ready ? 'готов' : 'не готов'}`,
@@ -91,15 +150,13 @@ function GameRoom({ roomCode, playerId, playerName, onGameStart, onBackToLobby }
         }
         break
       case 'game_start':
-        updateRoomState(message.room)
         setGameState('playing')
         addLogMessage('Игра началась!', 'success')
         onGameStart()
         break
       case 'action_result':
-        updateRoomState(message.room)
         if (message.success) {
-          const actionPlayer = message.room.players[message.player_id]
+          const actionPlayer = currentRoom.players[message.player_id]
           const action = message.action
           if (action.type === 'build') {
             addLogMessage(
@@ -120,9 +177,8 @@ function GameRoom({ roomCode, playerId, playerName, onGameStart, onBackToLobby }
         }
         break
       case 'battle_result':
-        updateRoomState(message.room)
-        const attacker = message.room.players[message.attacker_id]
-        const defender = message.room.players[message.defender_id]
+        const attacker = currentRoom.players[message.attacker_id]
+        const defender = currentRoom.players[message.defender_id]
         const details = message.battle_details || {}
         
         if (message.result === 'attacker_wins') {
@@ -182,9 +238,8 @@ function GameRoom({ roomCode, playerId, playerName, onGameStart, onBackToLobby }
         }
         break
       case 'trade_completed':
-        updateRoomState(message.room)
-        const trader = message.room.players[message.player_id]
-        const target = message.room.players[message.target_player_id]
+        const trader = currentRoom.players[message.player_id]
+        const target = currentRoom.players[message.target_player_id]
         const offer = Object.entries(message.trade_offer || {})
           .filter(([_, count]) => count > 0)
           .map(([res, count]) => `${getResourceIcon(res)}${count}`)
@@ -199,20 +254,17 @@ function GameRoom({ roomCode, playerId, playerName, onGameStart, onBackToLobby }
         )
         break
       case 'game_finished':
-        updateRoomState(message.room)
         setGameState('finished')
         addLogMessage(`🏆 ${message.winner_name} победил! Игра завершена!`, 'success')
         break
       case 'turn_ended':
-        updateRoomState(message.room)
-        const nextPlayer = message.room.players[message.next_turn]
+        const nextPlayer = currentRoom.players[message.next_turn]
         const turnNum = message.turn_number || 1
         addLogMessage(`Ход ${turnNum} переходит к ${nextPlayer?.name || 'игроку'}`, 'info')
         setCurrentTurn(message.next_turn)
         break
       case 'player_disconnected':
-        updateRoomState(message.room)
-        const disconnectedPlayer = message.room.players[message.player_id]
+        const disconnectedPlayer = currentRoom.players[message.player_id]
         if (disconnectedPlayer) {
           addLogMessage(`${disconnectedPlayer.name} покинул игру`, 'warning')
         }
@@ -307,6 +359,7 @@ function GameRoom({ roomCode, playerId, playerName, onGameStart, onBackToLobby }
   }
 
   const updateRoomState = (roomData) => {
+    roomRef.current = roomData
     setRoom(roomData)
     setPlayers(roomData.players)
     setGameState(roomData.game_state)